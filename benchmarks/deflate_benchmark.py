@@ -0,0 +1,102 @@
+"""
+Compares the wall-clock time of archiving a recording.tmcpr file with zipfile.ZIP_DEFLATED,
+which is how the replay file used to be created, and with the parallel deflate in PCRC
+
+Usage: python benchmarks/deflate_benchmark.py [recording.tmcpr] [--size-mb N] [--threads N ...]
+Random data that compresses like a recording is generated if no recording file is given
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pcrc.utils import parallel_deflate
+from pcrc.utils.zip_util import ZipStreamWriter
+
+
+def generate_recording(file_path: str, size_mb: int):
+	rnd = random.Random(0)
+	# recordings are mostly repeated packet structures with varying values
+	templates = [bytes(rnd.randrange(256) for _ in range(rnd.randint(8, 256))) for _ in range(64)]
+	with open(file_path, 'wb') as f:
+		written = 0
+		while written < size_mb * 1024 * 1024:
+			buf = bytearray()
+			for _ in range(1024):
+				data = bytearray(rnd.choice(templates))
+				for _ in range(4):
+					data[rnd.randrange(len(data))] = rnd.randrange(256)
+				buf += (written // 50).to_bytes(4, 'big') + len(data).to_bytes(4, 'big') + data
+			f.write(buf)
+			written += len(buf)
+
+
+def crc32_file(file_path: str) -> int:
+	crc = 0
+	with open(file_path, 'rb') as f:
+		while True:
+			buf = f.read(ZipStreamWriter.BUFFER_SIZE)
+			if len(buf) == 0:
+				return crc
+			crc = zlib.crc32(buf, crc)
+
+
+def bench_zipfile(src: str, dst: str):
+	with zipfile.ZipFile(dst, 'w') as zipf:
+		zipf.write(src, arcname='recording.tmcpr', compress_type=zipfile.ZIP_DEFLATED)
+
+
+def bench_parallel(src: str, dst: str, threads: int):
+	# the crc32 is known beforehand while recording, so it's not included in the timing
+	crc, size = crc32_file(src), os.path.getsize(src)
+	start = time.time()
+	archive = ZipStreamWriter(dst)
+	with open(src, 'rb') as f:
+		archive.write_deflated('recording.tmcpr', parallel_deflate.deflate_file(f, threads), crc, size)
+	archive.close()
+	return time.time() - start
+
+
+def verify(file_path: str):
+	with zipfile.ZipFile(file_path) as zipf:
+		bad = zipf.testzip()
+		if bad is not None:
+			raise ValueError('{} is corrupted in {}'.format(bad, file_path))
+
+
+def main():
+	parser = argparse.ArgumentParser()
+	parser.add_argument('recording', nargs='?', help='the recording.tmcpr file to archive')
+	parser.add_argument('--size-mb', type=int, default=256, help='the size of the generated recording')
+	parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4, parallel_deflate.get_worker_amount(0)])
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as temp_dir:
+		src = args.recording
+		if src is None:
+			src = os.path.join(temp_dir, 'recording.tmcpr')
+			print('Generating {}MB of recording content'.format(args.size_mb))
+			generate_recording(src, args.size_mb)
+		src_size = os.path.getsize(src)
+		dst = os.path.join(temp_dir, 'recording.mcpr')
+
+		def report(name: str, cost: float):
+			verify(dst)
+			print('{:<24}{:>8.2f}s{:>10.1f}MB/s  ratio {:.3f}'.format(name, cost, src_size / 1024 / 1024 / cost, os.path.getsize(dst) / src_size))
+			os.remove(dst)
+
+		start = time.time()
+		bench_zipfile(src, dst)
+		report('zipfile.ZIP_DEFLATED', time.time() - start)
+		for threads in sorted(set(args.threads)):
+			report('parallel, {} threads'.format(threads), bench_parallel(src, dst, threads))
+
+
+if __name__ == '__main__':
+	main()
@@ -6,6 +6,7 @@ from pcrc import constant
 from pcrc.config import SettableOptions, Config
 from pcrc.pcrc_client import PcrcClient
 from pcrc.protocol import SUPPORTED_MINECRAFT_VERSIONS
+from pcrc.supervisor import PcrcSupervisor
 
 pcrc = PcrcClient()
 logger: Logger = pcrc.logger
@@ -31,7 +32,7 @@ def is_stopped():
 
 
 def show_help():
-	logger.info('Command list: help|start|stop|restart|exit|reload|auth|say|whitelist|set|status|list')
+	logger.info('Command list: help|start|stop|restart|exit|reload|auth|say|whitelist|set|status|list|recover')
 
 
 def start():
@@ -132,6 +133,14 @@ def show_player_list():
 		logger.warning('PCRC is not online, cannot get player list')
 
 
+def recover():
+	if is_stopped():
+		recovered = pcrc.recover_recordings()
+		logger.info('Recovered {} replay file(s)'.format(len(recovered)))
+	else:
+		logger.warning('PCRC is running, stop it before recovering recordings')
+
+
 def reload():
 	if pcrc.reload_config():
 		logger.info('PCRC config reloaded')
@@ -141,6 +150,9 @@ def main():
 	on_start_up()
 	pcrc.init()
 	auth(warn_if_already_auth=False)
+	if len(pcrc.config.get('server_profiles')) > 0:
+		PcrcSupervisor(pcrc).main()
+		return
 
 	logger.info('Enter "start" to start PCRC')
 	while True:
@@ -179,6 +191,8 @@ def main():
 				show_status()
 			elif text == 'list':
 				show_player_list()
+			elif text == 'recover':
+				recover()
 			else:
 				logger.error('Command "{}" not found!'.format(text))
 
@@ -1,17 +1,24 @@
 import json
-from typing import Type, Any
+import os
+from typing import Type, Any, Tuple, Optional, FrozenSet
 
+from pcrc import constant
+from pcrc.recording.region import RecordingRegion
 from pcrc.utils import resources_util
 
 SettableOptions = [
 	'language',
 	'server_name',
 	'daytime',
+	'view_distance',
 	'weather',
 	'with_player_only',
 	'remove_items',
 	'remove_bats',
 	'remove_phantoms',
+	'afk_distance',
+	'entity_update_rate',
+	'entity_full_rate_distance',
 	'file_size_limit_mb',
 	'time_recorded_limit_hour',
 ]
@@ -20,8 +27,79 @@ DEFAULT_CONFIG = json.loads(resources_util.get_data('resources/default_config.js
 CONFIG_FILE = 'config.json'
 
 
+def normalize_entity_type(name: str) -> str:
+	name = name.lower()
+	if name.startswith('minecraft:'):
+		name = name[len('minecraft:'):]
+	return name
+
+
+class RecordingSettings:
+	"""
+	An immutable snapshot of the options that are read for every recorded packet, with the derived values precomputed.
+	Config replaces it with a new one whenever an option changes, so a snapshot read once stays consistent
+	"""
+	__slots__ = (
+		'debug_packet', 'daytime', 'weather', 'with_player_only', 'removed_entity_types',
+		'afk_ignore_spectator', 'afk_distance', 'record_packets_when_afk', 'afk_compaction', 'afk_delay_ms', 'checkpoint_interval_ms',
+		'file_size_limit', 'file_buffer_size', 'time_recorded_limit', 'load_shedding_thresholds', 'recording_region',
+		'entity_update_interval_ms', 'entity_full_rate_distance', 'chunk_deduplication',
+	)
+
+	debug_packet: bool
+	daytime: int
+	weather: bool
+	with_player_only: bool
+	removed_entity_types: FrozenSet[str]
+	afk_ignore_spectator: bool
+	afk_distance: float
+	record_packets_when_afk: bool
+	afk_compaction: bool
+	afk_delay_ms: int
+	checkpoint_interval_ms: int
+	file_size_limit: int
+	file_buffer_size: int
+	time_recorded_limit: int
+	load_shedding_thresholds: Tuple[int, ...]
+	recording_region: Optional[RecordingRegion]
+	entity_update_interval_ms: int
+	entity_full_rate_distance: float
+	chunk_deduplication: bool
+
+	def __init__(self, data: dict):
+		values = {
+			'debug_packet': data['debug_packet'],
+			'daytime': data['daytime'],
+			'weather': data['weather'],
+			'with_player_only': data['with_player_only'],
+			'removed_entity_types': frozenset(map(normalize_entity_type, data['removed_entity_types'])) | frozenset(
+				name for name, option in (('item', 'remove_items'), ('bat', 'remove_bats'), ('phantom', 'remove_phantoms')) if data[option]
+			),
+			'afk_ignore_spectator': data['afk_ignore_spectator'],
+			'afk_distance': data['afk_distance'],
+			'record_packets_when_afk': data['record_packets_when_afk'],
+			'afk_compaction': data['afk_compaction'],
+			'afk_delay_ms': data['delay_before_afk_second'] * 1000,
+			'checkpoint_interval_ms': data['checkpoint_interval_second'] * 1000,
+			'file_size_limit': data['file_size_limit_mb'] * constant.BYTE_PER_MB,
+			'file_buffer_size': data['file_buffer_size_mb'] * constant.BYTE_PER_MB,
+			'time_recorded_limit': data['time_recorded_limit_hour'] * constant.MILLI_SECOND_PER_HOUR,
+			'load_shedding_thresholds': tuple(data['load_shedding_thresholds_ms']),
+			'recording_region': RecordingRegion(data['recording_region']) if data['recording_region'] is not None else None,
+			'entity_update_interval_ms': 1000 // data['entity_update_rate'] if data['entity_update_rate'] > 0 else 0,
+			'entity_full_rate_distance': data['entity_full_rate_distance'],
+			'chunk_deduplication': data['chunk_deduplication'],
+		}
+		for key, value in values.items():
+			object.__setattr__(self, key, value)
+
+	def __setattr__(self, key, value):
+		raise AttributeError('RecordingSettings is immutable')
+
+
 class Config:
 	data: dict
+	recording_settings: RecordingSettings
 
 	def __init__(self):
 		self.was_missing_file = False
@@ -36,6 +114,7 @@ class Config:
 			self.data = {}
 			self.was_missing_file = True
 		self.fill_missing_options()
+		self.recording_settings = RecordingSettings(self.data)
 		self.write_to_file()
 
 	def reload(self):
@@ -62,6 +141,7 @@ class Config:
 		if not forced:
 			value = self.convert_to_option_type(option, value)
 		self.data[option] = value
+		self.recording_settings = RecordingSettings(self.data)
 
 	def write_to_file(self):
 		text = json.dumps(self.data, indent=4)
@@ -77,3 +157,34 @@ class Config:
 			return self.data[option]
 		else:
 			raise KeyError('Unknown option name: {}'.format(option))
+
+
+class ProfileConfig(Config):
+	"""
+	The config of a server profile in the server_profiles option: the options in the config file overridden by the ones in the profile.
+	Every profile records into its own sub directory of the temp and storage directories, unless the profile sets them
+
+	It's never written to the config file
+	"""
+	# options that are shared by all profiles, or only make sense for the whole process
+	UNSUPPORTED_OPTIONS = ('authenticate_type', 'username', 'password', 'store_token', 'server_profiles', 'save_workers')
+
+	def __init__(self, profile: dict):
+		self.name: str = profile['name']
+		self.profile = {key: value for key, value in profile.items() if key != 'name'}
+		for key in self.profile.keys():
+			if key not in DEFAULT_CONFIG or key.startswith('__'):
+				raise KeyError('Unknown option name {} in server profile {}'.format(key, self.name))
+			if key in self.UNSUPPORTED_OPTIONS:
+				raise KeyError('Option {} cannot be set in server profile {}'.format(key, self.name))
+		super().__init__()
+
+	def fill_missing_options(self):
+		super().fill_missing_options()
+		for key in ('recording_temp_file_directory', 'recording_storage_directory'):
+			self.data[key] = os.path.join(self.data[key], self.name)
+		self.data['server_profiles'] = []
+		self.data.update(self.profile)
+
+	def write_to_file(self):
+		pass
@@ -0,0 +1,237 @@
+import asyncio
+import sys
+import zlib
+from concurrent.futures import Future
+from threading import Lock, Thread, current_thread
+from typing import Optional, Callable, TypeVar
+
+from minecraft.networking.connection import PlayingReactor
+from minecraft.networking.packets import Packet, PacketBuffer
+from minecraft.networking.packets.clientbound.play import DisconnectPacket
+from minecraft.networking.types import VarInt
+from pcrc.connection.pcrc_connection import PcrcConnection
+
+T = TypeVar('T')
+
+__loop_lock = Lock()
+__loop: Optional[asyncio.AbstractEventLoop] = None
+__loop_thread: Optional[Thread] = None
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+	"""
+	The event loop shared by all asyncio connections in this process, running in its own daemon thread
+	"""
+	global __loop, __loop_thread
+	with __loop_lock:
+		if __loop is None:
+			__loop = asyncio.new_event_loop()
+			__loop_thread = Thread(daemon=True, name='PcrcEventLoop', target=__loop.run_forever)
+			__loop_thread.start()
+		return __loop
+
+
+def is_event_loop_thread() -> bool:
+	return __loop_thread is not None and current_thread() == __loop_thread
+
+
+def call_in_event_loop(func: Callable[[], T]) -> T:
+	"""
+	Invoke the function in the event loop thread and wait for its result
+	"""
+	loop = get_event_loop()
+	if is_event_loop_thread():
+		return func()
+	future = Future()
+
+	def run():
+		try:
+			future.set_result(func())
+		except BaseException as e:
+			future.set_exception(e)
+
+	loop.call_soon_threadsafe(run)
+	return future.result()
+
+
+class AsyncPcrcConnection(PcrcConnection):
+	"""
+	A connection driven by the shared event loop instead of a pycraft networking thread, so many PCRC clients
+	in one process don't need a networking thread each
+
+	The login, encryption and compression are still handled by the pycraft reactors,
+	this class only replaces the networking thread: it reads the packet frames when the socket is readable,
+	reacts to the packets like the networking thread does, and flushes the outgoing packet queue periodically
+
+	Reacting to some packets blocks, like the session server request for the encryption, the reconnecting after the status query,
+	and stopping the recording on disconnecting. They are reacted in the executor of the event loop with the reading paused,
+	so they don't stall the other connections
+	"""
+	RECV_SIZE = 64 * 1024
+	# how often the outgoing packet queue is flushed, in seconds
+	FLUSH_INTERVAL = 0.01
+
+	def __init__(self, *args, **kwargs):
+		super().__init__(*args, **kwargs)
+		self.event_loop = get_event_loop()
+		self.__reader_fd: Optional[int] = None
+		self.__flush_handle: Optional[asyncio.TimerHandle] = None
+		self.__read_buffer = bytearray()
+		# increased whenever the reading restarts, so an outdated reaction in the executor doesn't resume the reading
+		self.__read_generation = 0
+		self.__reacting_in_executor = False
+
+	def has_running_thread(self):
+		return self.__reader_fd is not None
+
+	def _start_network_thread(self):
+		# invoked by Connection.connect() at the end, the socket is connected and the handshake packets are queued
+		sock = self.socket
+		if is_event_loop_thread():
+			self.__start_reading(sock)
+		else:
+			self.event_loop.call_soon_threadsafe(self.__start_reading, sock)
+
+	def disconnect(self, immediate=False):
+		call_in_event_loop(self.__stop_reading)
+		super().disconnect(immediate=immediate)
+
+	def __start_reading(self, sock):
+		if self.__reader_fd is not None:
+			# reconnecting after the status query in the version negotiation
+			self.event_loop.remove_reader(self.__reader_fd)
+		self.__read_buffer = bytearray()
+		self.__read_generation += 1
+		self.__reacting_in_executor = False
+		self.__reader_fd = sock.fileno()
+		self.event_loop.add_reader(self.__reader_fd, self.__on_readable)
+		if self.__flush_handle is None:
+			self.__flush()
+
+	def __stop_reading(self):
+		if self.__reader_fd is not None:
+			self.event_loop.remove_reader(self.__reader_fd)
+			self.__reader_fd = None
+		if self.__flush_handle is not None:
+			self.__flush_handle.cancel()
+			self.__flush_handle = None
+
+	def __flush(self):
+		try:
+			self.__write_queued_packets()
+		except Exception as e:
+			self.__on_exception(e)
+		else:
+			self.__flush_handle = self.event_loop.call_later(self.FLUSH_INTERVAL, self.__flush)
+
+	def __write_queued_packets(self):
+		with self._write_lock:
+			while len(self._outgoing_packet_queue) > 0 and self.socket is not None:
+				self._write_packet(self._outgoing_packet_queue.popleft())
+
+	def __on_exception(self, exception: Exception):
+		self.__stop_reading()
+		self._handle_exception(exception, sys.exc_info())
+
+	def __on_readable(self):
+		try:
+			# the socket is readable so it doesn't block, the encrypted socket wrapper decrypts the data
+			data = self.socket.recv(self.RECV_SIZE)
+			if len(data) == 0:
+				raise EOFError('Connection closed by the server')
+			self.__read_buffer += data
+			self.__read_frames()
+		except Exception as e:
+			self.__on_exception(e)
+
+	def __read_frames(self):
+		buffer = self.__read_buffer
+		offset = 0
+		# reacting to a packet might disconnect, or reconnect with a new read buffer
+		while self.__reader_fd is not None and buffer is self.__read_buffer and not self.__reacting_in_executor:
+			length = 0
+			for i in range(5):
+				if offset + i >= len(buffer):
+					length = -1
+					break
+				byte = buffer[offset + i]
+				length |= (byte & 0x7F) << (7 * i)
+				if not byte & 0x80:
+					header_size = i + 1
+					break
+			else:
+				raise ValueError('Packet length VarInt is too big')
+			if length < 0 or offset + header_size + length > len(buffer):
+				break
+			packet_data = PacketBuffer()
+			# the frame is copied once into the packet buffer, the views are released before the read buffer is resized
+			with memoryview(buffer) as view, view[offset + header_size:offset + header_size + length] as frame:
+				packet_data.send(frame)
+			packet_data.reset_cursor()
+			offset += header_size + length
+			packet = self.__read_packet(packet_data)
+			if self.__is_blocking_reaction(packet):
+				self.__react_in_executor(packet)
+			else:
+				self._react(packet)
+		del buffer[:offset]
+
+	def __is_blocking_reaction(self, packet: Packet) -> bool:
+		# the login reactors request the session server and reconnect, the disconnect packet listener stops the recording
+		return not isinstance(self.reactor, PlayingReactor) or isinstance(packet, DisconnectPacket)
+
+	def __react_in_executor(self, packet: Packet):
+		self.__reacting_in_executor = True
+		self.event_loop.remove_reader(self.__reader_fd)
+		generation = self.__read_generation
+		future = self.event_loop.run_in_executor(None, self._react, packet)
+		future.add_done_callback(lambda f: self.__on_reacted_in_executor(f, generation))
+
+	def __on_reacted_in_executor(self, future: 'asyncio.Future', generation: int):
+		if generation != self.__read_generation or self.__reader_fd is None:
+			# reconnected or disconnected during the reaction
+			return
+		self.__reacting_in_executor = False
+		try:
+			future.result()
+			self.event_loop.add_reader(self.__reader_fd, self.__on_readable)
+			# the frames received after the packet are still in the read buffer
+			self.__read_frames()
+		except Exception as e:
+			self.__on_exception(e)
+
+	def __read_packet(self, packet_data: PacketBuffer) -> Packet:
+		"""
+		What the patched PacketReactor.read_packet does after reading the packet frame, see pcrc.connection.patch
+		"""
+		reactor = self.reactor
+		if self.options.compression_enabled:
+			decompressed_size = VarInt.read(packet_data)
+			if decompressed_size > 0:
+				decompressed_packet = zlib.decompress(packet_data.read())
+				if len(decompressed_packet) != decompressed_size:
+					raise ValueError('Decompressed length {} does not match the expected length {}'.format(len(decompressed_packet), decompressed_size))
+				packet_data.reset()
+				packet_data.send(decompressed_packet)
+				packet_data.reset_cursor()
+
+		packet_raw = packet_data.bytes.getbuffer()
+		packet_id = VarInt.read(packet_data)
+		packet = self.fast_lane.react(reactor, packet_id, packet_data, packet_raw)
+		if packet is not None:
+			return packet
+		packet = self.raw_packet_filter.filter(reactor, packet_id, packet_data, packet_raw)
+		if packet is not None:
+			return packet
+
+		packet_class = reactor.clientbound_packets.get(packet_id)
+		if packet_class is not None:
+			packet = packet_class()
+			packet.context = self.context
+			packet.read(packet_data)
+		else:
+			packet = Packet()
+			packet.context = self.context
+			packet.id = packet_id
+		packet.raw_data = packet_raw
+		return packet
@@ -0,0 +1,100 @@
+from logging import Logger
+from typing import TYPE_CHECKING, Optional, Dict, Type
+
+from minecraft.networking.connection import PacketReactor, PlayingReactor
+from minecraft.networking.packets import Packet, PacketBuffer, PlayerPositionAndLookPacket, PositionAndLookPacket
+from minecraft.networking.packets.clientbound.play import KeepAlivePacket
+from minecraft.networking.packets.serverbound.play import KeepAlivePacket as ServerboundKeepAlivePacket, TeleportConfirmPacket
+from pcrc.utils import misc_util
+
+if TYPE_CHECKING:
+	from pcrc.pcrc_client import PcrcClient
+
+
+class KeepAliveMetrics:
+	def __init__(self):
+		self.received_count = 0
+		self.last_received_time: Optional[int] = None
+		# the time between reading the keep-alive packet and sending the reply
+		self.last_reply_time_ms = 0
+		self.max_reply_time_ms = 0
+
+
+class FastLane:
+	"""
+	Answers keep-alive and player position and look packets right after reading them in the networking thread,
+	before the packet listeners and anything else, so a busy PCRC doesn't get kicked for timing out
+
+	pycraft doesn't react to the packets answered here again
+	"""
+	def __init__(self, pcrc: 'PcrcClient'):
+		self.logger: Logger = pcrc.logger
+		self.__packet_table: Optional[Dict[int, Type[Packet]]] = None
+		self.__keep_alive_id: Optional[int] = None
+		self.__position_and_look_id: Optional[int] = None
+		self.metrics = KeepAliveMetrics()
+
+	def reset(self):
+		self.__packet_table = None
+		self.metrics = KeepAliveMetrics()
+
+	def __rebuild(self, packet_table: Dict[int, Type[Packet]]):
+		self.__keep_alive_id = self.__position_and_look_id = None
+		for packet_id, packet_class in packet_table.items():
+			if issubclass(packet_class, KeepAlivePacket):
+				self.__keep_alive_id = packet_id
+			elif issubclass(packet_class, PlayerPositionAndLookPacket):
+				self.__position_and_look_id = packet_id
+		self.__packet_table = packet_table
+
+	def react(self, reactor: PacketReactor, packet_id: int, packet_data: PacketBuffer, raw_data: memoryview) -> Optional[Packet]:
+		"""
+		:return: The packet if it's answered, otherwise None
+		"""
+		if not isinstance(reactor, PlayingReactor):
+			return None
+		if reactor.clientbound_packets is not self.__packet_table:
+			self.__rebuild(reactor.clientbound_packets)
+
+		if packet_id == self.__keep_alive_id:
+			read_time = misc_util.get_milli_time()
+			keep_alive = KeepAlivePacket(context=reactor.connection.context)
+			keep_alive.read(packet_data)
+			reactor.connection.write_packet(ServerboundKeepAlivePacket(keep_alive_id=keep_alive.keep_alive_id), force=True)
+			self.__on_keep_alive_replied(read_time)
+
+			# not the KeepAlivePacket, or pycraft will reply it again
+			packet = Packet(context=reactor.connection.context)
+			packet.id = packet_id
+			packet.raw_data = raw_data
+			return packet
+
+		elif packet_id == self.__position_and_look_id:
+			packet = PlayerPositionAndLookPacket(context=reactor.connection.context)
+			packet.read(packet_data)
+			teleport_confirm = TeleportConfirmPacket()
+			teleport_confirm.teleport_id = packet.teleport_id
+			reactor.connection.write_packet(teleport_confirm, force=True)
+			position_response = PositionAndLookPacket()
+			position_response.x = packet.x
+			position_response.feet_y = packet.y
+			position_response.z = packet.z
+			position_response.yaw = packet.yaw
+			position_response.pitch = packet.pitch
+			position_response.on_ground = True
+			reactor.connection.write_packet(position_response, force=True)
+
+			packet.answered_in_fast_lane = True
+			packet.raw_data = raw_data
+			return packet
+
+		return None
+
+	def __on_keep_alive_replied(self, read_time: int):
+		reply_time = misc_util.get_milli_time() - read_time
+		self.metrics.received_count += 1
+		self.metrics.last_received_time = read_time
+		self.metrics.last_reply_time_ms = reply_time
+		self.metrics.max_reply_time_ms = max(self.metrics.max_reply_time_ms, reply_time)
+		if reply_time >= 1000:
+			self.logger.warning('It took {}ms to reply the keep-alive packet'.format(reply_time))
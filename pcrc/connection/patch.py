@@ -1,9 +1,15 @@
+import hashlib
+import importlib.util
+import marshal
+import os
 from threading import Lock
-from typing import Set
+from types import CodeType
+from typing import Dict, FrozenSet, Type
 
-from redbaron import RedBaron, IfelseblockNode, AssignmentNode, WithNode
+from pcrc import constant
 
-from pcrc.utils import redbaron_util
+# the pycraft classes patched with RedBaron are cached here, since parsing them with RedBaron is slow
+PATCH_CACHE_FILE = os.path.join('PCRC_cache', 'pycraft_patch.cache')
 
 __patch_lock = Lock()
 __patched = False
@@ -18,17 +24,72 @@ def patch_pycraft():
 
 	print('Patching PyCraft...')
 
+	patched_classes = __get_patched_classes()
 	__extends_protocol_version_range()
 	__player_position_fix()
 	__custom_s2c_packet_registering()
 	__network_thread_running_state_hook()
-	__default_proto_version_inject()
+	__default_proto_version_inject(patched_classes['Connection'])
 	__playing_reactor_switch_listener()
-	__raw_packet_recording()
+	__raw_packet_recording(patched_classes['PacketReactor'])
 
 	print('Patched PyCraft')
 
 
+def __get_patch_cache_key() -> str:
+	"""
+	The patched classes depend on the pycraft source, the patching code, the PCRC version, and the Python version for the compiled code
+	"""
+	sha = hashlib.sha256()
+	# the modules are not imported, so redbaron isn't imported with redbaron_util
+	for module_name in ('minecraft.networking.connection', __name__, 'pcrc.utils.redbaron_util'):
+		spec = importlib.util.find_spec(module_name)
+		source = spec.loader.get_source(module_name) if spec is not None else None
+		if source is not None:
+			sha.update(source.encode('utf8'))
+	sha.update(constant.VERSION.encode('utf8'))
+	sha.update(importlib.util.MAGIC_NUMBER)
+	return sha.hexdigest()
+
+
+def __get_patched_classes() -> Dict[str, CodeType]:
+	"""
+	:return: The compiled source of the patched pycraft classes, from the cache file if it's up to date
+	"""
+	key = __get_patch_cache_key()
+	try:
+		with open(PATCH_CACHE_FILE, 'rb') as f:
+			data = marshal.load(f)
+		if data['key'] == key:
+			return data['classes']
+	except FileNotFoundError:
+		pass
+	except (OSError, EOFError, ValueError, TypeError, KeyError) as e:
+		print('Failed to load the patched PyCraft cache: {}'.format(e))
+
+	patched_classes = {
+		'Connection': compile(__make_patched_connection_source(), '<patched Connection>', 'exec'),
+		'PacketReactor': compile(__make_patched_packet_reactor_source(), '<patched PacketReactor>', 'exec'),
+	}
+	# written to a temp file then moved, so other PCRC processes starting at the same time never read a partial cache
+	temp_file = '{}.{}.tmp'.format(PATCH_CACHE_FILE, os.getpid())
+	try:
+		os.makedirs(os.path.dirname(PATCH_CACHE_FILE), exist_ok=True)
+		with open(temp_file, 'wb') as f:
+			marshal.dump({'key': key, 'classes': patched_classes}, f)
+		os.replace(temp_file, PATCH_CACHE_FILE)
+	except OSError as e:
+		print('Failed to save the patched PyCraft cache: {}'.format(e))
+	return patched_classes
+
+
+def __exec_patched_class(patched_class: CodeType, class_name: str) -> type:
+	import minecraft.networking.connection as connection
+	globals_ = dict(connection.__dict__)
+	exec(patched_class, globals_)
+	return globals_[class_name]
+
+
 def __extends_protocol_version_range():
 	import minecraft
 	minecraft.KNOWN_MINECRAFT_VERSION_RECORDS.append(minecraft.Version('1.18.2', 758, True))
@@ -40,6 +101,10 @@ def __player_position_fix():
 	from minecraft.networking.packets import PositionAndLookPacket
 
 	def patched_PlayingReactor_react(self, packet):
+		if getattr(packet, 'answered_in_fast_lane', False):
+			# the responses are sent already, see pcrc.connection.fast_lane
+			self.connection.spawned = True
+			return
 		original_react(self, packet)
 		if packet.packet_name == "player position and look" and self.connection.context.protocol_later_eq(107):
 			position_response = PositionAndLookPacket()
@@ -56,17 +121,27 @@ def __player_position_fix():
 
 
 def __custom_s2c_packet_registering():
-	from pcrc.packets import s2c
+	from pcrc.packets import s2c, packet_table
 	from minecraft.networking.connection import PlayingReactor
 	from minecraft.networking.packets import Packet
 
+	# protocol version -> the packet classes
+	packets_cache: Dict[int, FrozenSet[Type[Packet]]] = {}
+
 	def patched_get_packets(context):
-		packets: Set[Packet] = original_get_packets(context)
-		packets |= s2c.PACKETS
+		packets = packets_cache.get(context.protocol_version)
+		if packets is None:
+			packets = packets_cache[context.protocol_version] = frozenset(original_get_packets(context) | s2c.PACKETS)
 		return packets
 
+	# the packet id map is computed once for every protocol version, instead of for every reactor
+	def patched_init(self, connection):
+		self.connection = connection
+		self.clientbound_packets = packet_table.get_clientbound_table(connection.context.protocol_version).classes
+
 	original_get_packets = PlayingReactor.get_clientbound_packets
 	PlayingReactor.get_clientbound_packets = staticmethod(patched_get_packets)
+	PlayingReactor.__init__ = patched_init
 
 
 def __network_thread_running_state_hook():
@@ -86,12 +161,13 @@ def __network_thread_running_state_hook():
 	NetworkingThread.run = patched_network_thread_run
 
 
-def __default_proto_version_inject():
+def __make_patched_connection_source() -> str:
 	"""
 	modified the value to default_proto_version if there are multiple allow version
 	"""
-	import minecraft.networking.connection as connection
+	from redbaron import RedBaron, AssignmentNode, WithNode
 	from minecraft.networking.connection import Connection
+	from pcrc.utils import redbaron_util
 
 	red, connection_class = redbaron_util.read_class(Connection)
 	connect_method = redbaron_util.get_def(connection_class, 'connect')
@@ -105,10 +181,13 @@ def __default_proto_version_inject():
 	# idk why but this thing prevents IndentationError from method _connect from happening
 	connect_method.value.insert(0, 'pass')
 
-	patched_class_source = red.dumps()
-	globals_ = dict(connection.__dict__)
-	exec(patched_class_source, globals_)
-	PatchedConnection = globals_['Connection']
+	return red.dumps()
+
+
+def __default_proto_version_inject(patched_class: CodeType):
+	from minecraft.networking.connection import Connection
+
+	PatchedConnection = __exec_patched_class(patched_class, 'Connection')
 	Connection.connect = PatchedConnection.connect
 
 
@@ -125,9 +204,10 @@ def __playing_reactor_switch_listener():
 	LoginReactor.react = patched_network_thread_run
 
 
-def __raw_packet_recording():
-	import minecraft.networking.connection as connection
+def __make_patched_packet_reactor_source() -> str:
+	from redbaron import IfelseblockNode, AssignmentNode
 	from minecraft.networking.connection import PacketReactor
+	from pcrc.utils import redbaron_util
 
 	red, packet_reactor_class = redbaron_util.read_class(PacketReactor)
 	packet_reactor_class.name = 'PatchedPacketReactor'
@@ -136,8 +216,16 @@ def __raw_packet_recording():
 	main_if_body_nodes = main_if_else_node.value[0]
 	for i, node in enumerate(main_if_body_nodes):
 		if isinstance(node, AssignmentNode) and node.target.value == 'packet_id':
-			main_if_body_nodes.insert(i, 'packet_raw = copy.deepcopy(packet_data.bytes.getvalue())')
-			main_if_body_nodes.insert(i, 'import copy')
+			# a view of the packet buffer without copying. The buffer is only read from now on, so it's safe to export it
+			main_if_body_nodes.insert(i, 'packet_raw = packet_data.bytes.getbuffer()')
+			# skip decoding the packets no one is interested in, see pcrc.recording.raw_packet_filter
+			main_if_body_nodes.insert(i + 2, 'if filtered_packet is not None: return filtered_packet')
+			main_if_body_nodes.insert(i + 2, 'filtered_packet = packet_filter.filter(self, packet_id, packet_data, packet_raw) if packet_filter is not None else None')
+			main_if_body_nodes.insert(i + 2, 'packet_filter = getattr(self.connection, \'raw_packet_filter\', None)')
+			# answer keep-alive before anything else, see pcrc.connection.fast_lane
+			main_if_body_nodes.insert(i + 2, 'if fast_lane_packet is not None: return fast_lane_packet')
+			main_if_body_nodes.insert(i + 2, 'fast_lane_packet = fast_lane.react(self, packet_id, packet_data, packet_raw) if fast_lane is not None else None')
+			main_if_body_nodes.insert(i + 2, 'fast_lane = getattr(self.connection, \'fast_lane\', None)')
 			break
 	else:
 		raise Exception('Cannot found packet_id assignment node in PacketReactor#read_packet')
@@ -145,8 +233,11 @@ def __raw_packet_recording():
 
 	patched_class_source = red.dumps()
 	# print(patched_class_source)
+	return patched_class_source
 
-	globals_ = dict(connection.__dict__)
-	exec(patched_class_source, globals_)
-	PatchedPacketReactor = globals_['PatchedPacketReactor']
+
+def __raw_packet_recording(patched_class: CodeType):
+	from minecraft.networking.connection import PacketReactor
+
+	PatchedPacketReactor = __exec_patched_class(patched_class, 'PatchedPacketReactor')
 	PacketReactor.read_packet = PatchedPacketReactor.read_packet
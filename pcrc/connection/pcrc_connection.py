@@ -11,6 +11,10 @@ class PcrcConnection(Connection):
 	def __init__(self, *args, pcrc: 'PcrcClient', **kwargs):
 		super().__init__(*args, **kwargs)
 		self.pcrc: 'PcrcClient' = pcrc
+		self.raw_packet_filter = pcrc.recorder.raw_packet_filter
+		self.fast_lane = pcrc.fast_lane
+		# the event loop driving this connection, None if it's driven by a pycraft networking thread
+		self.event_loop = None
 		self.running_networking_thread = 0
 		self.__running_networking_thread_lock = Lock()
 
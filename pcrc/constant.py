@@ -1,7 +1,8 @@
 VERSION = '1.4.1'
 PACKAGE_NAME = 'pcrc'
 
-MILLI_SECOND_PER_HOUR = 60 * 60 * 1000
+MILLI_SECOND_PER_MINUTE = 60 * 1000
+MILLI_SECOND_PER_HOUR = 60 * MILLI_SECOND_PER_MINUTE
 BYTE_PER_KB = 1024
 BYTE_PER_MB = BYTE_PER_KB * 1024
 MINIMUM_LEGAL_FILE_SIZE = 10 * BYTE_PER_KB
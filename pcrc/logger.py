@@ -29,13 +29,13 @@ class PcrcLogger(Logger):
 	}
 	FILE_FMT = Formatter('[%(asctime)s] [%(threadName)s/%(levelname)s]: %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
-	def __init__(self):
+	def __init__(self, file_name: str = LOG_FILE_PATH):
 		super().__init__('PCRC')
 		self.console_handler: Optional[Handler] = None
 		self.file_handler: Optional[Handler] = None
 
 		self.set_console_handler(StreamHandler(sys.stdout))
-		self.set_file_handler(LOG_FILE_PATH)
+		self.set_file_handler(file_name)
 
 	def set_debug(self, show_debug: bool):
 		self.setLevel(DEBUG if show_debug else INFO)
@@ -63,10 +63,20 @@ def register_command(server: PluginServerInterface):
 		then(Literal('start').runs(start_pcrc)).
 		then(Literal('stop').runs(stop_pcrc)).
 		then(Literal('reload').runs(reload_config)).
+		then(Literal('recover').runs(recover_recordings)).
 		then(Literal('set_redirect_url').then(GreedyText('url').runs(set_redirect_url)))
 	)
 
 
+@new_thread('PCRC Recover')
+def recover_recordings(source: CommandSource):
+	if pcrc.is_running():
+		source.reply('PCRC is running, stop it before recovering recordings')
+	else:
+		recovered = pcrc.recover_recordings()
+		source.reply('Recovered {} replay file(s)'.format(len(recovered)))
+
+
 def set_redirect_url(source: CommandSource, context: CommandContext):
 	user_inputs.put_nowait(context['url'])
 
@@ -1,5 +1,5 @@
 from minecraft.networking.packets import Packet
-from minecraft.networking.types import UUID
+from minecraft.networking.types import UUID, String, Byte, VarInt, Boolean, UnsignedByte
 from pcrc.utils import packet_util
 
 
@@ -19,4 +19,43 @@ class SpectatePacket(Packet):
 		return [{'target': UUID}]
 
 
+class ClientSettingsPacket(Packet):
+	"""
+	pycraft's one doesn't have the fields added in 1.17+
+	"""
+	@classmethod
+	def get_id(cls, context):
+		return \
+			0x05 if context.protocol_later_eq(498) else \
+			0x04 if context.protocol_later_eq(340) else \
+			0x05
+
+	packet_name = 'Client Settings'
+
+	locale: str = 'en_us'
+	view_distance: int
+	chat_mode: int = 0  # enabled
+	chat_colors: bool = True
+	displayed_skin_parts: int = 0x7F  # all parts
+	main_hand: int = 1  # right
+	enable_text_filtering: bool = False
+	allow_server_listings: bool = True
+
+	@classmethod
+	def get_definition(cls, context):
+		definition = [
+			{'locale': String},
+			{'view_distance': Byte},
+			{'chat_mode': VarInt},
+			{'chat_colors': Boolean},
+			{'displayed_skin_parts': UnsignedByte},
+			{'main_hand': VarInt},
+		]
+		if context.protocol_later_eq(755):
+			definition.append({'enable_text_filtering': Boolean})
+		if context.protocol_later_eq(757):
+			definition.append({'allow_server_listings': Boolean})
+		return definition
+
+
 PACKETS = packet_util.gather_all_packet_classes(globals().values())
@@ -0,0 +1,53 @@
+from threading import Lock
+from typing import Dict, Type, Iterable, Optional
+
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import Packet
+
+
+class PacketTable:
+	"""
+	The ids and the classes of the packets of a protocol version, computed once from the get_id chains of the packet classes
+	"""
+	def __init__(self, protocol_version: int, packet_classes: Iterable[Type[Packet]]):
+		context = self.__context = ConnectionContext(protocol_version=protocol_version)
+		self.protocol_version = protocol_version
+		self.ids: Dict[Type[Packet], int] = {}
+		# it's shared by all PlayingReactors of the protocol version as their clientbound_packets, don't modify it
+		self.classes: Dict[int, Type[Packet]] = {}
+		for packet_class in packet_classes:
+			packet_id = packet_class.get_id(context)
+			self.ids[packet_class] = packet_id
+			if packet_id != -1:
+				self.classes[packet_id] = packet_class
+
+	def get_id(self, packet_class: Type[Packet]) -> int:
+		"""
+		Packet classes out of the table, like the ones PCRC doesn't register, are added on their first lookup
+		"""
+		packet_id = self.ids.get(packet_class)
+		if packet_id is None:
+			packet_id = self.ids[packet_class] = packet_class.get_id(self.__context)
+		return packet_id
+
+	def get_class(self, packet_id: int) -> Optional[Type[Packet]]:
+		return self.classes.get(packet_id)
+
+
+__clientbound_tables: Dict[int, PacketTable] = {}
+__clientbound_tables_lock = Lock()
+
+
+def get_clientbound_table(protocol_version: int) -> PacketTable:
+	"""
+	The table of the play state clientbound packets, including the ones PCRC registers
+	"""
+	table = __clientbound_tables.get(protocol_version)
+	if table is None:
+		from minecraft.networking.connection import PlayingReactor
+		with __clientbound_tables_lock:
+			table = __clientbound_tables.get(protocol_version)
+			if table is None:
+				context = ConnectionContext(protocol_version=protocol_version)
+				table = __clientbound_tables[protocol_version] = PacketTable(protocol_version, PlayingReactor.get_clientbound_packets(context))
+	return table
@@ -1,7 +1,7 @@
 from typing import List
 
 from minecraft.networking.packets import Packet
-from minecraft.networking.types import VarInt, Byte, Float, UUID
+from minecraft.networking.types import VarInt, Byte, Float, UUID, Integer, Double, String, Position
 from pcrc.packets.s2c import entity_packet
 from pcrc.utils import packet_util
 
@@ -73,17 +73,189 @@ class SpawnLivingEntityPacket(Packet):
 	entity_id: int
 	entity_uuid: str
 	type_id: int
+	x: float
+	y: float
+	z: float
 
 	definition = [
 		{'entity_id': VarInt},
 		{'entity_uuid': UUID},
 		{'type_id': VarInt},
+		{'x': Double},
+		{'y': Double},
+		{'z': Double},
 		# i don't care the rest of the packet
 	]
 
 	packet_name = 'Spawn Living Entity'
 
 
+class SpawnExperienceOrbPacket(Packet):
+	@classmethod
+	def get_id(cls, context):
+		return \
+			1 if context.protocol_later_eq(335) else \
+			-1
+
+	entity_id: int
+	x: float
+	y: float
+	z: float
+
+	definition = [
+		{'entity_id': VarInt},
+		{'x': Double},
+		{'y': Double},
+		{'z': Double},
+		# i don't care the rest of the packet
+	]
+
+	packet_name = 'Spawn Experience Orb'
+
+
+class SpawnPaintingPacket(Packet):
+	@classmethod
+	def get_id(cls, context):
+		return \
+			3 if context.protocol_later_eq(736) else \
+			4 if context.protocol_later_eq(335) else \
+			-1
+
+	entity_id: int
+	entity_uuid: str
+	location: Position
+
+	@classmethod
+	def get_definition(cls, context):
+		return [
+			{'entity_id': VarInt},
+			{'entity_uuid': UUID},
+			{'motive': VarInt if context.protocol_later_eq(393) else String},
+			{'location': Position},
+			# i don't care the rest of the packet
+		]
+
+	packet_name = 'Spawn Painting'
+
+
+class ChunkDataPacket(Packet):
+	"""
+	wiki.vg names:
+	- <1.18: "Chunk Data"
+	- 1.18: "Chunk Data and Update Light"
+	"""
+	@classmethod
+	def get_id(cls, context):
+		return \
+			34 if context.protocol_later_eq(756) else \
+			32 if context.protocol_later_eq(751) else \
+			33 if context.protocol_later_eq(736) else \
+			34 if context.protocol_later_eq(578) else \
+			33 if context.protocol_later_eq(498) else \
+			32 if context.protocol_later_eq(335) else \
+			-1
+
+	chunk_x: int
+	chunk_z: int
+
+	definition = [
+		{'chunk_x': Integer},
+		{'chunk_z': Integer},
+		# i don't care the rest of the packet
+	]
+
+	packet_name = 'Chunk Data'
+
+
+class UnloadChunkPacket(Packet):
+	@classmethod
+	def get_id(cls, context):
+		return \
+			29 if context.protocol_later_eq(756) else \
+			28 if context.protocol_later_eq(751) else \
+			29 if context.protocol_later_eq(736) else \
+			30 if context.protocol_later_eq(578) else \
+			29 if context.protocol_later_eq(335) else \
+			-1
+
+	chunk_x: int
+	chunk_z: int
+
+	definition = [
+		{'chunk_x': Integer},
+		{'chunk_z': Integer}
+	]
+
+	packet_name = 'Unload Chunk'
+
+
+class UpdateLightPacket(Packet):
+	"""
+	1.14+
+	"""
+	@classmethod
+	def get_id(cls, context):
+		return \
+			37 if context.protocol_later_eq(756) else \
+			35 if context.protocol_later_eq(751) else \
+			36 if context.protocol_later_eq(736) else \
+			37 if context.protocol_later_eq(578) else \
+			36 if context.protocol_later_eq(498) else \
+			-1
+
+	chunk_x: int
+	chunk_z: int
+
+	definition = [
+		{'chunk_x': VarInt},
+		{'chunk_z': VarInt},
+		# i don't care the rest of the packet
+	]
+
+	packet_name = 'Update Light'
+
+
+class UpdateViewPositionPacket(Packet):
+	"""
+	1.14+
+	"""
+	@classmethod
+	def get_id(cls, context):
+		return \
+			73 if context.protocol_later_eq(756) else \
+			64 if context.protocol_later_eq(736) else \
+			65 if context.protocol_later_eq(578) else \
+			64 if context.protocol_later_eq(498) else \
+			-1
+
+	definition = [
+		{'chunk_x': VarInt},
+		{'chunk_z': VarInt}
+	]
+
+	packet_name = 'Update View Position'
+
+
+class UpdateViewDistancePacket(Packet):
+	"""
+	1.14+
+	"""
+	@classmethod
+	def get_id(cls, context):
+		return \
+			74 if context.protocol_later_eq(756) else \
+			65 if context.protocol_later_eq(736) else \
+			66 if context.protocol_later_eq(578) else \
+			65 if context.protocol_later_eq(498) else \
+			-1
+
+	definition = [
+		{'view_distance': VarInt}
+	]
+
+	packet_name = 'Update View Distance'
+
+
 PACKETS = packet_util.gather_all_packet_classes(globals().values())
 PACKETS |= entity_packet.PACKETS
 
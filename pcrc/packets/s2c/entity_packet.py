@@ -1,7 +1,7 @@
 from abc import ABC, abstractmethod
 
 from minecraft.networking.packets import Packet
-from minecraft.networking.types import VarInt
+from minecraft.networking.types import VarInt, Double, UnsignedByte, Boolean
 from pcrc.utils import packet_util
 
 
@@ -100,6 +100,15 @@ class EntityRotationPacket(AbstractEntityPacket):
 
 
 class EntityTeleportPacket(AbstractEntityPacket):
+	x: float
+	y: float
+	z: float
+	yaw: int = 0
+	pitch: int = 0
+	on_ground: bool = True
+
+	fields = 'entity_id', 'x', 'y', 'z'
+
 	@classmethod
 	def get_id(cls, context):
 		return \
@@ -114,6 +123,24 @@ class EntityTeleportPacket(AbstractEntityPacket):
 
 	packet_name = 'Entity Teleport'
 
+	def read(self, file_object):
+		super().read(file_object)
+		self.x = Double.read(file_object)
+		self.y = Double.read(file_object)
+		self.z = Double.read(file_object)
+		self.yaw = UnsignedByte.read(file_object)
+		self.pitch = UnsignedByte.read(file_object)
+		self.on_ground = Boolean.read(file_object)
+
+	def write_fields(self, packet_buffer):
+		VarInt.send(self.entity_id, packet_buffer)
+		Double.send(self.x, packet_buffer)
+		Double.send(self.y, packet_buffer)
+		Double.send(self.z, packet_buffer)
+		UnsignedByte.send(self.yaw, packet_buffer)
+		UnsignedByte.send(self.pitch, packet_buffer)
+		Boolean.send(self.on_ground, packet_buffer)
+
 
 class EntityStatusPacket(AbstractEntityPacket):
 	@classmethod
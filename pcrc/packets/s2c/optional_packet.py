@@ -0,0 +1,54 @@
+"""
+Packets that are nice to have in the replay but not necessary, they can be dropped when PCRC is overloaded
+
+PCRC only needs their packet ids, so they are not registered to pycraft
+"""
+from minecraft.networking.packets import Packet
+
+
+class SoundEffectPacket(Packet):
+	@classmethod
+	def get_id(cls, context):
+		return \
+			93 if context.protocol_later_eq(757) else \
+			92 if context.protocol_later_eq(756) else \
+			81 if context.protocol_later_eq(736) else \
+			82 if context.protocol_later_eq(578) else \
+			81 if context.protocol_later_eq(498) else \
+			73 if context.protocol_later_eq(340) else \
+			72 if context.protocol_later_eq(335) else \
+			-1
+
+	packet_name = 'Sound Effect'
+	definition = []
+
+
+class NamedSoundEffectPacket(Packet):
+	@classmethod
+	def get_id(cls, context):
+		return \
+			25 if context.protocol_later_eq(756) else \
+			24 if context.protocol_later_eq(751) else \
+			25 if context.protocol_later_eq(736) else \
+			26 if context.protocol_later_eq(578) else \
+			25 if context.protocol_later_eq(335) else \
+			-1
+
+	packet_name = 'Named Sound Effect'
+	definition = []
+
+
+class ParticlePacket(Packet):
+	@classmethod
+	def get_id(cls, context):
+		return \
+			36 if context.protocol_later_eq(756) else \
+			34 if context.protocol_later_eq(751) else \
+			35 if context.protocol_later_eq(736) else \
+			36 if context.protocol_later_eq(578) else \
+			35 if context.protocol_later_eq(498) else \
+			34 if context.protocol_later_eq(335) else \
+			-1
+
+	packet_name = 'Particle'
+	definition = []
@@ -2,18 +2,23 @@ import json
 import socket
 import time
 import traceback
+from concurrent.futures import Executor
 from threading import Lock, Event
-from typing import Optional, Callable, Any
+from typing import Optional, Callable, Any, List
 
 from minecraft.networking.packets import Packet, JoinGamePacket
-from minecraft.networking.packets.clientbound.play import DisconnectPacket, ChatMessagePacket, TimeUpdatePacket
+from minecraft.networking.packets.clientbound.play import DisconnectPacket, ChatMessagePacket, TimeUpdatePacket, RespawnPacket
 from pcrc import protocol
 from pcrc.config import Config, SettableOptions
+from pcrc.connection.async_connection import AsyncPcrcConnection
+from pcrc.connection.fast_lane import FastLane
 from pcrc.connection.pcrc_authentication import Authenticator
 from pcrc.connection.pcrc_connection import PcrcConnection
 from pcrc.input import InputManager, StdinInputManager
+from pcrc.packets.c2s import ClientSettingsPacket
 from pcrc.logger import PcrcLogger
 from pcrc.recording.chat import ChatManager, ChatPriority
+from pcrc.recording import recovery
 from pcrc.recording.recorder import Recorder
 from pcrc.states import ConnectionState
 from pcrc.utils import misc_util
@@ -22,14 +27,29 @@ from pcrc.utils.translation import Translation
 
 
 class PcrcClient:
-	def __init__(self, *, input_manager: Optional[InputManager] = None):
-		self.logger: PcrcLogger = PcrcLogger()
-		self.config = Config()
+	def __init__(
+			self, *, input_manager: Optional[InputManager] = None, config: Optional[Config] = None,
+			authenticator: Optional[Authenticator] = None, save_executor: Optional[Executor] = None
+	):
+		"""
+		The optional arguments are given by PcrcSupervisor to the clients of the server profiles
+
+		:param authenticator: The authenticator shared with another client
+		:param save_executor: The worker pool to save the replay files in, instead of a thread for every saving
+		"""
+		self.config = config or Config()
+		profile_name: Optional[str] = getattr(self.config, 'name', None)
+		self.logger: PcrcLogger = PcrcLogger() if profile_name is None else PcrcLogger('logs/PCRC_{}.log'.format(profile_name))
+		if profile_name is not None:
+			self.logger.set_console_logging_prefix(profile_name)
 		self.translation = Translation()
+		self.save_executor = save_executor
 		self.chat_manager = ChatManager(self)
 		self.recorder = Recorder(self)
+		self.fast_lane = FastLane(self)
 		self.input_manager = input_manager or StdinInputManager()
-		self.authenticator = Authenticator.get_class(self.config.get('authenticate_type'))(self)
+		self.__owns_authenticator = authenticator is None
+		self.authenticator = authenticator or Authenticator.get_class(self.config.get('authenticate_type'))(self)
 		self.retry_counter = RetryCounter(self.config.get('auto_relogin_attempts'))
 
 		self.logger.set_debug(self.config.get('debug_mode'))
@@ -44,7 +64,25 @@ class PcrcClient:
 		self.__start_lock = Lock()
 
 	def init(self):
-		self.authenticator.init()
+		if self.config.get('recover_on_startup'):
+			self.recover_recordings()
+		if self.__owns_authenticator:
+			self.authenticator.init()
+
+	def recover_recordings(self) -> List[str]:
+		"""
+		Rebuild replay files from the unsaved recordings in the temp directory
+		:return: The paths of the recovered replay files
+		"""
+		if not self.recorder.is_stopped():
+			self.logger.warning('Cannot recover recordings when PCRC is recording')
+			return []
+		return recovery.recover_all(
+			self.logger,
+			self.config.get('recording_temp_file_directory'),
+			self.config.get('recording_storage_directory'),
+			self.config.get('compress_threads')
+		)
 
 	def __del__(self):
 		try:
@@ -62,6 +100,8 @@ class PcrcClient:
 		self.chat(self.tr('chat.option_set', option, value))
 		self.config.set_value(option, value)
 		self.logger.info('Option <{}> set to <{}>'.format(option, value))
+		if option == 'view_distance':
+			self.send_client_settings()
 
 	def reload_config(self) -> bool:
 		self.logger.info('Reloading config')
@@ -78,6 +118,7 @@ class PcrcClient:
 		# authenticate_type doesn't support hot-reload
 		self.retry_counter.set_max_retries(self.config.get('auto_relogin_attempts'))
 		self.logger.set_debug(self.config.get('debug_mode'))
+		self.send_client_settings()
 
 	# ===================
 	#    State Getters
@@ -129,7 +170,11 @@ class PcrcClient:
 			self.logger.warning('Cannot connect when connected')
 			return False
 
-		self.__connection = PcrcConnection(
+		engine = self.config.get('connection_engine')
+		if engine not in ('threaded', 'asyncio'):
+			self.logger.warning('Unknown connection engine "{}", using the threaded one'.format(engine))
+		connection_class = AsyncPcrcConnection if engine == 'asyncio' else PcrcConnection
+		self.__connection = connection_class(
 			pcrc=self,
 			address=self.config.get('address'),
 			port=self.config.get('port'),
@@ -242,7 +287,8 @@ class PcrcClient:
 		self.__flag_auto_restart = False
 
 	def discard(self):
-		self.authenticator.interrupt_refresh()
+		if self.__owns_authenticator:
+			self.authenticator.interrupt_refresh()
 
 	# =======================
 	#        Callbacks
@@ -268,6 +314,7 @@ class PcrcClient:
 		self.__connection_state = ConnectionState.logging_in
 		self.__flag_stopping = False
 		self.__flag_auto_restart = False
+		self.fast_lane.reset()
 
 	def __on_connected(self):
 		self.__connection.register_packet_listener(self.on_packet_received, Packet)
@@ -276,7 +323,8 @@ class PcrcClient:
 		self.__connection.register_packet_listener(self.on_disconnect_packet, DisconnectPacket)
 		self.__connection.register_packet_listener(self.on_chat_message_packet, ChatMessagePacket)
 		self.__connection.register_packet_listener(lambda p: self.chat_manager.on_received_TimeUpdatePacket(), TimeUpdatePacket)
-		self.chat_manager.start()
+		self.__connection.register_packet_listener(lambda p: self.send_client_settings(), RespawnPacket)
+		self.chat_manager.start(self.__connection.event_loop)
 
 	def on_fully_stopped(self):
 		if self.is_online():
@@ -332,6 +380,7 @@ class PcrcClient:
 			for cmd in commands:
 				self.chat(cmd)
 		self.chat(self.tr('chat.game_join'))
+		self.send_client_settings()
 
 	def on_disconnect_packet(self, packet):
 		self.logger.info('PCRC disconnected from the server, reason = {}'.format(packet.json_data))
@@ -389,6 +438,17 @@ class PcrcClient:
 		else:
 			self.logger.debug('Trying to send chat message "{}" when being offline'.format(message))
 
+	def send_client_settings(self):
+		"""
+		Ask the server to send chunks within the configured view distance only
+		"""
+		view_distance = self.config.get('view_distance')
+		if view_distance > 0 and self.is_online():
+			packet = ClientSettingsPacket()
+			packet.view_distance = view_distance
+			self.send_packet(packet)
+			self.logger.info('Client settings sent, view distance = {}'.format(view_distance))
+
 	def send_packet(self, packet: Packet):
 		if self.is_online():
 			self.__connection.write_packet(packet)
@@ -1,8 +1,9 @@
-from typing import NamedTuple, List
+import json
+from typing import NamedTuple, List, Dict, Iterable, FrozenSet
 
 import minecraft
 from minecraft import KNOWN_MINECRAFT_VERSIONS
-from minecraft.networking.connection import ConnectionContext
+from pcrc.utils import resources_util
 
 
 class Protocol(NamedTuple):
@@ -40,31 +41,24 @@ def get_mc_version(protocol_version: int) -> str:
 	return 'unknown ({})'.format(protocol_version)
 
 
-class MobTypeIds:
-	# https://wiki.vg/Entity_metadata#Mobs
-
-	@staticmethod
-	def item(context: ConnectionContext) -> int:
-		return \
-			41 if context.protocol_later_eq(MC_1_17_1.protocol_number) else \
-			35 if context.protocol_later_eq(MC_1_15_2.protocol_number) else \
-			34 if context.protocol_later_eq(MC_1_14_4.protocol_number) else \
-			2 if context.protocol_later_eq(MC_1_12_2.protocol_number) else \
-			-1
-
-	@staticmethod
-	def bat(context: ConnectionContext) -> int:
-		return \
-			4 if context.protocol_later_eq(MC_1_17_1.protocol_number) else \
-			3 if context.protocol_later_eq(MC_1_14_4.protocol_number) else \
-			65 if context.protocol_later_eq(MC_1_12_2.protocol_number) else \
-			-1
-
-	@staticmethod
-	def phantom(context: ConnectionContext) -> int:
-		return \
-			63 if context.protocol_later_eq(MC_1_17_1.protocol_number) else \
-			58 if context.protocol_later_eq(MC_1_16_1.protocol_number) else \
-			98 if context.protocol_later_eq(MC_1_15_2.protocol_number) else \
-			97 if context.protocol_later_eq(MC_1_14_4.protocol_number) else \
-			-1
+class EntityTypeRegistry:
+	"""
+	The entity type ids of a protocol version, loaded from resources/entity_types.json
+
+	The tables there are keyed by the first protocol version they apply to. Before 1.14 Spawn Object packets use their own object ids
+	"""
+	__TABLES: Dict[int, dict] = {int(k): v for k, v in json.loads(resources_util.get_data('resources/entity_types.json')).items()}
+
+	def __init__(self, protocol_version: int):
+		table = self.__TABLES[max(filter(lambda k: k <= protocol_version, self.__TABLES.keys()), default=min(self.__TABLES.keys()))]
+		self.entities: Dict[str, int] = table['entities']
+		self.objects: Dict[str, int] = table.get('objects', self.entities)
+
+	def get_entity_ids(self, names: Iterable[str]) -> FrozenSet[int]:
+		return frozenset(self.entities[name] for name in names if name in self.entities)
+
+	def get_object_ids(self, names: Iterable[str]) -> FrozenSet[int]:
+		return frozenset(self.objects[name] for name in names if name in self.objects)
+
+	def is_known(self, name: str) -> bool:
+		return name in self.entities or name in self.objects
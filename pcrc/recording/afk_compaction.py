@@ -0,0 +1,175 @@
+from logging import Logger
+from typing import TYPE_CHECKING, Dict, List, Optional, Set, Tuple
+
+from minecraft.networking.packets import Packet, JoinGamePacket
+from minecraft.networking.packets.clientbound.play import RespawnPacket, BlockChangePacket, MultiBlockChangePacket
+from pcrc.packets.s2c import DestroyEntitiesPacket, UnloadChunkPacket
+from pcrc.packets.s2c.entity_packet import EntityTeleportPacket
+from pcrc.recording.world_state import ChunkState, EntityState, ChunkPos, BlockPos
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+class EntityBaseline:
+	__slots__ = ('state', 'first_metadata', 'latest_metadata', 'equipments', 'position')
+
+	def __init__(self, state: EntityState, position: Optional[Tuple[float, float, float, int, int]]):
+		self.state = state
+		self.first_metadata = state.first_metadata
+		self.latest_metadata = state.latest_metadata
+		self.equipments = tuple(state.equipments)
+		self.position = position
+
+
+class AfkCompactor:
+	"""
+	Used when record_packets_when_afk is off and afk_compaction is on
+
+	The packets are not recorded while PCRC is afking, but the world state keeps tracking them.
+	When PCRC stops afking, the difference between the world state when the afk started and the current one
+	is recorded as a compact catch-up batch, so the replay doesn't desync
+	"""
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.logger: Logger = recorder.logger
+		self.active = False
+		self.skipped_packet_count = 0
+		self.__full_dump = False
+		self.__changed_blocks: Set[BlockPos] = set()
+		self.__chunks: Dict[ChunkPos, ChunkState] = {}
+		self.__entities: Dict[int, EntityBaseline] = {}
+		self.__values: Dict[str, Optional[bytes]] = {}
+
+	def reset(self):
+		self.active = False
+		self.skipped_packet_count = 0
+		self.__full_dump = False
+		self.__changed_blocks.clear()
+		self.__chunks.clear()
+		self.__entities.clear()
+		self.__values.clear()
+
+	def __get_position(self, entity_id: int) -> Optional[Tuple[float, float, float, int, int]]:
+		position = self.recorder.packet_processor.entity_positions.get(entity_id)
+		if position is None:
+			return None
+		return position.x, position.y, position.z, position.yaw, position.pitch
+
+	def start(self):
+		"""
+		PCRC starts afking, or a new segment starts during the afk. Take the current world state as the baseline
+		"""
+		self.reset()
+		self.active = True
+		world_state = self.recorder.world_state
+		self.__chunks.update((pos, chunk) for pos, chunk in world_state.chunks.items() if chunk.loaded)
+		for entity_id, entity in world_state.entities.items():
+			self.__entities[entity_id] = EntityBaseline(entity, self.__get_position(entity_id))
+		self.__values.update(
+			respawn=world_state.respawn, view_distance=world_state.view_distance, view_position=world_state.view_position,
+			position=world_state.position, time=world_state.time, **{'weather_{}'.format(reason): content for reason, content in world_state.weather.items()}
+		)
+
+	def on_skipped_packet(self, packet: Packet):
+		"""
+		A packet is tracked by the world state, but not recorded since PCRC is afking
+		"""
+		self.skipped_packet_count += 1
+		if isinstance(packet, JoinGamePacket):
+			self.__full_dump = True
+		elif isinstance(packet, RespawnPacket):
+			# the client forgets everything after respawning, so all chunks and entities need to be sent again
+			self.__values.pop('respawn', None)
+			self.__chunks.clear()
+			self.__entities.clear()
+			self.__changed_blocks.clear()
+		elif isinstance(packet, BlockChangePacket):
+			location = packet.location
+			self.__changed_blocks.add((location.x, location.y, location.z))
+		elif isinstance(packet, MultiBlockChangePacket):
+			base_y = getattr(packet, 'chunk_y', 0) * 16 if packet.context.protocol_later_eq(751) else 0
+			for record in packet.records:
+				self.__changed_blocks.add((packet.chunk_x * 16 + record.x, base_y + record.y, packet.chunk_z * 16 + record.z))
+
+	def finish(self) -> List[bytes]:
+		"""
+		PCRC stops afking
+
+		:return: The packet contents that bring the recorded world state to the current one
+		"""
+		world_state = self.recorder.world_state
+		if self.__full_dump:
+			packets = world_state.dump_packets()
+		elif world_state.context is None:
+			packets = []
+		else:
+			packets = self.__dump_changes()
+		self.logger.info('Recorded {} catch-up packets for {} packets skipped during afk'.format(len(packets), self.skipped_packet_count))
+		self.reset()
+		return packets
+
+	def __dump_changes(self) -> List[bytes]:
+		world_state = self.recorder.world_state
+		context = world_state.context
+		packets = []
+
+		def add(content: Optional[bytes]):
+			if content is not None:
+				packets.append(content)
+
+		current_values = {
+			'respawn': world_state.respawn, 'view_distance': world_state.view_distance, 'view_position': world_state.view_position,
+			'position': world_state.position, 'time': world_state.time, **{'weather_{}'.format(reason): content for reason, content in world_state.weather.items()}
+		}
+		for key, content in current_values.items():
+			if key in self.__values and self.__values[key] is content:
+				continue
+			add(content)
+
+		# chunks
+		for pos in self.__chunks.keys():
+			chunk = world_state.chunks.get(pos)
+			if chunk is None or not chunk.loaded:
+				packet = UnloadChunkPacket(context=context)
+				packet.chunk_x, packet.chunk_z = pos
+				packets.append(world_state.make_packet_content(packet))
+		for pos, chunk in world_state.chunks.items():
+			if chunk.loaded and self.__chunks.get(pos) is not chunk:
+				packets.extend(chunk.dump_packets())
+				for block_pos, block_state_id in chunk.blocks.items():
+					packets.append(world_state.make_block_change(block_pos, block_state_id))
+		for block_pos in self.__changed_blocks:
+			pos = (block_pos[0] >> 4, block_pos[2] >> 4)
+			chunk = world_state.chunks.get(pos)
+			if chunk is not None and chunk is self.__chunks.get(pos) and block_pos in chunk.blocks:
+				packets.append(world_state.make_block_change(block_pos, chunk.blocks[block_pos]))
+
+		# entities
+		destroyed_ids = [entity_id for entity_id, baseline in self.__entities.items() if world_state.entities.get(entity_id) is not baseline.state]
+		if len(destroyed_ids) > 0:
+			packet = DestroyEntitiesPacket(context=context)
+			packet.entity_amount = len(destroyed_ids)
+			packet.entity_ids = destroyed_ids
+			packets.append(world_state.make_packet_content(packet))
+		for entity_id, entity in world_state.entities.items():
+			baseline = self.__entities.get(entity_id)
+			position = self.__get_position(entity_id)
+			if baseline is None or baseline.state is not entity:
+				packets.extend(entity.dump_packets())
+			else:
+				if entity.first_metadata is not baseline.first_metadata:
+					add(entity.first_metadata)
+				if entity.latest_metadata is not baseline.latest_metadata:
+					add(entity.latest_metadata)
+				if tuple(entity.equipments) != baseline.equipments:
+					packets.extend(entity.equipments)
+				if position is None or position == baseline.position:
+					continue
+			if position is not None:
+				packet = EntityTeleportPacket(context=context)
+				packet.entity_id = entity_id
+				packet.x, packet.y, packet.z, packet.yaw, packet.pitch = position
+				packets.append(world_state.make_packet_content(packet))
+		return packets
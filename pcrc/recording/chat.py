@@ -1,3 +1,4 @@
+import asyncio
 import time
 from logging import Logger
 from queue import PriorityQueue, Empty
@@ -34,26 +35,39 @@ class Message:
 
 
 class ChatManager:
+	POLL_INTERVAL = 0.01
+
 	def __init__(self, pcrc: 'PcrcClient'):
 		self.logger: Logger = pcrc.logger
 		self.__pcrc = pcrc
 		self.__message_queue = PriorityQueue()
 		self.__running = False
 		self.__thread: Optional[Thread] = None
+		# increases on every start and stop, so the scheduled polls of a stopped run don't continue
+		self.__generation = 0
 		self.__chat_spam_threshold = 0
 
-	def start(self) -> None:
-		if self.__thread is not None:
+	def start(self, event_loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+		"""
+		:param event_loop: If given, the chat messages are sent in the event loop instead of a dedicated thread
+		"""
+		if self.__running:
 			self.logger.warning('Starting ChatManager again when it\'s running')
 			self.stop()
 		self.__running = True
-		self.__thread = Thread(daemon=True, name='ChatManager', target=self.__run)
-		self.__thread.start()
+		self.__generation += 1
+		if event_loop is not None:
+			event_loop.call_soon_threadsafe(self.__poll, event_loop, self.__generation)
+			self.logger.info('Chat manager started in the event loop')
+		else:
+			self.__thread = Thread(daemon=True, name='ChatManager', target=self.__run)
+			self.__thread.start()
 
 	def stop(self):
 		if current_thread() == self.__thread:
 			raise RuntimeError('Cannot invoke ChatManager.stop on its chat thread')
 		self.__running = False
+		self.__generation += 1
 		if self.__thread is not None:
 			self.__thread.join()
 		while True:
@@ -95,17 +109,29 @@ class ChatManager:
 		# vanilla threshold is 200 but I set it to 180 for safety
 		return not self.__pcrc.config.get('chat_spam_protect') or self.__chat_spam_threshold + 20 < 180
 
+	def __send_next_chat(self, block: bool):
+		if self.__can_chat():
+			try:
+				msg: Message = self.__message_queue.get(block=block, timeout=self.POLL_INTERVAL)
+			except Empty:
+				pass
+			else:
+				self.__send_chat(msg)
+		elif block:
+			time.sleep(self.POLL_INTERVAL)
+
+	def __poll(self, event_loop: asyncio.AbstractEventLoop, generation: int):
+		if generation != self.__generation:
+			return
+		try:
+			self.__send_next_chat(block=False)
+		except:
+			self.logger.exception('Error when sending chat message')
+		event_loop.call_later(self.POLL_INTERVAL, self.__poll, event_loop, generation)
+
 	def __run(self):
 		self.logger.info('Chat thread started')
 		while self.__running:
-			if self.__can_chat():
-				try:
-					msg: Message = self.__message_queue.get(timeout=0.01)
-				except Empty:
-					pass
-				else:
-					self.__send_chat(msg)
-			else:
-				time.sleep(0.01)
+			self.__send_next_chat(block=True)
 		self.logger.info('Chat thread stopped')
 		self.__thread = None
@@ -0,0 +1,88 @@
+import hashlib
+from collections import OrderedDict
+from logging import Logger
+from typing import TYPE_CHECKING, Optional, Tuple
+
+from minecraft.networking.packets import Packet, JoinGamePacket
+from minecraft.networking.packets.clientbound.play import RespawnPacket, BlockChangePacket, MultiBlockChangePacket
+from pcrc.packets.s2c import ChunkDataPacket, UnloadChunkPacket
+from pcrc.utils import misc_util
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+ChunkPos = Tuple[int, int]
+
+
+class ChunkDataDeduplicator:
+	"""
+	Skips recording a Chunk Data packet, if it's byte-identical to the one recorded for the chunk before,
+	and the chunk hasn't been unloaded or changed by block changes since then
+
+	Only the digests of the recently recorded chunks are kept
+	"""
+	MAX_CACHED_CHUNKS = 8192
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.logger: Logger = recorder.logger
+		# chunk pos -> the digest of its recorded Chunk Data packet
+		self.__digests: 'OrderedDict[ChunkPos, bytes]' = OrderedDict()
+		self.__pending: Optional[Tuple[ChunkPos, bytes]] = None
+		self.hit_count = 0
+		self.miss_count = 0
+		self.saved_bytes = 0
+
+	def reset(self):
+		self.__digests.clear()
+		self.__pending = None
+		self.hit_count = 0
+		self.miss_count = 0
+		self.saved_bytes = 0
+
+	def process(self, packet: Packet, content: bytes) -> bool:
+		"""
+		Invoked with the packets that are going to be recorded
+		:return: If the packet should still be recorded
+		"""
+		self.__pending = None
+		if isinstance(packet, ChunkDataPacket):
+			if not self.recorder.settings.chunk_deduplication:
+				return True
+			chunk_pos = (packet.chunk_x, packet.chunk_z)
+			digest = hashlib.blake2b(content, digest_size=16).digest()
+			if self.__digests.get(chunk_pos) == digest:
+				self.__digests.move_to_end(chunk_pos)
+				self.hit_count += 1
+				self.saved_bytes += len(content)
+				return False
+			self.miss_count += 1
+			self.__pending = (chunk_pos, digest)
+		elif isinstance(packet, UnloadChunkPacket):
+			self.__digests.pop((packet.chunk_x, packet.chunk_z), None)
+		elif isinstance(packet, BlockChangePacket):
+			location = packet.location
+			self.__digests.pop((location.x >> 4, location.z >> 4), None)
+		elif isinstance(packet, MultiBlockChangePacket):
+			self.__digests.pop((packet.chunk_x, packet.chunk_z), None)
+		elif isinstance(packet, (JoinGamePacket, RespawnPacket)):
+			# dimension change, or the client drops all chunks anyway
+			self.__digests.clear()
+		return True
+
+	def on_recorded(self, packet: Packet):
+		"""
+		Invoked after the packet passed to process is written into the recording
+		"""
+		if self.__pending is not None:
+			chunk_pos, digest = self.__pending
+			self.__pending = None
+			self.__digests[chunk_pos] = digest
+			self.__digests.move_to_end(chunk_pos)
+			if len(self.__digests) > self.MAX_CACHED_CHUNKS:
+				self.__digests.popitem(last=False)
+
+	def report(self):
+		if self.hit_count > 0:
+			self.logger.info('Chunk deduplication: {} hits, {} misses, saved {}MB'.format(self.hit_count, self.miss_count, misc_util.B2MB(self.saved_bytes)))
@@ -0,0 +1,74 @@
+import json
+import os
+from logging import Logger
+from typing import TYPE_CHECKING
+
+from minecraft.networking.packets import Packet
+from pcrc import constant
+from pcrc.packets.s2c import ChunkDataPacket, UpdateLightPacket
+from pcrc.utils import misc_util, file_util
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+CHUNK_PACKETS = (ChunkDataPacket, UpdateLightPacket)
+
+
+class ChunkDataStats:
+	"""
+	Counts the chunk data received in a recording session, and compares it with the previous session,
+	to show how much the view_distance option saves
+	"""
+	FILE_NAME = 'chunk_stats.json'
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.logger: Logger = recorder.logger
+		self.size = 0
+		self.start_time = 0
+
+	def reset(self):
+		self.size = 0
+		self.start_time = misc_util.get_milli_time()
+
+	def on_packet(self, packet: Packet, content: bytes):
+		if isinstance(packet, CHUNK_PACKETS):
+			self.size += len(content)
+
+	def __get_file_path(self) -> str:
+		return os.path.join(self.recorder.get_config('recording_temp_file_directory'), self.FILE_NAME)
+
+	def report(self):
+		"""
+		Log the chunk data size of the session, and store it for the next session to compare with
+		"""
+		if self.start_time <= 0:  # not recorded
+			return
+		duration = misc_util.get_milli_time() - self.start_time
+		self.start_time = 0
+		if duration <= 0:
+			return
+		view_distance = self.recorder.get_config('view_distance')
+		size_per_hour = self.size * constant.MILLI_SECOND_PER_HOUR // duration
+		self.logger.info('Received {}MB of chunk data in {} ({}MB per hour), view distance = {}'.format(
+			misc_util.B2MB(self.size), misc_util.format_milli(duration), misc_util.B2MB(size_per_hour), view_distance if view_distance > 0 else 'server'
+		))
+		file_path = self.__get_file_path()
+		try:
+			with open(file_path, 'r', encoding='utf8') as f:
+				previous = json.load(f)
+		except (OSError, ValueError):
+			previous = None
+		if previous is not None and previous['size_per_hour'] > 0:
+			saved = previous['size_per_hour'] - size_per_hour
+			self.logger.info('Compared with the previous session ({}MB per hour, view distance = {}), {}MB per hour ({}%) of chunk data is saved'.format(
+				misc_util.B2MB(previous['size_per_hour']), previous['view_distance'] if previous['view_distance'] > 0 else 'server',
+				misc_util.B2MB(saved), round(saved * 100 / previous['size_per_hour'], 1)
+			))
+		try:
+			file_util.touch_directory(os.path.dirname(file_path))
+			with open(file_path, 'w', encoding='utf8') as f:
+				json.dump({'size': self.size, 'duration': duration, 'size_per_hour': size_per_hour, 'view_distance': view_distance}, f, indent=4)
+		except OSError:
+			self.logger.exception('Failed to store the chunk data stats')
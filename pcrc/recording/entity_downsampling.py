@@ -0,0 +1,145 @@
+from logging import Logger
+from typing import TYPE_CHECKING, Dict, Set, Optional
+
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import Packet
+from minecraft.networking.packets.clientbound.play import EntityPositionDeltaPacket, EntityVelocityPacket
+from pcrc.packets.s2c.entity_packet import EntityPositionAndRotationPacket, EntityRotationPacket, EntityHeadLookPacket, EntityTeleportPacket
+from pcrc.recording.raw_packet_filter import RawEntityPacket
+from pcrc.recording.region import EntityPosition
+from pcrc.utils import packet_util, misc_util
+
+if TYPE_CHECKING:
+	from pcrc.recording.packet_processor import PacketProcessor
+
+
+DOWNSAMPLED_PACKETS = (
+	EntityPositionDeltaPacket, EntityPositionAndRotationPacket, EntityRotationPacket, EntityTeleportPacket,
+	EntityHeadLookPacket, EntityVelocityPacket
+)
+
+
+class DownsampledEntity:
+	__slots__ = ('last_update_time', 'dirty')
+
+	def __init__(self):
+		self.last_update_time = 0
+		# if the recorded position or rotation falls behind
+		self.dirty = False
+
+
+class EntityMovementDownsampler:
+	"""
+	Limits the movement packets of the non-player entities away from PCRC to entity_update_rate per second
+
+	The moves and rotations skipped in between are merged into an Entity Teleport packet,
+	with the position and rotation from the entity position index, which is recorded at the next update of the entity
+	"""
+	def __init__(self, processor: 'PacketProcessor'):
+		self.processor: 'PacketProcessor' = processor
+		self.recorder = processor.recorder
+		self.logger: Logger = processor.logger
+		self.__entities: Dict[int, DownsampledEntity] = {}
+		self.__dirty_entity_ids: Set[int] = set()
+		self.__last_sync_time = 0
+		self.dropped_packet_count = 0
+		self.dropped_bytes = 0
+		self.added_bytes = 0
+
+	@property
+	def saved_bytes(self) -> int:
+		return self.dropped_bytes - self.added_bytes
+
+	def reset(self):
+		self.clear()
+		self.__last_sync_time = 0
+		self.dropped_packet_count = 0
+		self.dropped_bytes = 0
+		self.added_bytes = 0
+
+	def clear(self):
+		self.__entities.clear()
+		self.__dirty_entity_ids.clear()
+
+	def forget(self, entity_id: int):
+		self.__entities.pop(entity_id, None)
+		self.__dirty_entity_ids.discard(entity_id)
+
+	@staticmethod
+	def __is_covered_by_teleport(packet: Packet) -> bool:
+		return isinstance(packet, EntityTeleportPacket) or getattr(packet, 'delta', None) is not None or getattr(packet, 'rotation', None) is not None
+
+	def __is_full_rate(self, entity_id: int, position: Optional[EntityPosition]) -> bool:
+		if position is None or entity_id in self.processor.entity_id_to_player_uuid:
+			return True
+		pos, distance = self.recorder.pos, self.recorder.settings.entity_full_rate_distance
+		if pos is None:
+			return True
+		return (position.x - pos.x) ** 2 + (position.y - pos.y) ** 2 + (position.z - pos.z) ** 2 <= distance ** 2
+
+	def __sync(self, entity_id: int, entity: DownsampledEntity, current_time: int, context: ConnectionContext):
+		"""
+		Record a teleport to where the entity is now
+		"""
+		entity.dirty = False
+		entity.last_update_time = current_time
+		self.__dirty_entity_ids.discard(entity_id)
+		position = self.processor.entity_positions.get(entity_id)
+		if position is None:
+			return
+		packet = EntityTeleportPacket(context=context)
+		packet.entity_id = entity_id
+		packet.x, packet.y, packet.z = position.x, position.y, position.z
+		packet.yaw, packet.pitch = position.yaw, position.pitch
+		content = packet_util.make_packet_content(packet)
+		self.processor.add_extra_content(content)
+		self.added_bytes += len(content)
+		world_entity = self.recorder.world_state.entities.get(entity_id)
+		if world_entity is not None:
+			world_entity.teleport = content
+
+	def __sync_all(self, current_time: int, interval: int, context: ConnectionContext):
+		"""
+		Entities that stop moving don't get another update, sync them periodically
+		"""
+		for entity_id in list(self.__dirty_entity_ids):
+			entity = self.__entities[entity_id]
+			if current_time - entity.last_update_time >= interval:
+				self.__sync(entity_id, entity, current_time, context)
+		self.__last_sync_time = current_time
+
+	def process(self, packet: Packet, current_time: int) -> bool:
+		interval = self.recorder.settings.entity_update_interval_ms
+		if current_time - self.__last_sync_time >= interval and len(self.__dirty_entity_ids) > 0:
+			self.__sync_all(current_time, interval, packet.context)
+		# noinspection PyUnresolvedReferences
+		entity_id = packet.entity_id
+		if entity_id in self.processor.blocked_entity_ids or entity_id in self.processor.out_of_region_entities:
+			return True
+
+		entity = self.__entities.get(entity_id)
+		packet_class = packet.packet_class if isinstance(packet, RawEntityPacket) else type(packet)
+		if interval <= 0 or not issubclass(packet_class, DOWNSAMPLED_PACKETS) or self.__is_full_rate(entity_id, self.processor.entity_positions.get(entity_id)):
+			if entity is not None and entity.dirty:
+				self.__sync(entity_id, entity, current_time, packet.context)
+				return not self.__is_covered_by_teleport(packet)
+			return True
+
+		if entity is None:
+			entity = self.__entities[entity_id] = DownsampledEntity()
+		if current_time - entity.last_update_time < interval:
+			self.dropped_packet_count += 1
+			self.dropped_bytes += len(packet_util.get_raw_content(packet))
+			if self.__is_covered_by_teleport(packet):
+				entity.dirty = True
+				self.__dirty_entity_ids.add(entity_id)
+			return False
+		if entity.dirty:
+			self.__sync(entity_id, entity, current_time, packet.context)
+			return not self.__is_covered_by_teleport(packet)
+		entity.last_update_time = current_time
+		return True
+
+	def report(self):
+		if self.dropped_packet_count > 0:
+			self.logger.info('Entity movement downsampling skipped {} packets, saved {}MB'.format(self.dropped_packet_count, misc_util.B2MB(self.saved_bytes)))
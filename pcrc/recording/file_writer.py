@@ -0,0 +1,116 @@
+import time
+from logging import Logger
+from queue import Queue, Full
+from threading import Thread, current_thread, Event
+from typing import TYPE_CHECKING, Optional, Tuple, Union
+
+from pcrc.recording.replay_recording import ReplayRecording
+from pcrc.utils import misc_util
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+class FileWriterMetrics:
+	def __init__(self):
+		self.flush_count = 0
+		self.flushed_bytes = 0
+		self.max_queued = 0
+		# the amount of times that the submitting thread had to wait for a free slot in the queue
+		self.stall_count = 0
+		self.stall_time_ms = 0
+		self.write_time_ms = 0
+
+
+class RecordingFileWriter:
+	"""
+	Writes the flushed file buffers into the replay recording in a dedicated thread
+	so the thread that receives packets never waits for the disk, unless the queue is full
+	"""
+	QUEUE_SIZE = 4
+
+	def __init__(self, recorder: 'Recorder'):
+		self.logger: Logger = recorder.logger
+		self.__queue: 'Queue[Union[Tuple[ReplayRecording, bytearray], Event, None]]' = Queue(maxsize=self.QUEUE_SIZE)
+		self.__thread: Optional[Thread] = None
+		self.metrics = FileWriterMetrics()
+		# the first error writing the recording content. The recording file is broken since then, so nothing is written after it
+		self.error: Optional[Exception] = None
+
+	@property
+	def queued_amount(self) -> int:
+		return self.__queue.qsize()
+
+	def start(self):
+		if self.__thread is not None:
+			self.logger.warning('Starting RecordingFileWriter again when it\'s running')
+			self.stop()
+		self.metrics = FileWriterMetrics()
+		self.error = None
+		self.__thread = Thread(daemon=True, name='RecordingFileWriter', target=self.__run)
+		self.__thread.start()
+
+	def stop(self):
+		"""
+		Wait until all submitted buffers are written, then stop the writer thread
+		"""
+		if current_thread() == self.__thread:
+			raise RuntimeError('Cannot invoke RecordingFileWriter.stop on its writer thread')
+		if self.__thread is not None:
+			self.__queue.put(None)
+			self.__thread.join()
+			self.__thread = None
+
+	def submit(self, replay_file: ReplayRecording, data: bytearray):
+		"""
+		The ownership of data is transferred to the writer, don't modify it after submitting
+		"""
+		item = (replay_file, data)
+		try:
+			self.__queue.put_nowait(item)
+		except Full:
+			start_time = misc_util.get_milli_time()
+			self.__queue.put(item)
+			stall_time = misc_util.get_milli_time() - start_time
+			self.metrics.stall_count += 1
+			self.metrics.stall_time_ms += stall_time
+			self.logger.warning('File writer queue is full, waited {}ms for the disk'.format(stall_time))
+		self.metrics.max_queued = max(self.metrics.max_queued, self.__queue.qsize())
+
+	def fence(self) -> Event:
+		"""
+		:return: An event that will be set after all buffers submitted before are written
+		"""
+		event = Event()
+		self.__queue.put(event)
+		return event
+
+	def wait_until_written(self):
+		"""
+		Wait until all submitted buffers are written
+		"""
+		self.__queue.join()
+
+	def __run(self):
+		while True:
+			item = self.__queue.get()
+			try:
+				if item is None:
+					break
+				if isinstance(item, Event):
+					item.set()
+					continue
+				replay_file, data = item
+				if self.error is not None:
+					continue
+				start_time = time.time()
+				replay_file.write_recording_content(data)
+				self.metrics.write_time_ms += int((time.time() - start_time) * 1000)
+				self.metrics.flush_count += 1
+				self.metrics.flushed_bytes += len(data)
+				self.logger.info('Flushed {} bytes, uncompressed file size = {}MB now'.format(len(data), misc_util.B2MB(replay_file.size)))
+			except Exception as e:
+				self.logger.exception('Error writing recording content')
+				self.error = e
+			finally:
+				self.__queue.task_done()
@@ -0,0 +1,177 @@
+import itertools
+from collections import deque
+from logging import Logger
+from threading import Lock
+from typing import TYPE_CHECKING, Deque, List, Tuple, Union, Optional
+
+from minecraft.networking.types import PositionAndLook
+from pcrc import constant
+from pcrc.recording.replay_recording import RECORD_HEADER, make_marker
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+class Keyframe:
+	__slots__ = ('time', 'index', 'packets')
+
+	def __init__(self, time: int, index: int, packets: List[bytes]):
+		# the recorded time when the keyframe is taken
+		self.time = time
+		# the index of the first record after the keyframe
+		self.index = index
+		# the packet contents that bring a fresh client to the world state at the keyframe
+		self.packets = packets
+
+
+class Clip:
+	"""
+	The recording content of a time window, taken out of the instant replay buffer
+	"""
+	def __init__(self, keyframe: Keyframe, records: List[Tuple[int, Union[bytes, memoryview]]], start_time: int, end_time: int, markers: List[dict]):
+		self.keyframe = keyframe
+		self.records = records
+		self.start_time = start_time
+		self.end_time = end_time
+		self.markers = markers
+
+	@property
+	def duration(self) -> int:
+		return self.end_time - self.start_time
+
+	def iterate_contents(self, batch_size: int):
+		"""
+		Yield the recording content in batches of about batch_size bytes
+
+		The keyframe and the records before the window start are all placed at the start of the clip,
+		so the clip starts with the world state at the window start
+		"""
+		buffer = bytearray()
+
+		def write(time: int, content: Union[bytes, memoryview]):
+			buffer.extend(RECORD_HEADER.pack(time, len(content)))
+			buffer.extend(content)
+
+		for content in self.keyframe.packets:
+			write(0, content)
+		for time, content in self.records:
+			write(max(time - self.start_time, 0), content)
+			if len(buffer) >= batch_size:
+				yield buffer
+				buffer = bytearray()
+		if len(buffer) > 0:
+			yield buffer
+
+
+class InstantReplayBuffer:
+	"""
+	Keeps the packets recorded in the last instant_replay_minutes minutes in memory instead of writing them to the disk,
+	and a clip of any window in it can be saved into a replay file on demand
+
+	A world state keyframe is taken periodically, so a clip starts with the world state of the keyframe before its window,
+	the packet contents in the keyframes are mostly the ones in the records, so they don't cost much memory
+	"""
+	KEYFRAME_INTERVAL_MS = 60 * 1000
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.logger: Logger = recorder.logger
+		self.window_ms = 0
+		self.size = 0
+		self.markers: List[dict] = []
+		# recorded time, packet content
+		self.__records: Deque[Tuple[int, Union[bytes, memoryview]]] = deque()
+		# the index of the first one in __records among all records added
+		self.__first_index = 0
+		self.__keyframes: Deque[Keyframe] = deque()
+		self.__lock = Lock()
+
+	@property
+	def enabled(self) -> bool:
+		return self.window_ms > 0
+
+	@property
+	def buffered_duration(self) -> int:
+		with self.__lock:
+			if len(self.__keyframes) == 0 or len(self.__records) == 0:
+				return 0
+			return self.__records[-1][0] - self.__keyframes[0].time
+
+	@property
+	def keyframe_amount(self) -> int:
+		return len(self.__keyframes)
+
+	def reset(self):
+		with self.__lock:
+			self.window_ms = int(self.recorder.get_config('instant_replay_minutes') * constant.MILLI_SECOND_PER_MINUTE)
+			self.size = 0
+			self.markers.clear()
+			self.__records.clear()
+			self.__first_index = 0
+			self.__keyframes.clear()
+
+	def on_tick(self, time: int):
+		"""
+		Invoked before recording the packet contents of a received packet. Takes a keyframe if it's time to
+
+		:param time: The current recorded time
+		"""
+		if len(self.__keyframes) > 0 and time - self.__keyframes[-1].time < self.KEYFRAME_INTERVAL_MS:
+			return
+		keyframe = Keyframe(time, self.__first_index + len(self.__records), self.recorder.world_state.dump_packets())
+		with self.__lock:
+			self.__keyframes.append(keyframe)
+			self.__discard_expired(time)
+		self.logger.debug('Instant replay keyframe with {} packets taken at {}'.format(len(keyframe.packets), time))
+
+	def add(self, time: int, content: Union[bytes, memoryview]):
+		with self.__lock:
+			self.__records.append((time, content))
+			self.size += len(content)
+
+	def add_marker(self, time_stamp: int, pos: PositionAndLook, name=None) -> dict:
+		marker = make_marker(time_stamp, pos, name)
+		with self.__lock:
+			self.markers.append(marker)
+		return marker
+
+	def pop_marker(self, index: int) -> dict:
+		with self.__lock:
+			return self.markers.pop(index)
+
+	def __discard_expired(self, time: int):
+		"""
+		Keep the latest keyframe that is old enough to start the full window, and everything after it
+		"""
+		window_start = time - self.window_ms
+		while len(self.__keyframes) >= 2 and self.__keyframes[1].time <= window_start:
+			self.__keyframes.popleft()
+		first_index = self.__keyframes[0].index
+		while self.__first_index < first_index:
+			self.size -= len(self.__records.popleft()[1])
+			self.__first_index += 1
+		self.markers[:] = [marker for marker in self.markers if marker['realTimestamp'] >= self.__keyframes[0].time]
+
+	def take_clip(self, duration: int, end_time: int) -> Optional[Clip]:
+		"""
+		:param duration: The length of the window in milliseconds, it's cut at the oldest keyframe
+		:param end_time: The current recorded time
+		:return: The clip of the window, or None if there's nothing buffered
+		"""
+		with self.__lock:
+			if len(self.__keyframes) == 0:
+				return None
+			start_time = end_time - duration
+			keyframe = self.__keyframes[0]
+			for candidate in self.__keyframes:
+				if candidate.time > start_time:
+					break
+				keyframe = candidate
+			start_time = max(start_time, keyframe.time)
+			records = list(itertools.islice(self.__records, keyframe.index - self.__first_index, None))
+			markers = []
+			for marker in self.markers:
+				if start_time <= marker['realTimestamp'] <= end_time:
+					marker = dict(marker, realTimestamp=marker['realTimestamp'] - start_time)
+					markers.append(marker)
+		return Clip(keyframe, records, start_time, end_time, markers)
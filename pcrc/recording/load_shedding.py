@@ -0,0 +1,126 @@
+from logging import Logger
+from typing import TYPE_CHECKING, Optional, Set, Dict
+
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets.clientbound.play import EntityVelocityPacket
+from pcrc.packets import packet_table
+from pcrc.packets.s2c.entity_packet import EntitySoundEffectPacket, EntityRotationPacket, EntityHeadLookPacket
+from pcrc.packets.s2c.optional_packet import SoundEffectPacket, NamedSoundEffectPacket, ParticlePacket
+from pcrc.utils import misc_util
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+OPTIONAL_PACKETS = (SoundEffectPacket, NamedSoundEffectPacket, EntitySoundEffectPacket, ParticlePacket, EntityVelocityPacket)
+# packets with absolute values, so the skipped ones are covered by the next one
+DOWNSAMPLED_PACKETS = (EntityRotationPacket, EntityHeadLookPacket)
+
+
+class LoadShedder:
+	"""
+	Lowers the recording fidelity level by level when the packet processing falls behind the server,
+	and restores it when the lag clears
+
+	- Level 1: Drop optional packets like sounds, particles and entity velocity
+	- Level 2: Downsample the rotation and head look packets of non-player entities. The position packets are kept, the entity movement downsampler thins them safely
+	- Level 3: Pause debug logging
+	"""
+	FULL_FIDELITY = 0
+	DROP_OPTIONAL_PACKETS = 1
+	DOWNSAMPLE_ENTITY_ROTATION = 2
+	PAUSE_DEBUG_LOGGING = 3
+	LEVEL_NAMES = ['full fidelity', 'drop optional packets', 'downsample entity rotation', 'pause debug logging']
+
+	# the lag needs to stay below half of the threshold for this long to restore a level
+	RECOVERY_TIME_MS = 10 * 1000
+	# how often an entity keeps its downsampled packets
+	DOWNSAMPLE_INTERVAL_MS = 500
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.logger: Logger = recorder.logger
+		self.level = self.FULL_FIDELITY
+		self.max_lag_ms = 0
+		self.dropped_packet_count = 0
+		self.__calm_since: Optional[int] = None
+		self.__protocol_version: Optional[int] = None
+		self.__optional_ids: Set[int] = set()
+		self.__downsampled_ids: Set[int] = set()
+		# entity id -> the last time its downsampled packet is kept
+		self.__last_kept_time: Dict[int, int] = {}
+
+	def reset(self):
+		if self.level >= self.PAUSE_DEBUG_LOGGING:
+			self.logger.set_debug(self.recorder.get_config('debug_mode'))
+		self.level = self.FULL_FIDELITY
+		self.max_lag_ms = 0
+		self.dropped_packet_count = 0
+		self.__calm_since = None
+		self.__last_kept_time.clear()
+
+	def clear(self):
+		self.__last_kept_time.clear()
+
+	def forget(self, entity_id: int):
+		self.__last_kept_time.pop(entity_id, None)
+
+	def on_lag(self, lag_ms: int, current_time: int):
+		"""
+		Invoked in the packet processing worker
+		"""
+		self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+		# the thresholds after the last level are ignored
+		thresholds = self.recorder.settings.load_shedding_thresholds[:len(self.LEVEL_NAMES) - 1]
+		level = min(self.level, len(thresholds))
+		while level < len(thresholds) and lag_ms >= thresholds[level]:
+			level += 1
+		if level > self.level:
+			self.__calm_since = None
+		elif level > 0 and lag_ms < thresholds[level - 1] / 2:
+			if self.__calm_since is None:
+				self.__calm_since = current_time
+			elif current_time - self.__calm_since >= self.RECOVERY_TIME_MS:
+				self.__calm_since = None
+				level -= 1
+		else:
+			self.__calm_since = None
+		if level != self.level:
+			self.__set_level(level, lag_ms)
+
+	def __set_level(self, level: int, lag_ms: int):
+		old_level, self.level = self.level, level
+		if level > old_level:
+			self.logger.warning('Packet processing is {}ms behind, recording fidelity lowered to level {} ({})'.format(lag_ms, level, self.LEVEL_NAMES[level]))
+		else:
+			self.logger.info('Packet processing caught up, recording fidelity restored to level {} ({})'.format(level, self.LEVEL_NAMES[level]))
+		if level < self.DOWNSAMPLE_ENTITY_ROTATION:
+			self.__last_kept_time.clear()
+		if level >= self.PAUSE_DEBUG_LOGGING > old_level:
+			self.logger.set_debug(False)
+		elif old_level >= self.PAUSE_DEBUG_LOGGING > level:
+			self.logger.set_debug(self.recorder.get_config('debug_mode'))
+		self.recorder.add_marker('PCRC fidelity level {}: {}'.format(level, self.LEVEL_NAMES[level]), silent=True)
+
+	def should_drop(self, packet_id: int, entity_id: Optional[int], context: ConnectionContext) -> bool:
+		"""
+		Invoked in the networking thread for the packets that are going to be recorded without decoding
+		"""
+		if self.level == self.FULL_FIDELITY:
+			return False
+		if context.protocol_version != self.__protocol_version:
+			table = packet_table.get_clientbound_table(context.protocol_version)
+			self.__optional_ids = {table.get_id(packet_class) for packet_class in OPTIONAL_PACKETS}
+			self.__downsampled_ids = {table.get_id(packet_class) for packet_class in DOWNSAMPLED_PACKETS}
+			self.__protocol_version = context.protocol_version
+		if packet_id in self.__optional_ids:
+			self.dropped_packet_count += 1
+			return True
+		if self.level >= self.DOWNSAMPLE_ENTITY_ROTATION and packet_id in self.__downsampled_ids and entity_id not in self.recorder.packet_processor.entity_id_to_player_uuid:
+			current_time = misc_util.get_milli_time()
+			last_kept_time = self.__last_kept_time.get(entity_id)
+			if last_kept_time is not None and current_time - last_kept_time < self.DOWNSAMPLE_INTERVAL_MS:
+				self.dropped_packet_count += 1
+				return True
+			self.__last_kept_time[entity_id] = current_time
+		return False
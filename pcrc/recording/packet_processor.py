@@ -1,34 +1,120 @@
 from logging import Logger
-from typing import TYPE_CHECKING, List, Callable, Dict, Set, Optional, Tuple
+from typing import TYPE_CHECKING, List, Callable, Dict, Set, Optional, Tuple, Type, Union, NamedTuple, FrozenSet
 
-from minecraft.networking.packets import Packet, PlayerPositionAndLookPacket, PlayerListItemPacket, PacketBuffer
-from minecraft.networking.packets.clientbound.play import TimeUpdatePacket, SpawnPlayerPacket, SpawnObjectPacket, RespawnPacket
-from minecraft.networking.types import PositionAndLook, GameMode, VarInt
-from pcrc.packets.s2c import DestroyEntitiesPacket, ChangeGameStatePacket, SpawnLivingEntityPacket
-from pcrc.protocol import MobTypeIds
+from minecraft.networking.packets import Packet, PlayerPositionAndLookPacket, PlayerListItemPacket
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets.clientbound.play import TimeUpdatePacket, SpawnPlayerPacket, SpawnObjectPacket, RespawnPacket, BlockChangePacket, MultiBlockChangePacket
+from minecraft.networking.types import PositionAndLook, GameMode
+from pcrc.packets.s2c import DestroyEntitiesPacket, ChangeGameStatePacket, SpawnLivingEntityPacket, SpawnPaintingPacket, ChunkDataPacket, UpdateLightPacket, \
+	SpawnExperienceOrbPacket
+from pcrc.packets.s2c.entity_packet import EntityTeleportPacket
+from pcrc.config import RecordingSettings
+from pcrc.protocol import EntityTypeRegistry
+from pcrc.recording.entity_downsampling import EntityMovementDownsampler
 from pcrc.recording.player_list import PlayerListManager
+from pcrc.recording.region import EntityPositionIndex, EntityPosition
+from pcrc.recording.world_state import EntityState, SPAWN_ENTITY_PACKETS
 from pcrc.utils import packet_util
 
 if TYPE_CHECKING:
 	from pcrc.recording.recorder import Recorder
 
 
+# entities spawned with their own packets, which don't have a type id
+NO_TYPE_ID_SPAWN_PACKETS: Dict[str, Type[Packet]] = {
+	'experience_orb': SpawnExperienceOrbPacket,
+	'painting': SpawnPaintingPacket,
+}
+
+
+class RemovedEntityTypes(NamedTuple):
+	settings: RecordingSettings
+	protocol_version: int
+	entity_ids: FrozenSet[int]
+	# Spawn Object packets before 1.14
+	object_ids: FrozenSet[int]
+	packet_classes: Tuple[Type[Packet], ...]
+
+
 class PacketProcessor:
 	Result = Tuple[bool, Optional[bytes]]
+	Handler = Callable[[Packet, int], bool]
 
 	def __init__(self, recorder: 'Recorder'):
 		self.recorder: 'Recorder' = recorder
 		self.logger: Logger = recorder.logger
 		self.player_manager = PlayerListManager(recorder)
+		self.movement_downsampler = EntityMovementDownsampler(self)
 		self.blocked_entity_ids: Set[int] = set()
 		self.entity_id_to_player_uuid: Dict[int, str] = {}
+		self.entity_positions = EntityPositionIndex()
+		# entities out of the recording region, with the packets to spawn them again when they come back
+		self.out_of_region_entities: Dict[int, EntityState] = {}
 		self.recorded_time_packet = False
+		self.__removed_entity_types: Optional[RemovedEntityTypes] = None
+		self.__packet_changed = False
+		# packet contents to be recorded before the processed packet
+		self.__extra_contents: List[bytes] = []
+
+		# the handlers and the packet classes they work with, in the order of execution
+		self.__handlers: List[Tuple[Tuple[Type[Packet], ...], PacketProcessor.Handler]] = [
+			((PlayerPositionAndLookPacket,), self.__process_player_position_and_look),
+			((TimeUpdatePacket,), self.__process_time_update),
+			((ChangeGameStatePacket,), self.__process_change_game_state),
+			((SpawnObjectPacket, SpawnLivingEntityPacket, SpawnExperienceOrbPacket, SpawnPaintingPacket), self.__process_spawn_entity),
+			# entity positions are updated before the player activity checks
+			(SPAWN_ENTITY_PACKETS, self.__process_spawned_entity_region),
+			((SpawnPlayerPacket,), self.__process_spawn_player),
+			((DestroyEntitiesPacket,), self.__process_destroy_entities),
+			(packet_util.get_entity_packet_classes(), self.__process_entity_region),
+			(packet_util.get_entity_packet_classes(), self.__process_entity_packets),
+			(packet_util.get_entity_packet_classes(), self.__process_entity_downsampling),
+			((RespawnPacket,), self.__process_respawn),
+			((PlayerListItemPacket,), self.__process_player_list),
+			((ChunkDataPacket, UpdateLightPacket, BlockChangePacket, MultiBlockChangePacket), self.__process_chunk_region),
+		]
+		# packet class -> the handlers to run, filled on demand
+		self.__handler_table: Dict[Type[Packet], List[PacketProcessor.Handler]] = {}
 
 	def reset(self):
 		self.blocked_entity_ids.clear()
 		self.entity_id_to_player_uuid.clear()
+		self.entity_positions.clear()
+		self.out_of_region_entities.clear()
 		self.recorded_time_packet = False
 		self.player_manager.reset()
+		self.movement_downsampler.reset()
+		self.__handler_table.clear()
+
+	def get_handled_packet_classes(self) -> Tuple[Type[Packet], ...]:
+		return tuple(packet_class for packet_classes, _ in self.__handlers for packet_class in packet_classes)
+
+	def __get_handlers(self, packet_class: Type[Packet]) -> List[Handler]:
+		handlers = self.__handler_table.get(packet_class)
+		if handlers is None:
+			handlers = [handler for packet_classes, handler in self.__handlers if issubclass(packet_class, packet_classes)]
+			self.__handler_table[packet_class] = handlers
+		return handlers
+
+	def add_extra_content(self, content: bytes):
+		self.__extra_contents.append(content)
+
+	def take_extra_contents(self) -> List[bytes]:
+		"""
+		The packet contents that need to be recorded before the last processed packet, even if it's not recorded
+		"""
+		contents, self.__extra_contents = self.__extra_contents, []
+		return contents
+
+	def is_near_pcrc(self, entity_id: int) -> bool:
+		"""
+		If the entity is within afk_distance of PCRC, or any of the positions is unknown
+		"""
+		afk_distance = self.recorder.settings.afk_distance
+		pos, position = self.recorder.pos, self.entity_positions.get(entity_id)
+		if afk_distance <= 0 or pos is None or position is None:
+			return True
+		return (position.x - pos.x) ** 2 + (position.y - pos.y) ** 2 + (position.z - pos.z) ** 2 <= afk_distance ** 2
 
 	def process(self, packet: Packet, current_time: int) -> Result:
 		try:
@@ -39,142 +125,270 @@ class PacketProcessor:
 			raise
 
 	def _process(self, packet: Packet, current_time: int) -> Result:
-		def filter_bad_packet() -> bool:
-			# if packet_name in constant.BAD_PACKETS:
-			# 	return False
-			return True
+		handlers = self.__get_handlers(type(packet))
+		if len(handlers) == 0:
+			return True, None
 
-		# update PCRC's position
-		def process_player_position_and_look() -> bool:
-			if isinstance(packet, PlayerPositionAndLookPacket):
-				player_x, player_y, player_z = packet.position
-				player_yaw, player_pitch = packet.look
-				self.recorder.pos = PositionAndLook(x=player_x, y=player_y, z=player_z, yaw=player_yaw, pitch=player_pitch)
-				self.logger.info('Set self\'s position to {}'.format(self.recorder.pos))
-			return True
+		self.__packet_changed = False
+		self.__extra_contents.clear()
+		ret, content = True, None
+		for handler in handlers:
+			ret &= handler(packet, current_time)
 
-		# world time control
-		def process_time_update() -> bool:
-			if isinstance(packet, TimeUpdatePacket):
-				if self.recorded_time_packet:
-					return False
-				else:
-					day_time = self.recorder.get_config('daytime')
-					if 0 <= day_time < 24000:
-						self.logger.info('Set daytime to: ' + str(day_time))
-						packet.time_of_day = -day_time  # If negative sun will stop moving at the Math.abs of the time
-						self.recorded_time_packet = True
-						nonlocal packet_changed
-						packet_changed = True
-			return True
+		if self.__packet_changed:
+			content = packet_util.make_packet_content(packet)
+		return ret, content
 
-		# Weather yeet
-		def process_change_game_state() -> bool:
-			# Remove weather if configured
-			if not self.recorder.get_config('weather') and isinstance(packet, ChangeGameStatePacket):
-				if packet.reason in [1, 2, 7, 8]:
-					return False
-			return True
+	# update PCRC's position
+	def __process_player_position_and_look(self, packet: PlayerPositionAndLookPacket, current_time: int) -> bool:
+		player_x, player_y, player_z = packet.position
+		player_yaw, player_pitch = packet.look
+		self.recorder.pos = PositionAndLook(x=player_x, y=player_y, z=player_z, yaw=player_yaw, pitch=player_pitch)
+		self.logger.info('Set self\'s position to {}'.format(self.recorder.pos))
+		region = self.recorder.settings.recording_region
+		if region is not None and region.radius is not None and region.center is None:
+			self.__refresh_region(packet.context)
+		return True
 
-		# add player id for afk detector and uuid for recording
-		def process_spawn_player() -> bool:
-			if isinstance(packet, SpawnPlayerPacket):
-				entity_id = getattr(packet, 'entity_id')
-				uuid = getattr(packet, 'player_UUID')
-				if entity_id not in self.entity_id_to_player_uuid.keys():
-					self.entity_id_to_player_uuid[entity_id] = uuid
-					self.logger.debug('Player spawned, added to player id list, id = {}'.format(entity_id))
-				if uuid not in self.recorder.player_uuids:
-					self.recorder.player_uuids.append(uuid)
-					self.logger.info('Player spawned, added to uuid list, uuid = {}'.format(uuid))
+	# world time control
+	def __process_time_update(self, packet: TimeUpdatePacket, current_time: int) -> bool:
+		if self.recorded_time_packet:
+			return False
+		else:
+			day_time = self.recorder.settings.daytime
+			if 0 <= day_time < 24000:
+				self.logger.info('Set daytime to: ' + str(day_time))
+				packet.time_of_day = -day_time  # If negative sun will stop moving at the Math.abs of the time
+				self.recorded_time_packet = True
+				self.__packet_changed = True
+		return True
+
+	# Weather yeet
+	def __process_change_game_state(self, packet: ChangeGameStatePacket, current_time: int) -> bool:
+		# Remove weather if configured
+		if not self.recorder.settings.weather:
+			if packet.reason in [1, 2, 7, 8]:
+				return False
+		return True
+
+	# add player id for afk detector and uuid for recording
+	def __process_spawn_player(self, packet: SpawnPlayerPacket, current_time: int) -> bool:
+		entity_id = getattr(packet, 'entity_id')
+		uuid = getattr(packet, 'player_UUID')
+		if entity_id not in self.entity_id_to_player_uuid.keys():
+			self.entity_id_to_player_uuid[entity_id] = uuid
+			self.logger.debug('Player spawned, added to player id list, id = {}'.format(entity_id))
+		if uuid not in self.recorder.player_uuids:
+			self.recorder.player_uuids.append(uuid)
+			self.logger.info('Player spawned, added to uuid list, uuid = {}'.format(uuid))
+		if self.is_near_pcrc(entity_id):
+			self.recorder.refresh_player_movement(current_time)
+		return True
+
+	def __get_removed_entity_types(self, context: ConnectionContext) -> RemovedEntityTypes:
+		"""
+		Compiled once for every connection and every config change
+		"""
+		settings = self.recorder.settings
+		removed = self.__removed_entity_types
+		if removed is None or removed.settings is not settings or removed.protocol_version != context.protocol_version:
+			names = settings.removed_entity_types
+			registry = EntityTypeRegistry(context.protocol_version)
+			for name in names:
+				if name not in NO_TYPE_ID_SPAWN_PACKETS and not registry.is_known(name):
+					self.logger.warning('Unknown entity type "{}" to remove in protocol {}'.format(name, context.protocol_version))
+			removed = self.__removed_entity_types = RemovedEntityTypes(
+				settings=settings,
+				protocol_version=context.protocol_version,
+				entity_ids=registry.get_entity_ids(names),
+				object_ids=registry.get_object_ids(names),
+				packet_classes=tuple(packet_class for name, packet_class in NO_TYPE_ID_SPAWN_PACKETS.items() if name in names)
+			)
+		return removed
+
+	# Keep track of spawned entities that are not going to be recorded and their ids
+	# check if the spawned is in black list
+	def __process_spawn_entity(self, packet: Union[SpawnObjectPacket, SpawnLivingEntityPacket, SpawnExperienceOrbPacket, SpawnPaintingPacket], current_time: int) -> bool:
+		entity_id = packet.entity_id
+		self.logger.debug('Spawned entity: {}'.format(packet))
+
+		removed = self.__get_removed_entity_types(packet.context)
+		if isinstance(packet, SpawnObjectPacket):
+			is_removed = packet.type_id in removed.object_ids
+		elif isinstance(packet, SpawnLivingEntityPacket):
+			is_removed = packet.type_id in removed.entity_ids
+		else:
+			is_removed = isinstance(packet, removed.packet_classes)
+
+		if is_removed:
+			self.logger.debug('{} spawned but ignore and added to blocked id list, id = {}'.format(type(packet).__name__, entity_id))
+			self.blocked_entity_ids.add(entity_id)
+			return False
+		return True
+
+	# Removed destroyed blocked entity's id
+	def __process_destroy_entities(self, packet: DestroyEntitiesPacket, current_time: int) -> bool:
+		for entity_id in packet.entity_ids:
+			if entity_id in self.blocked_entity_ids:
+				self.blocked_entity_ids.remove(entity_id)
+				self.logger.debug('Entity destroyed, removed from blocked entity id list, id = {}'.format(entity_id))
+			if entity_id in self.entity_id_to_player_uuid.keys():
+				self.entity_id_to_player_uuid.pop(entity_id)
+				self.logger.debug('Player destroyed, removed from player id list, id = {}'.format(entity_id))
+			self.entity_positions.remove(entity_id)
+			self.out_of_region_entities.pop(entity_id, None)
+			self.movement_downsampler.forget(entity_id)
+			self.recorder.load_shedder.forget(entity_id)
+		return True
+
+	# Detecting player activity to continue recording and remove items or bats
+	def __process_entity_packets(self, packet: Packet, current_time: int) -> bool:
+		# noinspection PyUnresolvedReferences
+		entity_id = packet.entity_id
+		if entity_id in self.entity_id_to_player_uuid.keys():
+			player_uuid = self.entity_id_to_player_uuid[entity_id]
+			if self.player_manager.get_game_mode(player_uuid) == GameMode.SPECTATOR and self.recorder.settings.afk_ignore_spectator:
+				self.logger.debug('Player movement from {} received but it\'s a spectator and user chooses to ignore it'.format(entity_id))
+			elif not self.is_near_pcrc(entity_id):
+				self.logger.debug('Player movement from {} received but it\'s too far away from PCRC'.format(entity_id))
+			else:
 				self.recorder.refresh_player_movement(current_time)
-			return True
+				self.logger.debug('Update player movement time from {}, triggered by entity id {}'.format(packet, entity_id))
+		if entity_id in self.blocked_entity_ids:
+			# self.logger.debug('Ignored entity packet of blocked entity id {}'.format(entity_id))
+			return False
+		return True
 
-		def process_spawn_entity() -> bool:
-			# Keep track of spawned items and their ids
-			# check if the spawned is in black list
-			if isinstance(packet, (SpawnObjectPacket, SpawnLivingEntityPacket)):
-				entity_id = packet.entity_id
-				entity_type_id = packet.type_id
-				self.logger.debug('Spawned entity: {}'.format(packet))
-
-				entity_name = None
-				if self.recorder.get_config('remove_items') and entity_type_id == MobTypeIds.item(packet.context):
-					entity_name = 'Item'
-				if self.recorder.get_config('remove_bats') and entity_type_id == MobTypeIds.bat(packet.context):
-					entity_name = 'Bat'
-				if self.recorder.get_config('remove_phantoms') and entity_type_id == MobTypeIds.phantom(packet.context):
-					entity_name = 'Phantom'
-
-				if entity_name is not None:
-					self.logger.debug('{} spawned but ignore and added to blocked id list, id = {}'.format(entity_name, entity_id))
-					self.blocked_entity_ids.add(entity_id)
-					return False
-			return True
+	def __process_entity_downsampling(self, packet: Packet, current_time: int) -> bool:
+		return self.movement_downsampler.process(packet, current_time)
 
-		# Removed destroyed blocked entity's id
-		def process_destroy_entities():
-			if isinstance(packet, DestroyEntitiesPacket):
-				for entity_id in packet.entity_ids:
-					if entity_id in self.blocked_entity_ids:
-						self.blocked_entity_ids.remove(entity_id)
-						self.logger.debug('Entity destroyed, removed from blocked entity id list, id = {}'.format(entity_id))
-					if entity_id in self.entity_id_to_player_uuid.keys():
-						self.entity_id_to_player_uuid.pop(entity_id)
-						self.logger.debug('Player destroyed, removed from player id list, id = {}'.format(entity_id))
-			return True
+	def __process_respawn(self, packet: RespawnPacket, current_time: int) -> bool:
+		self.logger.debug('Set recorded_time_packet to False due to player respawn / dimension change')
+		self.recorded_time_packet = False
+		self.entity_positions.clear()
+		self.out_of_region_entities.clear()
+		self.movement_downsampler.clear()
+		self.recorder.load_shedder.clear()
+		return True
 
-		# Detecting player activity to continue recording and remove items or bats
-		def process_entity_packets():
-			if packet_util.is_entity_packet(packet):
-				# noinspection PyUnresolvedReferences
-				entity_id = packet.entity_id
-				if entity_id in self.entity_id_to_player_uuid.keys():
-					player_uuid = self.entity_id_to_player_uuid[entity_id]
-					if self.player_manager.get_game_mode(player_uuid) == GameMode.SPECTATOR and self.recorder.get_config('afk_ignore_spectator'):
-						self.logger.debug('Player movement from {} received but it\'s a spectator and user chooses to ignore it'.format(entity_id))
-					else:
-						self.recorder.refresh_player_movement(current_time)
-						self.logger.debug('Update player movement time from {}, triggered by entity id {}'.format(packet, entity_id))
-				if entity_id in self.blocked_entity_ids:
-					# self.logger.debug('Ignored entity packet of blocked entity id {}'.format(entity_id))
-					return False
-			return True
+	def __process_player_list(self, packet: PlayerListItemPacket, current_time: int) -> bool:
+		self.player_manager.on_packet(packet)
+		return True
 
-		# Detecting player activity to continue recording and remove items or bats
-		def process_respawn():
-			if isinstance(packet, RespawnPacket):
-				self.logger.debug('Set recorded_time_packet to False due to player respawn / dimension change')
-				self.recorded_time_packet = False
-			return True
+	# ====================
+	#   Recording Region
+	# ====================
 
-		def process_player_list():
-			if isinstance(packet, PlayerListItemPacket):
-				self.player_manager.on_packet(packet)
-			return True
+	def __leave_region(self, entity_id: int, context: ConnectionContext) -> bool:
+		"""
+		Despawn the entity in the recording, and keep its state to spawn it again when it comes back
+		"""
+		entity = self.recorder.world_state.pop_entity(entity_id)
+		if entity is None:
+			return False
+		self.out_of_region_entities[entity_id] = entity
+		self.movement_downsampler.forget(entity_id)
+		packet = DestroyEntitiesPacket(context=context)
+		packet.entity_amount = 1
+		packet.entity_ids = [entity_id]
+		self.__extra_contents.append(packet_util.make_packet_content(packet))
+		self.logger.debug('Entity {} left the recording region'.format(entity_id))
+		return True
 
-		processors: List[Callable[[], bool]] = [
-			filter_bad_packet,
-			process_player_position_and_look,
-			process_time_update,
-			process_change_game_state,
-			process_spawn_player,
-			process_spawn_entity,
-			process_destroy_entities,
-			process_entity_packets,
-			process_respawn,
-			process_player_list,
-		]
+	def __enter_region(self, entity_id: int, position: EntityPosition, context: ConnectionContext):
+		"""
+		Spawn the entity again in the recording, and move it to where it is now
+		"""
+		entity = self.out_of_region_entities.pop(entity_id)
+		self.movement_downsampler.forget(entity_id)
+		packet = EntityTeleportPacket(context=context)
+		packet.entity_id = entity_id
+		packet.x, packet.y, packet.z = position.x, position.y, position.z
+		packet.yaw, packet.pitch = position.yaw, position.pitch
+		entity.teleport = packet_util.make_packet_content(packet)
+		self.__extra_contents.extend(entity.dump_packets())
+		self.recorder.world_state.put_entity(entity_id, entity)
+		self.logger.debug('Entity {} entered the recording region'.format(entity_id))
 
-		packet_changed = False
-		ret, content = True, None
+	def __refresh_region(self, context: ConnectionContext):
+		"""
+		Check all entities again when the recording region moves with PCRC
+		"""
+		region, pos = self.recorder.settings.recording_region, self.recorder.pos
+		for chunk in self.entity_positions.get_chunks():
+			chunk_in_region = region.contains_chunk(chunk[0], chunk[1], pos)
+			for entity_id in self.entity_positions.get_entities_in_chunk(chunk):
+				position = self.entity_positions.get(entity_id)
+				in_region = chunk_in_region and region.contains(position.x, position.z, pos)
+				if entity_id in self.out_of_region_entities:
+					if in_region:
+						self.__enter_region(entity_id, position, context)
+				elif not in_region:
+					self.__leave_region(entity_id, context)
 
-		for processor in processors:
-			ret &= processor()
+	# Index the spawned entity, and only record it if it's in the recording region
+	def __process_spawned_entity_region(self, packet: Packet, current_time: int) -> bool:
+		# noinspection PyUnresolvedReferences
+		entity_id = packet.entity_id
+		if entity_id in self.blocked_entity_ids:
+			return False
+		if isinstance(packet, SpawnPaintingPacket):
+			x, y, z = packet.location.x, packet.location.y, packet.location.z
+		else:
+			# noinspection PyUnresolvedReferences
+			x, y, z = packet.x, packet.y, packet.z
+		self.entity_positions.set(entity_id, x, y, z)
+		self.out_of_region_entities.pop(entity_id, None)
 
-		if packet_changed:
-			packet_buffer = PacketBuffer()
-			VarInt.send(packet.id, packet_buffer)
-			packet.write_fields(packet_buffer)
-			content = packet_buffer.get_writable()
-		return ret, content
+		region = self.recorder.settings.recording_region
+		if region is not None and not region.contains(x, z, self.recorder.pos):
+			entity = self.out_of_region_entities[entity_id] = EntityState(packet_util.get_raw_content(packet))
+			if isinstance(packet, SpawnPlayerPacket):
+				entity.player_uuid = packet.player_UUID
+			return False
+		return True
+
+	# Update the entity position index, and handle entities crossing the border of the recording region
+	def __process_entity_region(self, packet: Packet, current_time: int) -> bool:
+		# noinspection PyUnresolvedReferences
+		entity_id = packet.entity_id
+		if entity_id in self.blocked_entity_ids:
+			return False
+		position = None
+		if isinstance(packet, EntityTeleportPacket):
+			position = self.entity_positions.set(entity_id, packet.x, packet.y, packet.z)
+			self.entity_positions.rotate(entity_id, packet.yaw, packet.pitch)
+		elif getattr(packet, 'delta', None) is not None:
+			# noinspection PyUnresolvedReferences
+			position = self.entity_positions.move(entity_id, *packet.delta)
+		if getattr(packet, 'rotation', None) is not None:
+			# noinspection PyUnresolvedReferences
+			self.entity_positions.rotate(entity_id, *packet.rotation)
+
+		region = self.recorder.settings.recording_region
+		out_of_region_entity = self.out_of_region_entities.get(entity_id)
+		if position is not None:
+			in_region = region is None or region.contains(position.x, position.z, self.recorder.pos)
+			if in_region and out_of_region_entity is not None:
+				# the teleport to its current position covers this packet
+				self.__enter_region(entity_id, position, packet.context)
+				return False
+			if not in_region and out_of_region_entity is None:
+				return not self.__leave_region(entity_id, packet.context)
+		if out_of_region_entity is not None:
+			if isinstance(packet, EntityState.TRACKED_PACKETS):
+				out_of_region_entity.on_packet(packet, packet_util.get_raw_content(packet))
+			return False
+		return True
+
+	# Chunks and block changes out of the recording region are not recorded
+	def __process_chunk_region(self, packet: Packet, current_time: int) -> bool:
+		region = self.recorder.settings.recording_region
+		if region is None:
+			return True
+		if isinstance(packet, BlockChangePacket):
+			chunk_x, chunk_z = packet.location.x >> 4, packet.location.z >> 4
+		else:
+			# noinspection PyUnresolvedReferences
+			chunk_x, chunk_z = packet.chunk_x, packet.chunk_z
+		return region.contains_chunk(chunk_x, chunk_z, self.recorder.pos)
@@ -0,0 +1,110 @@
+from logging import Logger
+from queue import Queue, Full, Empty
+from threading import Thread, current_thread, Event
+from typing import TYPE_CHECKING, Optional, Union, Tuple, Callable
+
+from minecraft.networking.packets import Packet
+from pcrc.utils import misc_util
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+class PacketProcessingWorker:
+	"""
+	Processes the received packets for the recorder in a dedicated thread,
+	so the networking thread only reads packets from the socket and queues them.
+	pycraft still reacts to the protocol packets like keep-alive in the networking thread
+
+	Other work that touches the recorder state, like the chat commands, is queued as tasks,
+	so it runs in order with the packets in the same thread
+	"""
+	QUEUE_SIZE = 4096
+	# the maximum amount of packets taken out of the queue at once
+	BATCH_SIZE = 256
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.logger: Logger = recorder.logger
+		self.__queue: 'Queue[Union[Tuple[Packet, int], Callable[[], None], Event, None]]' = Queue(maxsize=self.QUEUE_SIZE)
+		self.__thread: Optional[Thread] = None
+
+	@property
+	def queued_amount(self) -> int:
+		return self.__queue.qsize()
+
+	def is_worker_thread(self) -> bool:
+		return current_thread() == self.__thread
+
+	def start(self):
+		if self.__thread is not None:
+			self.logger.warning('Starting PacketProcessingWorker again when it\'s running')
+			self.stop()
+		self.__thread = Thread(daemon=True, name='PacketProcessor', target=self.__run)
+		self.__thread.start()
+
+	def stop(self):
+		"""
+		Wait until all submitted packets are processed, then stop the worker thread
+		"""
+		if self.is_worker_thread():
+			raise RuntimeError('Cannot invoke PacketProcessingWorker.stop on its worker thread')
+		if self.__thread is not None:
+			self.__queue.put(None)
+			self.__thread.join()
+			self.__thread = None
+
+	def submit(self, packet: Packet):
+		item = (packet, misc_util.get_milli_time())
+		try:
+			self.__queue.put_nowait(item)
+		except Full:
+			self.__queue.put(item)
+			self.logger.warning('Packet processing queue is full, waited {}ms for the processing'.format(misc_util.get_milli_time() - item[1]))
+
+	def submit_task(self, task: Callable[[], None]):
+		self.__queue.put(task)
+
+	def wait_until_processed(self):
+		"""
+		Wait until all packets submitted before are processed
+		"""
+		if self.__thread is not None and not self.is_worker_thread():
+			event = Event()
+			self.__queue.put(event)
+			event.wait()
+
+	def __run(self):
+		running = True
+		while running:
+			batch = [self.__queue.get()]
+			try:
+				while len(batch) < self.BATCH_SIZE:
+					batch.append(self.__queue.get_nowait())
+			except Empty:
+				pass
+			if isinstance(batch[0], tuple):
+				# the first one in the batch waited the longest
+				current_time = misc_util.get_milli_time()
+				try:
+					self.recorder.load_shedder.on_lag(current_time - batch[0][1], current_time)
+				except:
+					self.logger.exception('Error updating the load shedding level')
+			for item in batch:
+				try:
+					if item is None:
+						running = False
+					elif isinstance(item, Event):
+						item.set()
+					elif running:
+						if isinstance(item, tuple):
+							self.recorder.process_packet(item[0], item[1])
+						else:
+							item()
+				except:
+					if isinstance(item, tuple):
+						self.logger.exception('Error processing packet {}'.format(type(item[0]).__name__))
+					else:
+						self.logger.exception('Error running task {}'.format(item))
+				finally:
+					self.__queue.task_done()
@@ -66,6 +66,18 @@ class PlayerListManager:
 				else:
 					self.logger.warning('Unknown player uuid {} from {}'.format(player_uuid, packet))
 
+	def get_players(self) -> Dict[str, PlayerInfo]:
+		"""
+		uuid -> player info
+		"""
+		return self.__player_map.copy()
+
+	def get_ping_by_name(self, player_name: str) -> Optional[int]:
+		for info in self.__player_map.values():
+			if info.name == player_name:
+				return info.ping
+		return None
+
 	def get_game_mode(self, player_uuid: str) -> Optional[int]:
 		info = self.__player_map.get(player_uuid)
 		if info is None:
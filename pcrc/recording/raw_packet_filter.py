@@ -0,0 +1,121 @@
+from typing import TYPE_CHECKING, Optional, Dict, Set, Type, Tuple
+
+from minecraft.networking.connection import PacketReactor, PlayingReactor
+from minecraft.networking.packets import Packet, PacketBuffer, KeepAlivePacket, PlayerPositionAndLookPacket, JoinGamePacket
+from minecraft.networking.packets.clientbound.play import DisconnectPacket, ChatMessagePacket, TimeUpdatePacket, EntityPositionDeltaPacket
+from minecraft.networking.types import VarInt, Short, UnsignedByte
+from pcrc.packets.s2c.entity_packet import EntityPositionAndRotationPacket, EntityRotationPacket
+from pcrc.utils import packet_util
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+# packets that pycraft or the packet listeners of PcrcClient react to
+REACTED_PACKETS = (KeepAlivePacket, PlayerPositionAndLookPacket, JoinGamePacket, DisconnectPacket, ChatMessagePacket, TimeUpdatePacket)
+# entity packets starting with a relative move, which is read for the raw entity packets
+RELATIVE_MOVE_PACKETS = (EntityPositionDeltaPacket, EntityPositionAndRotationPacket)
+# entity packets with the yaw and pitch after the entity id and the relative move
+ROTATION_PACKETS = (EntityPositionAndRotationPacket, EntityRotationPacket)
+
+
+class RawEntityPacket(Packet):
+	"""
+	An undecoded entity packet, with only its entity id read, and the relative move and rotation if it has them
+	"""
+	entity_id: int
+	packet_class: Type[Packet]
+	delta: Optional[Tuple[int, int, int]] = None
+	rotation: Optional[Tuple[int, int]] = None
+
+
+class RawPacketFilter:
+	"""
+	Decides what to do with a received packet with its raw packet id before pycraft decodes it,
+	so only the packets someone is interested in get decoded
+
+	- KEEP: Record the raw data without decoding. Entity packets are kept as RawEntityPacket,
+	  so PacketProcessor can still check their entity id in the packet processing worker
+	- DROP: Neither decode nor record it
+	- INSPECT: Decode it as usual
+	"""
+	KEEP = 0
+	DROP = 1
+	INSPECT = 2
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.__packet_table: Optional[Dict[int, Type[Packet]]] = None
+		self.__inspected_ids: Set[int] = set()
+		# entity packet id -> whether the packet needs to be fully decoded
+		self.__entity_packet_ids: Dict[int, bool] = {}
+		self.__relative_move_ids: Set[int] = set()
+		self.__rotation_ids: Set[int] = set()
+
+	def __rebuild(self, packet_table: Dict[int, Type[Packet]]):
+		inspected_classes = REACTED_PACKETS + self.recorder.packet_processor.get_handled_packet_classes() + self.recorder.world_state.TRACKED_PACKETS
+		entity_classes = packet_util.get_entity_packet_classes()
+		self.__inspected_ids.clear()
+		self.__entity_packet_ids.clear()
+		self.__relative_move_ids.clear()
+		self.__rotation_ids.clear()
+		for packet_id, packet_class in packet_table.items():
+			if issubclass(packet_class, entity_classes):
+				self.__entity_packet_ids[packet_id] = issubclass(packet_class, self.recorder.world_state.TRACKED_PACKETS)
+				if issubclass(packet_class, RELATIVE_MOVE_PACKETS):
+					self.__relative_move_ids.add(packet_id)
+				if issubclass(packet_class, ROTATION_PACKETS):
+					self.__rotation_ids.add(packet_id)
+			elif issubclass(packet_class, inspected_classes):
+				self.__inspected_ids.add(packet_id)
+		self.__packet_table = packet_table
+
+	def decide(self, reactor: PacketReactor, packet_id: int, packet_data: PacketBuffer) -> Tuple[int, Optional[int]]:
+		"""
+		:param packet_data: The packet buffer with its cursor right after the packet id. The cursor is restored on INSPECT
+		:return: A tuple of the decision, and the entity id if it's an entity packet
+		"""
+		if not self.recorder.is_recording() or not isinstance(reactor, PlayingReactor):
+			return self.INSPECT, None
+		if reactor.clientbound_packets is not self.__packet_table:
+			self.__rebuild(reactor.clientbound_packets)
+
+		inspect_entity = self.__entity_packet_ids.get(packet_id)
+		if inspect_entity is not None:
+			position = packet_data.bytes.tell()
+			entity_id = VarInt.read(packet_data)
+			# the blocked entity ids might fall behind in the networking thread, PacketProcessor checks it again anyway
+			if entity_id in self.recorder.packet_processor.blocked_entity_ids:
+				return self.DROP, entity_id
+			if inspect_entity:
+				packet_data.bytes.seek(position)
+				return self.INSPECT, entity_id
+		elif packet_id in self.__inspected_ids:
+			return self.INSPECT, None
+		else:
+			entity_id = None
+		if self.recorder.load_shedder.should_drop(packet_id, entity_id, reactor.connection.context):
+			return self.DROP, entity_id
+		return self.KEEP, entity_id
+
+	def filter(self, reactor: PacketReactor, packet_id: int, packet_data: PacketBuffer, raw_data: memoryview) -> Optional[Packet]:
+		"""
+		:return: An undecoded packet if it doesn't need decoding, otherwise None
+		"""
+		result, entity_id = self.decide(reactor, packet_id, packet_data)
+		if result == self.INSPECT:
+			return None
+		if entity_id is not None:
+			packet = RawEntityPacket(context=reactor.connection.context)
+			packet.entity_id = entity_id
+			packet.packet_class = self.__packet_table[packet_id]
+			if result == self.KEEP:
+				if packet_id in self.__relative_move_ids:
+					packet.delta = (Short.read(packet_data), Short.read(packet_data), Short.read(packet_data))
+				if packet_id in self.__rotation_ids:
+					packet.rotation = (UnsignedByte.read(packet_data), UnsignedByte.read(packet_data))
+		else:
+			packet = Packet(context=reactor.connection.context)
+		packet.id = packet_id
+		packet.raw_data = raw_data if result == self.KEEP else None
+		return packet
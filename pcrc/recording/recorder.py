@@ -1,30 +1,52 @@
 import datetime
 import os
+import shutil
+from concurrent.futures import Future
 from logging import Logger
-from threading import Thread
-from typing import TYPE_CHECKING, Any, Optional, Callable
+from threading import Thread, Event
+from typing import TYPE_CHECKING, Any, Optional, Callable, List, Union
 
 from minecraft.networking.packets import Packet
 from minecraft.networking.packets.serverbound.play import ClientStatusPacket
 from minecraft.networking.types import PositionAndLook
 from pcrc import constant
-from pcrc.config import SettableOptions
+from pcrc.config import SettableOptions, RecordingSettings
 from pcrc.packets.c2s import SpectatePacket
+from pcrc.recording.afk_compaction import AfkCompactor
 from pcrc.recording.chat import ChatPriority
+from pcrc.recording.chunk_dedup import ChunkDataDeduplicator
+from pcrc.recording.chunk_stats import ChunkDataStats
+from pcrc.recording.file_writer import RecordingFileWriter
+from pcrc.recording.instant_replay import InstantReplayBuffer, Clip
+from pcrc.recording.load_shedding import LoadShedder
 from pcrc.recording.packet_processor import PacketProcessor
-from pcrc.recording.replay_recording import ReplayRecording
+from pcrc.recording.packet_worker import PacketProcessingWorker
+from pcrc.recording.raw_packet_filter import RawPacketFilter
+from pcrc.recording.replay_recording import ReplayRecording, RECORD_HEADER
+from pcrc.recording.world_state import WorldState
 from pcrc.states import RecordingState
-from pcrc.utils import packet_util, misc_util
+from pcrc.utils import packet_util, misc_util, file_util
 
 if TYPE_CHECKING:
 	from pcrc.pcrc_client import PcrcClient
 
 
 class Recorder:
+	__RECORD_HEADER_PLACEHOLDER = bytes(RECORD_HEADER.size)
+
 	def __init__(self, pcrc: 'PcrcClient'):
 		self.pcrc = pcrc
 		self.logger: Logger = pcrc.logger
 		self.packet_processor = PacketProcessor(self)
+		self.file_writer = RecordingFileWriter(self)
+		self.packet_worker = PacketProcessingWorker(self)
+		self.load_shedder = LoadShedder(self)
+		self.chunk_stats = ChunkDataStats(self)
+		self.chunk_deduplicator = ChunkDataDeduplicator(self)
+		self.world_state = WorldState(self)
+		self.afk_compactor = AfkCompactor(self)
+		self.instant_replay = InstantReplayBuffer(self)
+		self.raw_packet_filter = RawPacketFilter(self)
 		self.__recording_state = RecordingState.stopped
 
 		# recording information
@@ -38,9 +60,13 @@ class Recorder:
 		self.last_showinfo_time: int = 0
 		self.packet_counter: int = 0
 		self.last_showinfo_packet_counter: int = 0
+		self.last_flush_time: int = 0
 		self.file_name: Optional[str] = None
 		self.file_thread: Optional[Thread] = None
 		self.replay_file: Optional[ReplayRecording] = None
+		self.segment_index: int = 0
+		# the threads or the save worker pool tasks saving the previous segments and the instant replay clips
+		self.saver_threads: List[Union[Thread, Future]] = []
 		self.pos: Optional[PositionAndLook] = None
 
 	@property
@@ -56,6 +82,13 @@ class Recorder:
 	def get_config(self, key: str) -> Any:
 		return self.pcrc.config.get(key)
 
+	@property
+	def settings(self) -> RecordingSettings:
+		"""
+		Read it once and keep the reference if multiple options are used together
+		"""
+		return self.pcrc.config.recording_settings
+
 	def tr(self, key: str, *args, **kwargs) -> str:
 		return self.pcrc.tr(key, *args, **kwargs)
 
@@ -77,10 +110,10 @@ class Recorder:
 	def has_no_player_movement(self, current_time: Optional[int] = None):
 		if current_time is None:
 			current_time = misc_util.get_milli_time()
-		return current_time - self.last_player_movement >= self.get_config('delay_before_afk_second') * 1000
+		return current_time - self.last_player_movement >= self.settings.afk_delay_ms
 
-	def is_afking(self):
-		return self.has_no_player_movement() and self.get_config('with_player_only')
+	def is_afking(self, current_time: Optional[int] = None):
+		return self.settings.with_player_only and self.has_no_player_movement(current_time)
 
 	def get_time_passed(self, current_time: Optional[int] = None):
 		if self.start_time < 0:
@@ -93,24 +126,41 @@ class Recorder:
 		return self.get_time_passed(t) - self.afk_duration
 
 	def get_file_size_limit(self) -> int:
-		return self.get_config('file_size_limit_mb') * constant.BYTE_PER_MB
+		return self.settings.file_size_limit
 
 	def get_file_buffer_size(self) -> int:
-		return self.get_config('file_buffer_size_mb') * constant.BYTE_PER_MB
+		return self.settings.file_buffer_size
 
 	def get_time_recorded_limit(self) -> int:
-		return self.get_config('time_recorded_limit_hour') * constant.MILLI_SECOND_PER_HOUR
+		return self.settings.time_recorded_limit
 
 	# ==========
 
 	def flush(self):
-		if len(self.file_buffer) == 0:
+		"""
+		Hand the file buffer to the file writer thread and swap in an empty one
+		"""
+		self.last_flush_time = misc_util.get_milli_time()
+		if self.file_writer.error is not None:
+			self.__on_write_error()
+			return
+		if len(self.file_buffer) == 0 or self.replay_file is None:
 			return
-		self.replay_file.write_recording_content(self.file_buffer)
-		self.logger.info('Flushing {} bytes, uncompressed file size = {}MB now'.format(len(self.file_buffer), misc_util.B2MB(self.replay_file.size)))
+		buffer, self.file_buffer = self.file_buffer, bytearray()
+		self.replay_file.update_manifest(duration=self.get_time_recorded(), player_uuids=self.player_uuids.copy())
+		self.file_writer.submit(self.replay_file, buffer)
+
+	def __on_write_error(self):
+		"""
+		The recording file is broken after a failed write, so keeping recording only wastes the disk
+		"""
 		self.file_buffer.clear()
+		if self.is_recording() and not self.pcrc.is_stopping():
+			self.logger.error('Stopping PCRC since writing the recording file failed: {}'.format(self.file_writer.error))
+			self.pcrc.chat(self.tr('chat.write_error', self.file_writer.error))
+			self.pcrc.stop()
 
-	def write(self, data: bytes):
+	def write(self, data: Union[bytes, memoryview]):
 		self.file_buffer += data
 		if len(self.file_buffer) > self.get_file_buffer_size():
 			self.flush()
@@ -125,6 +175,8 @@ class Recorder:
 		The returned Event indicates if the replay recording saving operation is done
 		"""
 		self.logger.info('Stop recording')
+		# packets received before stopping are still recorded
+		self.packet_worker.wait_until_processed()
 		self.__recording_state = RecordingState.saving
 		if self.file_thread is None:
 			self.file_thread = Thread(name='ReplaySaver', target=self.__create_replay_file, args=(callback, ))
@@ -145,12 +197,97 @@ class Recorder:
 		self.last_showinfo_time = 0
 		self.packet_counter = 0
 		self.last_showinfo_packet_counter = 0
+		self.last_flush_time = self.start_time
 		self.file_thread = None
-		self.replay_file = ReplayRecording(temp_file_dir=self.get_config('recording_temp_file_directory'))
+		self.segment_index = 1
+		self.saver_threads.clear()
+		self.instant_replay.reset()
+		# nothing is written to the disk in instant replay mode until a clip is saved
+		self.replay_file = self.__create_replay_recording() if not self.instant_replay.enabled else None
+		self.file_writer.start()
+		self.packet_worker.start()
 		self.pos = None
 		self.packet_processor.reset()
+		self.world_state.reset()
+		self.afk_compactor.reset()
+		self.load_shedder.reset()
+		self.chunk_stats.reset()
+		self.chunk_deduplicator.reset()
+
+	def __create_replay_recording(self) -> ReplayRecording:
+		# the temp directory name is unique, so unsaved recordings from a previous run can be recovered
+		temp_dir_name = '{}_segment_{}'.format(datetime.datetime.today().strftime('%Y_%m_%d_%H_%M_%S'), self.segment_index)
+		replay_file = ReplayRecording(
+			logger=self.logger,
+			temp_file_dir=os.path.join(self.get_config('recording_temp_file_directory'), temp_dir_name),
+			compress_while_recording=self.get_config('compress_while_recording')
+		)
+		replay_file.update_manifest(
+			server_name=self.get_config('server_name'),
+			mc_version=self.pcrc.mc_version,
+			protocol=self.pcrc.mc_protocol,
+			date=self.start_time,
+			file_name=self.file_name
+		)
+		replay_file.write_manifest()
+		return replay_file
+
+	def start_new_segment(self, current_time: Optional[int] = None):
+		"""
+		Save the current replay recording in the background, and keep recording into a new one without reconnecting
+		The new replay recording starts with the tracked world state, so it can be played on its own
+
+		:param current_time: The time the packet being processed is received, where the new segment starts
+		"""
+		if current_time is None:
+			current_time = misc_util.get_milli_time()
+		self.flush()
+		self.__start_saver('ReplaySaver', self.__save_segment, self.replay_file, self.file_writer.fence(), self.get_time_recorded(current_time), self.player_uuids.copy())
+
+		self.segment_index += 1
+		self.start_time = current_time
+		self.afk_duration = 0
+		self.last_packet_time = self.start_time
+		self.player_uuids = self.world_state.get_player_uuids()
+		self.last_showinfo_time = 0
+		self.packet_counter = 0
+		self.last_showinfo_packet_counter = 0
+		self.replay_file = self.__create_replay_recording()
+		packets = self.world_state.dump_packets()
+		for content in packets:
+			self.__write_packet_content(content, current_time)
+		if self.afk_compactor.active:
+			self.afk_compactor.start()
+		self.logger.info('Started recording segment {} with {} world state packets'.format(self.segment_index, len(packets)))
+		self.pcrc.chat(self.tr('chat.new_segment', self.segment_index))
+
+	def __start_saver(self, name: str, target: Callable, *args):
+		"""
+		Run the saving in the shared save worker pool of the supervisor if there is one, or in a new thread
+		"""
+		executor = self.pcrc.save_executor
+		if executor is not None:
+			saver = executor.submit(target, *args)
+		else:
+			saver = Thread(name=name, daemon=True, target=target, args=args)
+			saver.start()
+		self.saver_threads.append(saver)
+
+	def __save_segment(self, replay_file: ReplayRecording, written_event: Event, duration: int, player_uuids: List[str]):
+		try:
+			written_event.wait()
+			if self.file_writer.error is not None:
+				self.logger.error('Writing the recording file failed, abort saving the recording segment. The recording is left in {}'.format(replay_file.temp_file_dir))
+				return
+			self.__save_replay_file(replay_file, duration, player_uuids)
+		except:
+			self.logger.exception('Error when saving recording segment')
+		finally:
+			replay_file.discard()
 
 	def on_replay_file_saved(self):
+		if self.replay_file is not None:
+			self.replay_file.discard()
 		self.__recording_state = RecordingState.stopped
 		self.start_time = -1
 		self.file_thread = None
@@ -159,106 +296,158 @@ class Recorder:
 
 	def __create_replay_file(self, callback: Callable):
 		try:
+			self.packet_worker.stop()
+			self.chunk_stats.report()
+			self.packet_processor.movement_downsampler.report()
+			self.chunk_deduplicator.report()
 			self.flush()
+			self.file_writer.stop()
+			for saver_thread in self.saver_threads:
+				if isinstance(saver_thread, Future):
+					saver_thread.exception()
+				else:
+					saver_thread.join()
 
 			if self.pcrc.mc_version is None or self.pcrc.mc_protocol is None:
 				self.logger.warning('Not connected to the server yet, abort creating replay recording file')
 				return
 
+			if self.instant_replay.enabled:
+				self.logger.info('Instant replay mode, discarded {}MB of buffered recording'.format(misc_util.B2MB(self.instant_replay.size)))
+				return
+
 			if self.replay_file is None:
 				self.logger.warning('Recording has not started yet, abort creating replay recording file')
 				return
 
-			if self.replay_file.size < constant.MINIMUM_LEGAL_FILE_SIZE:
-				self.logger.warning('Size of "recording.tmcpr" too small ({}KB < {}KB), abort creating replay file'.format(
-					misc_util.B2KB(self.replay_file.size), misc_util.B2KB(constant.MINIMUM_LEGAL_FILE_SIZE)
-				))
+			if self.file_writer.error is not None:
+				self.logger.error('Writing the recording file failed, abort creating replay recording file. The recording is left in {}'.format(self.replay_file.temp_file_dir))
 				return
 
 			# Creating .mcpr zipfile based on timestamp
 			self.logger.info('Time recorded/passed: {}/{}'.format(misc_util.format_milli(self.get_time_recorded()), misc_util.format_milli(self.get_time_passed())))
-
-			# Deciding file name
-			file_name_raw = self.file_name or datetime.datetime.today().strftime('PCRC_%Y_%m_%d_%H_%M_%S')
-			file_name = file_name_raw + '.mcpr'
-			counter = 2
-			while True:
-				file_path = os.path.join(self.get_config('recording_storage_directory'), file_name)
-				if not os.path.isfile(file_path):
-					break
-				file_name = '{}_{}.mcpr'.format(file_name_raw, counter)
-				counter += 1
-			self.logger.info('Creating "{}"'.format(file_path))
-			self.pcrc.chat(self.tr('chat.creating_recording_file'))
-
-			self.replay_file.set_meta_data(
-				server_name=self.get_config('server_name'),
-				duration=self.get_time_recorded(),
-				date=misc_util.get_milli_time(),
-				mc_version=self.pcrc.mc_version,
-				protocol=self.pcrc.mc_protocol,
-				player_uuids=self.player_uuids
-			)
-			self.replay_file.create_replay_recording(file_path)
-
-			self.logger.info('Size of replay file "{}": {}MB'.format(file_path, misc_util.B2MB(os.path.getsize(file_path))))
-			self.pcrc.chat(self.tr('chat.created_recording_file', file_name), priority=ChatPriority.High)
+			if self.pcrc.save_executor is not None:
+				self.pcrc.save_executor.submit(self.__save_replay_file, self.replay_file, self.get_time_recorded(), self.player_uuids).result()
+			else:
+				self.__save_replay_file(self.replay_file, self.get_time_recorded(), self.player_uuids)
 		finally:
 			self.on_replay_file_saved()
 			callback()
 
+	def __save_replay_file(self, replay_file: ReplayRecording, duration: int, player_uuids: List[str], file_name_raw: Optional[str] = None):
+		if replay_file.size < constant.MINIMUM_LEGAL_FILE_SIZE:
+			self.logger.warning('Size of "recording.tmcpr" too small ({}KB < {}KB), abort creating replay file'.format(
+				misc_util.B2KB(replay_file.size), misc_util.B2KB(constant.MINIMUM_LEGAL_FILE_SIZE)
+			))
+			# nothing worth recovering, don't leave the temp directory behind
+			replay_file.discard()
+			shutil.rmtree(replay_file.temp_file_dir, ignore_errors=True)
+			return
+
+		# Deciding file name
+		if file_name_raw is None:
+			file_name_raw = self.file_name or datetime.datetime.today().strftime('PCRC_%Y_%m_%d_%H_%M_%S')
+		file_path = file_util.get_unused_file_path(self.get_config('recording_storage_directory'), file_name_raw, '.mcpr')
+		file_name = os.path.basename(file_path)
+		self.logger.info('Creating "{}"'.format(file_path))
+		self.pcrc.chat(self.tr('chat.creating_recording_file'))
+
+		replay_file.set_meta_data(
+			server_name=self.get_config('server_name'),
+			duration=duration,
+			date=misc_util.get_milli_time(),
+			mc_version=self.pcrc.mc_version,
+			protocol=self.pcrc.mc_protocol,
+			player_uuids=player_uuids
+		)
+		replay_file.create_replay_recording(file_path, compress_threads=self.get_config('compress_threads'))
+
+		self.logger.info('Size of replay file "{}": {}MB'.format(file_path, misc_util.B2MB(os.path.getsize(file_path))))
+		self.pcrc.chat(self.tr('chat.created_recording_file', file_name), priority=ChatPriority.High)
+
 	def on_packet(self, packet: Packet):
-		if not self.is_recording():
+		"""
+		Invoked in the networking thread. The packet is processed later in the packet processing worker
+		"""
+		if not self.is_recording() or getattr(packet, 'raw_data') is None:
 			return
-		content: bytes = getattr(packet, 'raw_data')
-		if content is None:
+		self.packet_worker.submit(packet)
+
+	def process_packet(self, packet: Packet, received_time: Optional[int] = None):
+		"""
+		:param received_time: The time the packet is received. The packets are timed with it instead of the processing time,
+		so they keep their timing in the replay when the processing falls behind
+		"""
+		if not self.is_recording():
 			return
-		if content[0] == 0x00:
-			content = content[1:]
+		content = packet_util.get_raw_content(packet)
 
 		packet_name = type(packet).__name__
-		current_time = misc_util.get_milli_time()
+		current_time = received_time if received_time is not None else misc_util.get_milli_time()
+		settings = self.settings
 
 		should_record_this, processed_content = self.packet_processor.process(packet, current_time)
 		if processed_content is not None:
 			content = processed_content
 			self.logger.debug('Modified packet {}'.format(packet_name))
+		self.chunk_stats.on_packet(packet, content)
 
 		# Increase afk timer when recording stopped, afk timer prevents afk time in replays
-		if self.get_config('with_player_only'):
+		if settings.with_player_only:
 			no_player_movement: bool = self.has_no_player_movement(current_time)
 			if no_player_movement:
 				self.afk_duration += current_time - self.last_packet_time
 			if self.last_no_player_movement != no_player_movement:
 				self.pcrc.chat(self.tr('chat.pause_recording') if no_player_movement else self.tr('chat.continue_recording'))
+				if no_player_movement and settings.afk_compaction and not settings.record_packets_when_afk:
+					self.afk_compactor.start()
 			self.last_no_player_movement = no_player_movement
 		self.last_packet_time = current_time
+		if self.afk_compactor.active and not self.is_afking(current_time):
+			for content in self.afk_compactor.finish():
+				self.__write_packet_content(content, current_time)
+
+		# Flush periodically, so the recording content can be recovered if PCRC gets killed
+		if current_time - self.last_flush_time >= settings.checkpoint_interval_ms:
+			self.flush()
 
 		# Recording
+		if self.instant_replay.enabled:
+			self.instant_replay.on_tick(self.get_time_recorded(current_time))
+		for extra_content in self.packet_processor.take_extra_contents():
+			if not self.is_afking(current_time) or settings.record_packets_when_afk:
+				self.__write_packet_content(extra_content, current_time)
+		if should_record_this and not self.chunk_deduplicator.process(packet, content):
+			should_record_this = False
+			if settings.debug_packet:
+				self.logger.debug('{} ignored since the same chunk is recorded'.format(packet_name))
 		if should_record_this:
-			if not self.is_afking() or packet_util.is_important(packet) or self.get_config('record_packets_when_afk'):
-				data = self.get_time_recorded().to_bytes(4, byteorder='big', signed=True)
-				data += len(content).to_bytes(4, byteorder='big', signed=True)
-				data += content
-				self.write(data)
-				self.packet_counter += 1
-				if self.is_afking() and packet_util.is_important(packet):
+			self.world_state.on_packet(packet, content)
+			is_afking = self.is_afking(current_time)
+			is_important = packet_util.is_important(packet)
+			if not is_afking or is_important or settings.record_packets_when_afk:
+				self.__write_packet_content(content, current_time)
+				self.chunk_deduplicator.on_recorded(packet)
+				if is_afking and is_important:
 					self.logger.debug('PCRC is afking but {} is an important packet so PCRC recorded it'.format(packet_name))
 				else:
-					if self.get_config('debug_packet'):
+					if settings.debug_packet:
 						self.logger.debug('{} recorded'.format(packet_name))
 			else:
+				if self.afk_compactor.active:
+					self.afk_compactor.on_skipped_packet(packet)
 				self.logger.debug('{} ignore due to being afk'.format(packet_name))
 
-		if self.replay_file.size > self.get_file_size_limit():
-			self.logger.info('tmcpr file size limit {}MB reached! Restarting'.format(misc_util.B2MB(self.get_file_size_limit())))
+		# no limit in instant replay mode, the buffer discards the expired packets by itself
+		if self.replay_file is not None and self.replay_file.size > settings.file_size_limit:
+			self.logger.info('tmcpr file size limit {}MB reached!'.format(misc_util.B2MB(self.get_file_size_limit())))
 			self.pcrc.chat(self.tr('chat.reached_file_size_limit', misc_util.B2MB(self.get_file_size_limit())))
-			self.pcrc.restart()
+			self.__on_limit_reached(current_time)
 
-		if self.get_time_recorded(current_time) > self.get_time_recorded_limit():
+		elif self.replay_file is not None and self.get_time_recorded(current_time) > settings.time_recorded_limit:
 			self.logger.info('{} actual recording time reached!'.format(misc_util.format_milli(self.get_time_recorded_limit())))
 			self.pcrc.chat(self.tr('chat.reached_time_limit', misc_util.format_milli(self.get_time_recorded_limit())))
-			self.pcrc.restart()
+			self.__on_limit_reached(current_time)
 
 		def get_showinfo_time():
 			return int(self.get_time_passed(current_time) / (5 * 60 * 1000))
@@ -271,19 +460,84 @@ class Recorder:
 				misc_util.format_milli(self.get_time_recorded(current_time)), misc_util.format_milli(self.get_time_passed(current_time)), self.packet_counter)
 			)
 
+	def __write_packet_content(self, content: Union[bytes, memoryview], current_time: Optional[int] = None):
+		# the packets received before the segment starts are placed at its start
+		time_recorded = max(self.get_time_recorded(current_time), 0)
+		if self.instant_replay.enabled:
+			self.instant_replay.add(time_recorded, content)
+			self.packet_counter += 1
+			return
+		# the header is packed in place and the content is copied only once, directly into the file buffer
+		offset = len(self.file_buffer)
+		self.file_buffer.extend(self.__RECORD_HEADER_PLACEHOLDER)
+		RECORD_HEADER.pack_into(self.file_buffer, offset, time_recorded, len(content))
+		self.write(content)
+		self.packet_counter += 1
+
+	def __on_limit_reached(self, current_time: int):
+		if self.get_config('seamless_segment_rotation'):
+			self.start_new_segment(current_time)
+		else:
+			self.pcrc.restart()
+
 	def get_status(self) -> str:
 		"""
 		Will be a multi-line string
 		"""
-		return self.tr(
-			'chat.command.status',
-			self.is_recording(), self.is_recording() and not self.is_afking(),
-			misc_util.format_milli(self.get_time_recorded()), misc_util.format_milli(self.get_time_passed()),
-			self.packet_counter, misc_util.B2MB(len(self.file_buffer)), misc_util.B2MB(self.replay_file.size) if self.replay_file is not None else '-1',
-			self.file_name
-		)
+		writer_metrics = self.file_writer.metrics
+		keep_alive_metrics = self.pcrc.fast_lane.metrics
+		if keep_alive_metrics.last_received_time is not None:
+			keep_alive_age = '{:.1f}s'.format((misc_util.get_milli_time() - keep_alive_metrics.last_received_time) / 1000)
+		else:
+			keep_alive_age = '-'
+		ping = self.packet_processor.player_manager.get_ping_by_name(self.pcrc.player_name)
+		downsampler = self.packet_processor.movement_downsampler
+		return '\n'.join([
+			self.tr(
+				'chat.command.status',
+				self.is_recording(), self.is_recording() and not self.is_afking(),
+				misc_util.format_milli(self.get_time_recorded()), misc_util.format_milli(self.get_time_passed()),
+				self.packet_counter, misc_util.B2MB(len(self.file_buffer)), misc_util.B2MB(self.replay_file.size) if self.replay_file is not None else '-1',
+				self.file_name
+			).rstrip(),
+			self.tr(
+				'chat.command.status.file_writer',
+				self.file_writer.queued_amount, RecordingFileWriter.QUEUE_SIZE, writer_metrics.stall_count, writer_metrics.stall_time_ms
+			),
+			self.tr(
+				'chat.command.status.keep_alive',
+				keep_alive_age, keep_alive_metrics.last_reply_time_ms, keep_alive_metrics.max_reply_time_ms, ping if ping is not None else '-'
+			),
+			self.tr(
+				'chat.command.status.load_shedding',
+				self.load_shedder.level, LoadShedder.LEVEL_NAMES[self.load_shedder.level], self.load_shedder.max_lag_ms, self.load_shedder.dropped_packet_count
+			),
+			self.tr(
+				'chat.command.status.entity_downsampling',
+				downsampler.dropped_packet_count, misc_util.B2KB(downsampler.saved_bytes)
+			),
+			self.tr(
+				'chat.command.status.chunk_deduplication',
+				self.chunk_deduplicator.hit_count, self.chunk_deduplicator.miss_count, misc_util.B2KB(self.chunk_deduplicator.saved_bytes)
+			),
+			*([self.tr(
+				'chat.command.status.instant_replay',
+				misc_util.format_milli(self.instant_replay.buffered_duration), misc_util.B2MB(self.instant_replay.size), self.instant_replay.keyframe_amount
+			)] if self.instant_replay.enabled else []),
+			*([self.tr('chat.command.status.write_error', self.file_writer.error)] if self.file_writer.error is not None else [])
+		])
 
 	def on_command(self, command: str, player_name: Optional[str], player_uuid: Optional[str]):
+		"""
+		Invoked in the networking thread. The command is processed in the packet processing worker when recording,
+		in order with the packets, since it reads and changes the recording state
+		"""
+		if self.is_recording():
+			self.packet_worker.submit_task(lambda: self.process_command(command, player_name, player_uuid))
+		else:
+			self.process_command(command, player_name, player_uuid)
+
+	def process_command(self, command: str, player_name: Optional[str], player_uuid: Optional[str]):
 		if player_name == self.pcrc.player_name:
 			return
 		try:
@@ -329,7 +583,7 @@ class Recorder:
 				except ValueError:
 					self.chat(self.tr('chat.command.wrong_argument'))
 				else:
-					if 1 <= index <= len(self.replay_file.markers):
+					if 1 <= index <= len(self.markers):
 						self.delete_marker(index)
 					else:
 						self.chat(self.tr('chat.command.wrong_argument'))
@@ -337,6 +591,18 @@ class Recorder:
 				self.set_file_name(args[2])
 			elif len(args) == 2 and args[1] == 'respawn':
 				self.respawn()
+			elif 2 <= len(args) <= 3 and args[1] == 'clip':
+				if not self.instant_replay.enabled:
+					self.chat(self.tr('chat.command.clip.disabled'))
+					return
+				try:
+					minutes = float(args[2]) if len(args) == 3 else self.get_config('instant_replay_minutes')
+				except ValueError:
+					minutes = -1
+				if minutes > 0:
+					self.save_clip(int(minutes * constant.MILLI_SECOND_PER_MINUTE))
+				else:
+					self.chat(self.tr('chat.command.wrong_argument'))
 			else:
 				self.chat(self.tr('chat.command.unknown', self.get_config('command_prefix')))
 		except:
@@ -358,27 +624,80 @@ class Recorder:
 		old_name = self.file_name
 		self.chat(self.tr('chat.command.name', new_name))
 		self.file_name = new_name
+		if self.replay_file is not None:
+			self.replay_file.update_manifest(file_name=new_name)
+			self.replay_file.write_manifest()
 		self.logger.info('File name is setting from {} to {}'.format(old_name, new_name))
 
+	def save_clip(self, duration: int):
+		"""
+		Save the last duration milliseconds in the instant replay buffer into a replay file in the background
+		"""
+		clip = self.instant_replay.take_clip(duration, self.get_time_recorded())
+		if clip is None:
+			self.chat(self.tr('chat.command.clip.empty'))
+			return
+		self.chat(self.tr('chat.command.clip.saving', misc_util.format_milli(clip.duration)))
+		self.__start_saver('ClipSaver', self.__save_clip, clip, self.player_uuids.copy())
+
+	def __save_clip(self, clip: Clip, player_uuids: List[str]):
+		date = datetime.datetime.today().strftime('%Y_%m_%d_%H_%M_%S')
+		replay_file = ReplayRecording(
+			logger=self.logger,
+			temp_file_dir=os.path.join(self.get_config('recording_temp_file_directory'), '{}_clip_{}'.format(date, misc_util.get_milli_time())),
+			compress_while_recording=True
+		)
+		try:
+			replay_file.update_manifest(
+				server_name=self.get_config('server_name'),
+				mc_version=self.pcrc.mc_version,
+				protocol=self.pcrc.mc_protocol,
+				date=misc_util.get_milli_time() - clip.duration,
+				duration=clip.duration,
+				player_uuids=player_uuids
+			)
+			replay_file.markers = clip.markers
+			for content in clip.iterate_contents(self.get_file_buffer_size()):
+				replay_file.write_recording_content(content)
+			self.__save_replay_file(replay_file, clip.duration, player_uuids, file_name_raw='{}_clip_{}'.format(self.file_name or 'PCRC', date))
+		except:
+			self.logger.exception('Error when saving instant replay clip')
+		finally:
+			replay_file.discard()
+
+	@property
+	def markers(self) -> List[dict]:
+		if self.replay_file is not None:
+			return self.replay_file.markers
+		return self.instant_replay.markers
+
 	def print_markers(self):
-		if len(self.replay_file.markers) == 0:
+		markers = self.markers
+		if len(markers) == 0:
 			self.pcrc.chat(self.tr('chat.command.marker.no_marker'))
 		else:
 			self.pcrc.chat(self.tr('chat.command.marker.list_title'))
-			for i in range(len(self.replay_file.markers)):
-				name = self.replay_file.markers[i]['value']['name'] if 'name' in self.replay_file.markers[i]['value'] else ''
-				self.pcrc.chat('{}. {} {}'.format(i + 1, misc_util.format_milli(self.replay_file.markers[i]['realTimestamp']), name))
+			for i in range(len(markers)):
+				name = markers[i]['value']['name'] if 'name' in markers[i]['value'] else ''
+				self.pcrc.chat('{}. {} {}'.format(i + 1, misc_util.format_milli(markers[i]['realTimestamp']), name))
 
-	def add_marker(self, name=None):
+	def add_marker(self, name=None, *, silent: bool = False):
 		if self.pos is None:
 			self.logger.warning('Fail to add marker, position unknown!')
 			return
 		time_stamp = self.get_time_recorded()
-		marker = self.replay_file.add_marker(self.get_time_recorded(), self.pos, name)
-		self.pcrc.chat(self.tr('chat.command.marker.add', misc_util.format_milli(time_stamp)))
-		self.logger.info('Marker added: {}, {} markers has been stored'.format(marker, len(self.replay_file.markers)))
+		if self.replay_file is not None:
+			marker = self.replay_file.add_marker(self.get_time_recorded(), self.pos, name)
+		else:
+			marker = self.instant_replay.add_marker(self.get_time_recorded(), self.pos, name)
+		if not silent:
+			self.pcrc.chat(self.tr('chat.command.marker.add', misc_util.format_milli(time_stamp)))
+		self.logger.info('Marker added: {}, {} markers has been stored'.format(marker, len(self.markers)))
 
 	def delete_marker(self, index):
-		marker = self.replay_file.pop_marker(index - 1)
+		if self.replay_file is not None:
+			marker = self.replay_file.pop_marker(index - 1)
+		else:
+			marker = self.instant_replay.pop_marker(index - 1)
 		self.pcrc.chat(self.tr('chat.command.marker.delete', misc_util.format_milli(marker['realTimestamp'])))
-		self.logger.info('Marker deleted: {}, {} markers has been stored'.format(marker, len(self.replay_file.markers)))
+		self.logger.info('Marker deleted: {}, {} markers has been stored'.format(marker, len(self.markers)))
@@ -0,0 +1,143 @@
+"""
+Rebuild replay files from the temp recordings left by a PCRC that didn't exit normally
+"""
+import datetime
+import json
+import os
+import shutil
+import zlib
+from logging import Logger
+from typing import List, Optional, Tuple
+
+from pcrc import constant
+from pcrc.recording.replay_recording import ReplayRecording, RECORD_HEADER, make_meta_data, finish_replay_archive
+from pcrc.utils import file_util, parallel_deflate
+from pcrc.utils.zip_util import ZipStreamWriter
+
+
+class RecoveryError(Exception):
+	pass
+
+
+def find_orphaned_recordings(temp_root: str) -> List[str]:
+	"""
+	:return: The temp directories containing an unsaved recording
+	"""
+	if not os.path.isdir(temp_root):
+		return []
+	return sorted(file_util.list_all(temp_root, lambda path: os.path.isfile(os.path.join(path, ReplayRecording.MANIFEST_FILE_NAME))))
+
+
+def truncate_records(file_path: str, checkpoint: dict) -> Tuple[int, int, int]:
+	"""
+	Truncate the recording.tmcpr file to its last complete [time][len][data] record
+
+	:return: A tuple of the size, the crc32 of the kept content, and the time of the last record
+	"""
+	size, crc, last_time = 0, 0, 0
+	checkpoint_crc = None
+	with open(file_path, 'r+b') as f:
+		while True:
+			if size == checkpoint['size']:
+				checkpoint_crc = crc
+			header = f.read(RECORD_HEADER.size)
+			if len(header) < RECORD_HEADER.size:
+				break
+			time, length = RECORD_HEADER.unpack(header)
+			if length < 0:
+				break
+			data = f.read(length)
+			if len(data) < length:
+				break
+			crc = zlib.crc32(data, zlib.crc32(header, crc))
+			size += len(header) + len(data)
+			last_time = time
+		f.truncate(size)
+	if checkpoint_crc is None:
+		raise RecoveryError('Checkpoint at {} bytes is not at the boundary of complete records'.format(checkpoint['size']))
+	if checkpoint_crc != checkpoint['crc32']:
+		raise RecoveryError('Crc32 mismatched at checkpoint, expected {}, found {}'.format(checkpoint['crc32'], checkpoint_crc))
+	return size, crc, last_time
+
+
+def verify_deflated(file_path: str, checkpoint: dict):
+	"""
+	Check that the deflated data kept in the unfinished archive matches the checkpoint
+	"""
+	decompressor = zlib.decompressobj(-15)
+	size, crc = 0, 0
+	remaining = checkpoint['compress_size']
+	with open(file_path, 'rb') as f:
+		f.seek(checkpoint['data_offset'])
+		while remaining > 0:
+			buf = f.read(min(remaining, ZipStreamWriter.BUFFER_SIZE))
+			if len(buf) == 0:
+				raise RecoveryError('Archive is truncated before the checkpoint')
+			remaining -= len(buf)
+			data = decompressor.decompress(buf)
+			size += len(data)
+			crc = zlib.crc32(data, crc)
+	if size != checkpoint['size'] or crc != checkpoint['crc32']:
+		raise RecoveryError('Deflated data mismatched at checkpoint, expected crc32 {} with {} bytes, found crc32 {} with {} bytes'.format(
+			checkpoint['crc32'], checkpoint['size'], crc, size
+		))
+
+
+def recover_recording(logger: Logger, temp_dir: str, storage_dir: str, compress_threads: int = 1) -> Optional[str]:
+	"""
+	:return: The path of the recovered replay file, or None if there's nothing to recover
+	"""
+	with open(os.path.join(temp_dir, ReplayRecording.MANIFEST_FILE_NAME), 'r') as f:
+		manifest: dict = json.load(f)
+	checkpoint: dict = manifest['checkpoint']
+	# content after the checkpoint might be incomplete, so only the checkpointed content counts
+	if checkpoint['size'] < constant.MINIMUM_LEGAL_FILE_SIZE:
+		logger.info('Recording in {} is too small ({}KB), discarded'.format(temp_dir, checkpoint['size'] // constant.BYTE_PER_KB))
+		shutil.rmtree(temp_dir)
+		return None
+	if manifest['protocol'] is None or manifest['mc_version'] is None:
+		raise RecoveryError('Server version is unknown in the manifest')
+
+	duration: int = manifest['duration']
+	archive_path = os.path.join(temp_dir, 'recording.mcpr')
+	if manifest['compress_while_recording']:
+		verify_deflated(archive_path, checkpoint)
+		size, crc = checkpoint['size'], checkpoint['crc32']
+		archive = ZipStreamWriter.recover(archive_path, 'recording.tmcpr', checkpoint['compress_size'], crc, size)
+	else:
+		recording_path = os.path.join(temp_dir, 'recording.tmcpr')
+		size, crc, last_time = truncate_records(recording_path, checkpoint)
+		duration = max(duration, last_time)
+		archive = ZipStreamWriter(archive_path)
+		with open(recording_path, 'rb') as recording_file:
+			deflated = parallel_deflate.deflate_file(recording_file, parallel_deflate.get_worker_amount(compress_threads), level=archive.compress_level)
+			archive.write_deflated('recording.tmcpr', deflated, crc, size)
+
+	date: int = manifest['date']
+	meta_data = make_meta_data(manifest['server_name'], duration, date, manifest['mc_version'], manifest['protocol'], manifest['player_uuids'])
+	finish_replay_archive(archive, manifest['markers'], manifest['mods'], meta_data, crc)
+
+	file_name_raw = manifest['file_name'] or datetime.datetime.fromtimestamp(date / 1000).strftime('PCRC_%Y_%m_%d_%H_%M_%S')
+	file_util.touch_directory(storage_dir)
+	file_path = file_util.get_unused_file_path(storage_dir, file_name_raw + '_recovered', '.mcpr')
+	shutil.move(archive_path, file_path)
+	shutil.rmtree(temp_dir)
+	return file_path
+
+
+def recover_all(logger: Logger, temp_root: str, storage_dir: str, compress_threads: int = 1) -> List[str]:
+	"""
+	:return: The paths of the recovered replay files
+	"""
+	recovered = []
+	for temp_dir in find_orphaned_recordings(temp_root):
+		logger.info('Recovering unsaved recording in {}'.format(temp_dir))
+		try:
+			file_path = recover_recording(logger, temp_dir, storage_dir, compress_threads)
+		except Exception as e:
+			logger.error('Failed to recover recording in {}: {}'.format(temp_dir, e))
+		else:
+			if file_path is not None:
+				logger.info('Recovered replay file "{}"'.format(file_path))
+				recovered.append(file_path)
+	return recovered
@@ -0,0 +1,158 @@
+import math
+from typing import Optional, Dict, Set, Tuple, Iterable
+
+from minecraft.networking.types import PositionAndLook
+
+ChunkPos = Tuple[int, int]
+
+
+class RecordingRegion:
+	"""
+	The horizontal area where entities and chunks are recorded. It's one of:
+
+	- A box: {"from": [x1, z1], "to": [x2, z2]}
+	- A circle with a fixed center: {"center": [x, z], "radius": r}
+	- A circle around PCRC itself: {"radius": r}
+	"""
+	__slots__ = ('min_x', 'min_z', 'max_x', 'max_z', 'center', 'radius')
+
+	min_x: float
+	min_z: float
+	max_x: float
+	max_z: float
+	center: Optional[Tuple[float, float]]
+	radius: Optional[float]
+
+	def __init__(self, data: dict):
+		values = dict.fromkeys(self.__slots__)
+		if 'from' in data and 'to' in data:
+			(x1, z1), (x2, z2) = data['from'], data['to']
+			values.update(min_x=min(x1, x2), min_z=min(z1, z2), max_x=max(x1, x2), max_z=max(z1, z2))
+		elif 'radius' in data:
+			values['radius'] = data['radius']
+			if 'center' in data:
+				values['center'] = tuple(data['center'])
+		else:
+			raise ValueError('Invalid recording region {}, it needs "from" and "to", or "radius"'.format(data))
+		for key, value in values.items():
+			object.__setattr__(self, key, value)
+
+	def __setattr__(self, key, value):
+		raise AttributeError('RecordingRegion is immutable')
+
+	def __get_center(self, pos: Optional[PositionAndLook]) -> Optional[Tuple[float, float]]:
+		if self.center is not None:
+			return self.center
+		if pos is not None:
+			return pos.x, pos.z
+		return None
+
+	def contains(self, x: float, z: float, pos: Optional[PositionAndLook]) -> bool:
+		"""
+		:param pos: The position of PCRC. Everything is in the region if it's needed but unknown yet
+		"""
+		if self.radius is None:
+			return self.min_x <= x <= self.max_x and self.min_z <= z <= self.max_z
+		center = self.__get_center(pos)
+		if center is None:
+			return True
+		return (x - center[0]) ** 2 + (z - center[1]) ** 2 <= self.radius ** 2
+
+	def contains_chunk(self, chunk_x: int, chunk_z: int, pos: Optional[PositionAndLook]) -> bool:
+		"""
+		If any part of the chunk is in the region
+		"""
+		min_x, min_z = chunk_x * 16, chunk_z * 16
+		max_x, max_z = min_x + 16, min_z + 16
+		if self.radius is None:
+			return min_x <= self.max_x and self.min_x <= max_x and min_z <= self.max_z and self.min_z <= max_z
+		center = self.__get_center(pos)
+		if center is None:
+			return True
+		# the nearest point of the chunk to the center
+		x = min(max(center[0], min_x), max_x)
+		z = min(max(center[1], min_z), max_z)
+		return (x - center[0]) ** 2 + (z - center[1]) ** 2 <= self.radius ** 2
+
+
+class EntityPosition:
+	__slots__ = ('x', 'y', 'z', 'chunk', 'yaw', 'pitch')
+
+	def __init__(self, x: float, y: float, z: float):
+		self.x = self.y = self.z = 0.0
+		self.chunk: ChunkPos = (0, 0)
+		# in 1/256 of a full turn, as in the packets
+		self.yaw = 0
+		self.pitch = 0
+		self.set(x, y, z)
+
+	def set(self, x: float, y: float, z: float):
+		self.x = x
+		self.y = y
+		self.z = z
+		self.chunk = (math.floor(x) >> 4, math.floor(z) >> 4)
+
+
+class EntityPositionIndex:
+	"""
+	The positions of the entities the client knows, indexed by the chunks they are in
+	"""
+	# relative moves are in 1/4096 blocks since 1.9
+	RELATIVE_MOVE_SCALE = 4096
+
+	def __init__(self):
+		self.__positions: Dict[int, EntityPosition] = {}
+		self.__chunks: Dict[ChunkPos, Set[int]] = {}
+
+	def clear(self):
+		self.__positions.clear()
+		self.__chunks.clear()
+
+	def get(self, entity_id: int) -> Optional[EntityPosition]:
+		return self.__positions.get(entity_id)
+
+	def set(self, entity_id: int, x: float, y: float, z: float) -> EntityPosition:
+		position = self.__positions.get(entity_id)
+		if position is None:
+			position = self.__positions[entity_id] = EntityPosition(x, y, z)
+		else:
+			old_chunk = position.chunk
+			position.set(x, y, z)
+			if position.chunk == old_chunk:
+				return position
+			self.__remove_from_chunk(entity_id, old_chunk)
+		self.__chunks.setdefault(position.chunk, set()).add(entity_id)
+		return position
+
+	def move(self, entity_id: int, delta_x: int, delta_y: int, delta_z: int) -> Optional[EntityPosition]:
+		"""
+		:return: The new position, or None if the position of the entity is unknown
+		"""
+		position = self.__positions.get(entity_id)
+		if position is None:
+			return None
+		scale = self.RELATIVE_MOVE_SCALE
+		return self.set(entity_id, position.x + delta_x / scale, position.y + delta_y / scale, position.z + delta_z / scale)
+
+	def rotate(self, entity_id: int, yaw: int, pitch: int):
+		position = self.__positions.get(entity_id)
+		if position is not None:
+			position.yaw = yaw
+			position.pitch = pitch
+
+	def remove(self, entity_id: int):
+		position = self.__positions.pop(entity_id, None)
+		if position is not None:
+			self.__remove_from_chunk(entity_id, position.chunk)
+
+	def __remove_from_chunk(self, entity_id: int, chunk: ChunkPos):
+		entity_ids = self.__chunks[chunk]
+		entity_ids.discard(entity_id)
+		if len(entity_ids) == 0:
+			del self.__chunks[chunk]
+
+	def get_chunks(self) -> Iterable[ChunkPos]:
+		return list(self.__chunks.keys())
+
+	def get_entities_in_chunk(self, chunk: ChunkPos) -> Iterable[int]:
+		return list(self.__chunks.get(chunk, ()))
@@ -1,31 +1,119 @@
 import json
 import os
 import shutil
-import zipfile
+import struct
 import zlib
-from typing import List, Optional
+from logging import Logger
+from threading import Lock
+from typing import List, Optional, BinaryIO, Dict, Any
 
 from minecraft.networking.types import PositionAndLook
-from pcrc import constant
-from pcrc.utils import file_util
+from pcrc.utils import file_util, parallel_deflate
+from pcrc.utils.zip_util import ZipStreamWriter
+
+# the header of a packet record in recording.tmcpr: the recorded time in milliseconds, and the length of the packet content
+RECORD_HEADER = struct.Struct('>ii')
+
+
+def make_meta_data(server_name: str, duration: int, date: int, mc_version: str, protocol: int, player_uuids: List[str]) -> dict:
+	file_format_version = \
+		6 if mc_version == '1.12' else \
+		9 if mc_version == '1.12.2' else \
+		14
+	return {
+		'singleplayer': False,
+		'serverName': server_name,
+		'duration': duration,
+		'date': date,
+		'mcversion': mc_version,
+		'fileFormat': 'MCPR',
+		'fileFormatVersion': file_format_version,
+		'protocol': protocol,
+		'generator': 'PCRC',
+		'selfId': -1,
+		'players': player_uuids
+	}
+
+
+def make_marker(time_stamp: int, pos: PositionAndLook, name=None) -> dict:
+	marker = {
+		'realTimestamp': time_stamp,
+		'value': {
+			'position': {
+				'x': pos.x,
+				'y': pos.y,
+				'z': pos.z,
+				# seems that replay mod switches these two values, idk y
+				'yaw': pos.pitch,
+				'pitch': pos.yaw,
+				'roll': 0.0
+			}
+		}
+	}
+	if name is not None:
+		marker['value']['name'] = name
+	return marker
+
+
+def finish_replay_archive(archive: ZipStreamWriter, markers: list, mods: list, meta_data: dict, crc32: int):
+	"""
+	Write the entries besides recording.tmcpr into the archive, then close it
+	"""
+	def add(name: str, data: str):
+		archive.writestr(name, data.encode('utf8'))
+
+	add('markers.json', json.dumps(markers))
+	add('mods.json', json.dumps({"requiredMods": mods}))
+	add('metaData.json', json.dumps(meta_data))
+	add('recording.tmcpr.crc32', str(crc32))
+	archive.close()
 
 
 class ReplayRecording:
-	def __init__(self, temp_file_dir: str):
+	MANIFEST_FILE_NAME = 'manifest.json'
+	MANIFEST_FORMAT_VERSION = 1
+
+	def __init__(self, logger: Logger, temp_file_dir: str, compress_while_recording: bool = False):
+		"""
+		:param compress_while_recording: If the recording content should be deflated into the archive as soon as it's written,
+		instead of being stored in a temp recording.tmcpr file and archived when creating the replay recording
+		"""
+		self.logger = logger
 		self.temp_file_dir = temp_file_dir
 		self.mods = []
 		self.meta_data = {}
 		self.markers = []
 		self.__file_size = 0
+		self.__crc32 = 0
+		self.__archive: Optional[ZipStreamWriter] = None
+		self.__recording_file: Optional[BinaryIO] = None
+		self.__manifest_lock = Lock()
+		# information for recovering the recording if PCRC doesn't exit normally
+		self.manifest: Dict[str, Any] = {
+			'server_name': None,
+			'mc_version': None,
+			'protocol': None,
+			'date': None,
+			'duration': 0,
+			'player_uuids': [],
+			'file_name': None,
+		}
+		# the state of the recording content that has been synced to the disk
+		self.__checkpoint: Dict[str, int] = {'size': 0, 'crc32': 0}
 
 		if os.path.exists(temp_file_dir):
 			shutil.rmtree(temp_file_dir)
 		os.makedirs(temp_file_dir)
-		file_util.touch_file(self.recording_file_path, forced=True)
+		if compress_while_recording:
+			self.__archive = ZipStreamWriter(self.archive_file_path)
+			self.__archive.begin_entry('recording.tmcpr')
+		else:
+			self.__recording_file = open(self.recording_file_path, 'wb')
 		# these 3 files are not used in PCRC recording
 		self.write_markers()
 		self.write_mods()
 		self.write_meta_data()
+		self.write_manifest()
 
 	def __get_file(self, file_name: str) -> str:
 		return os.path.join(self.temp_file_dir, file_name)
@@ -34,81 +122,144 @@ class ReplayRecording:
 	def size(self):
 		return self.__file_size
 
+	@property
+	def crc32(self) -> int:
+		"""
+		The crc32 of all recording content written so far
+		"""
+		return self.__crc32
+
 	@property
 	def recording_file_path(self) -> str:
 		return self.__get_file('recording.tmcpr')
 
-	def create_replay_recording(self, target_file_path: str):
+	@property
+	def archive_file_path(self) -> str:
+		return self.__get_file('recording.mcpr')
+
+	def is_compressing_while_recording(self) -> bool:
+		return self.__archive is not None
+
+	def create_replay_recording(self, target_file_path: str, compress_threads: int = 1):
+		"""
+		:param compress_threads: the amount of threads for deflating the temp recording.tmcpr file.
+		Non-positive value means using all cpu cores
+		"""
 		file_util.touch_directory(os.path.dirname(target_file_path))
-		file_util.touch_file(self.recording_file_path)
-
-		zipf = zipfile.ZipFile(target_file_path, 'w', zipfile.ZIP_DEFLATED)
-
-		def add(name: str, data: Optional[str] = None):
-			existed_file_name = os.path.join(self.temp_file_dir, name)
-			if data is not None:
-				with open(existed_file_name, 'w', encoding='utf8') as f:
-					f.write(data)
-			zipf.write(existed_file_name, arcname=name)
-
-		add('markers.json')
-		add('mods.json')
-		add('metaData.json')
-		add('recording.tmcpr.crc32', str(crc32_file(self.recording_file_path)))
-		add('recording.tmcpr')
-		zipf.close()
+
+		if self.__archive is not None:
+			# the recording content has already been deflated into the archive
+			archive = self.__archive
+			recording_entry = archive.end_entry()
+			if recording_entry.crc != self.crc32 or recording_entry.file_size != self.size:
+				self.logger.warning('Recording content mismatched, expected crc32 {} with {} bytes, archived crc32 {} with {} bytes'.format(
+					self.crc32, self.size, recording_entry.crc, recording_entry.file_size
+				))
+		else:
+			self.__close_recording_file()
+			archive = ZipStreamWriter(self.archive_file_path)
+			file_size = os.path.getsize(self.recording_file_path)
+			if file_size != self.size:
+				self.logger.warning('Recording file size mismatched, expected {} bytes, found {} bytes'.format(self.size, file_size))
+			workers = parallel_deflate.get_worker_amount(compress_threads)
+			self.logger.debug('Deflating recording.tmcpr with {} threads'.format(workers))
+			with open(self.recording_file_path, 'rb') as recording_file:
+				# the running crc32 is reused, so the content doesn't need to be scanned again for it
+				archive.write_deflated('recording.tmcpr', parallel_deflate.deflate_file(recording_file, workers, level=archive.compress_level), self.crc32, self.size)
+
+		finish_replay_archive(archive, self.markers, self.mods, self.meta_data, self.crc32)
+		self.__archive = None
+		# the recording is no longer needed to be recovered
+		os.remove(self.__get_file(self.MANIFEST_FILE_NAME))
+		shutil.move(self.archive_file_path, target_file_path)
 		shutil.rmtree(self.temp_file_dir)
 
+	def discard(self):
+		"""
+		Release the opened file handles when the recording is abandoned without creating the replay recording
+		"""
+		if self.__archive is not None:
+			self.__archive.abort()
+			self.__archive = None
+		self.__close_recording_file()
+
+	def __close_recording_file(self):
+		if self.__recording_file is not None:
+			self.__recording_file.close()
+			self.__recording_file = None
+
 	def add_marker(self, time_stamp: int, pos: PositionAndLook, name=None):
-		marker = {
-			'realTimestamp': time_stamp,
-			'value': {
-				'position': {
-					'x': pos.x,
-					'y': pos.y,
-					'z': pos.z,
-					# seems that replay mod switches these two values, idk y
-					'yaw': pos.pitch,
-					'pitch': pos.yaw,
-					'roll': 0.0
-				}
-			}
-		}
-		if name is not None:
-			marker['value']['name'] = name
+		marker = make_marker(time_stamp, pos, name)
 		self.markers.append(marker)
 		self.write_markers()
+		self.write_manifest()
 		return marker
 
 	def pop_marker(self, index):
 		ret = self.markers.pop(index - 1)
 		self.write_markers()
+		self.write_manifest()
 		return ret
 
 	def set_meta_data(self, server_name: str, duration: int, date: int, mc_version: str, protocol: int, player_uuids: List[str]):
-		file_format_version = \
-			6 if mc_version == '1.12' else \
-			9 if mc_version == '1.12.2' else \
-			14
-		self.meta_data = {
-			'singleplayer': False,
-			'serverName': server_name,
-			'duration': duration,
-			'date': date,
-			'mcversion': mc_version,
-			'fileFormat': 'MCPR',
-			'fileFormatVersion': file_format_version,
-			'protocol': protocol,
-			'generator': 'PCRC',
-			'selfId': -1,
-			'players': player_uuids
-		}
+		self.meta_data = make_meta_data(server_name, duration, date, mc_version, protocol, player_uuids)
 		self.write_meta_data()
 
+	def update_manifest(self, **kwargs):
+		"""
+		The manifest will be written to the disk in the next checkpoint
+		"""
+		for key, value in kwargs.items():
+			if key not in self.manifest:
+				raise KeyError('Unknown manifest key {}'.format(key))
+			self.manifest[key] = value
+
 	def write_recording_content(self, content: bytes):
-		with open(self.recording_file_path, 'ab+') as file_handler:
-			file_handler.write(content)
+		if self.__archive is not None:
+			self.__archive.write(content)
+		else:
+			self.__recording_file.write(content)
 		self.__file_size += len(content)
+		self.__crc32 = zlib.crc32(content, self.__crc32)
+		self.checkpoint()
+
+	def checkpoint(self):
+		"""
+		Sync the recording content to the disk, then record its size and crc32 in the manifest.
+		Everything before the checkpoint can be recovered if PCRC is killed
+		"""
+		checkpoint = {'size': self.__file_size, 'crc32': self.__crc32}
+		if self.__archive is not None:
+			# the deflate stream stays valid if it's truncated at the end of a flush
+			self.__archive.flush()
+			entry = self.__archive.current_entry
+			checkpoint['data_offset'] = entry.data_offset
+			checkpoint['compress_size'] = entry.compress_size
+		elif self.__recording_file is not None:
+			self.__recording_file.flush()
+			os.fsync(self.__recording_file.fileno())
+		self.__checkpoint = checkpoint
+		self.write_manifest()
+
+	def write_manifest(self):
+		"""
+		The manifest is replaced atomically, so it's always a complete one
+		"""
+		manifest = dict(self.manifest)
+		manifest.update({
+			'format_version': self.MANIFEST_FORMAT_VERSION,
+			'compress_while_recording': self.is_compressing_while_recording(),
+			'markers': list(self.markers),
+			'mods': self.mods,
+			'checkpoint': self.__checkpoint,
+		})
+		file_path = self.__get_file(self.MANIFEST_FILE_NAME)
+		with self.__manifest_lock:
+			with open(file_path + '.tmp', 'w') as manifest_file_handler:
+				manifest_file_handler.write(json.dumps(manifest))
+				manifest_file_handler.flush()
+				os.fsync(manifest_file_handler.fileno())
+			os.replace(file_path + '.tmp', file_path)
 
 	def write_markers(self):
 		with open(self.__get_file('markers.json'), 'w') as markers_file_handler:
@@ -122,14 +273,3 @@ class ReplayRecording:
 		with open(self.__get_file('metaData.json'), 'w') as meta_data_file_handler:
 			meta_data_file_handler.write(json.dumps(self.meta_data))
 
-
-def crc32_file(file_name: str) -> int:
-	BUFFER_SIZE = constant.BYTE_PER_MB
-	crc = 0
-	with open(file_name, 'rb') as handler:
-		while True:
-			buffer = handler.read(BUFFER_SIZE)
-			if len(buffer) == 0:
-				break
-			crc = zlib.crc32(buffer, crc)
-	return crc & 0xFFFFFFFF
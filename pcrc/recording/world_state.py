@@ -0,0 +1,265 @@
+from collections import deque
+from logging import Logger
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple, Deque, Union
+
+from minecraft.networking.connection import ConnectionContext
+from minecraft.networking.packets import Packet, JoinGamePacket, PlayerPositionAndLookPacket, PlayerListItemPacket, PacketBuffer
+from minecraft.networking.packets.clientbound.play import TimeUpdatePacket, RespawnPacket, SpawnPlayerPacket, SpawnObjectPacket, BlockChangePacket, MultiBlockChangePacket
+from minecraft.networking.types import VarInt, UUID, String, Boolean, Position
+from pcrc.packets.s2c import DestroyEntitiesPacket, ChangeGameStatePacket, SpawnLivingEntityPacket, SpawnExperienceOrbPacket, SpawnPaintingPacket, \
+	ChunkDataPacket, UnloadChunkPacket, UpdateLightPacket, UpdateViewPositionPacket, UpdateViewDistancePacket
+from pcrc.packets.s2c.entity_packet import EntityMetadataPacket, EntityEquipmentPacket, EntityTeleportPacket
+
+if TYPE_CHECKING:
+	from pcrc.recording.recorder import Recorder
+
+
+ChunkPos = Tuple[int, int]
+BlockPos = Tuple[int, int, int]
+
+SPAWN_ENTITY_PACKETS = (SpawnObjectPacket, SpawnLivingEntityPacket, SpawnPlayerPacket, SpawnExperienceOrbPacket, SpawnPaintingPacket)
+WEATHER_REASONS = (1, 2, 7, 8)
+
+
+class ChunkState:
+	def __init__(self):
+		# Update Light before the chunk data, Chunk Data
+		self.packets: List[bytes] = []
+		# the latest Update Light after the chunk data. Only the latest one is kept, or the list grows as long as the chunk stays loaded
+		self.light: Optional[bytes] = None
+		# block changes after the chunk data, block pos -> block state id
+		self.blocks: Dict[BlockPos, int] = {}
+		self.loaded = False
+
+	def dump_packets(self) -> List[bytes]:
+		if self.light is not None:
+			return self.packets + [self.light]
+		return self.packets
+
+
+class EntityState:
+	TRACKED_PACKETS = (EntityMetadataPacket, EntityEquipmentPacket, EntityTeleportPacket)
+	# equipment packets only contain the changed slots, keep enough of them to cover all slots
+	MAX_EQUIPMENT_PACKETS = 6
+
+	def __init__(self, spawn_packet: bytes):
+		self.spawn_packet = spawn_packet
+		# the first metadata packet after spawning contains the full metadata
+		self.first_metadata: Optional[bytes] = None
+		self.latest_metadata: Optional[bytes] = None
+		self.equipments: Deque[bytes] = deque(maxlen=self.MAX_EQUIPMENT_PACKETS)
+		self.teleport: Optional[bytes] = None
+		self.player_uuid: Optional[str] = None
+
+	def on_packet(self, packet: Union[EntityMetadataPacket, EntityEquipmentPacket, EntityTeleportPacket], content: bytes):
+		if isinstance(packet, EntityMetadataPacket):
+			if self.first_metadata is None:
+				self.first_metadata = content
+			else:
+				self.latest_metadata = content
+		elif isinstance(packet, EntityEquipmentPacket):
+			self.equipments.append(content)
+		else:
+			self.teleport = content
+
+	def dump_packets(self) -> List[bytes]:
+		packets = [self.spawn_packet]
+		if self.first_metadata is not None:
+			packets.append(self.first_metadata)
+		if self.latest_metadata is not None:
+			packets.append(self.latest_metadata)
+		packets.extend(self.equipments)
+		if self.teleport is not None:
+			packets.append(self.teleport)
+		return packets
+
+
+class WorldState:
+	"""
+	Tracks what the client is seeing with the recorded packet contents,
+	so a new replay recording can start with the current world state without reconnecting
+
+	Entities are restored at their spawn position, or their latest absolute teleport position,
+	the server will correct their positions with its periodic position syncing
+	"""
+	# the packets whose decoded fields are needed for tracking
+	TRACKED_PACKETS = (
+		JoinGamePacket, RespawnPacket, UpdateViewDistancePacket, UpdateViewPositionPacket, PlayerPositionAndLookPacket, TimeUpdatePacket, ChangeGameStatePacket,
+		ChunkDataPacket, UpdateLightPacket, UnloadChunkPacket, BlockChangePacket, MultiBlockChangePacket,
+		*SPAWN_ENTITY_PACKETS, DestroyEntitiesPacket, EntityMetadataPacket, EntityEquipmentPacket, EntityTeleportPacket
+	)
+
+	def __init__(self, recorder: 'Recorder'):
+		self.recorder: 'Recorder' = recorder
+		self.logger: Logger = recorder.logger
+		self.context: Optional[ConnectionContext] = None
+		self.join_game: Optional[bytes] = None
+		self.respawn: Optional[bytes] = None
+		self.view_distance: Optional[bytes] = None
+		self.view_position: Optional[bytes] = None
+		self.position: Optional[bytes] = None
+		self.time: Optional[bytes] = None
+		self.weather: Dict[int, bytes] = {}
+		self.chunks: Dict[ChunkPos, ChunkState] = {}
+		self.entities: Dict[int, EntityState] = {}
+
+	def reset(self):
+		self.context = None
+		self.join_game = None
+		self.respawn = None
+		self.view_distance = None
+		self.view_position = None
+		self.position = None
+		self.time = None
+		self.weather.clear()
+		self.__clear_world()
+
+	def __clear_world(self):
+		self.chunks.clear()
+		self.entities.clear()
+
+	def get_player_uuids(self) -> List[str]:
+		return [entity.player_uuid for entity in self.entities.values() if entity.player_uuid is not None]
+
+	def on_packet(self, packet: Packet, content: bytes):
+		"""
+		:param content: The packet content that is recorded
+		"""
+		try:
+			self._on_packet(packet, content)
+		except:
+			self.logger.exception('Error when tracking world state with packet {}'.format(type(packet).__name__))
+
+	def _on_packet(self, packet: Packet, content: bytes):
+		if isinstance(packet, JoinGamePacket):
+			self.reset()
+			self.context = packet.context
+			self.join_game = content
+		elif isinstance(packet, RespawnPacket):
+			self.respawn = content
+			self.__clear_world()
+		elif isinstance(packet, UpdateViewDistancePacket):
+			self.view_distance = content
+		elif isinstance(packet, UpdateViewPositionPacket):
+			self.view_position = content
+		elif isinstance(packet, PlayerPositionAndLookPacket):
+			self.position = content
+		elif isinstance(packet, TimeUpdatePacket):
+			self.time = content
+		elif isinstance(packet, ChangeGameStatePacket):
+			if packet.reason in WEATHER_REASONS:
+				self.weather[packet.reason] = content
+
+		# chunks
+		elif isinstance(packet, ChunkDataPacket):
+			chunk = self.chunks.get((packet.chunk_x, packet.chunk_z))
+			if chunk is None or chunk.loaded:
+				chunk = self.chunks[(packet.chunk_x, packet.chunk_z)] = ChunkState()
+			chunk.packets.append(content)
+			chunk.loaded = True
+		elif isinstance(packet, UpdateLightPacket):
+			chunk = self.chunks.setdefault((packet.chunk_x, packet.chunk_z), ChunkState())
+			if chunk.loaded:
+				chunk.light = content
+			else:
+				chunk.packets.append(content)
+		elif isinstance(packet, UnloadChunkPacket):
+			self.chunks.pop((packet.chunk_x, packet.chunk_z), None)
+		elif isinstance(packet, BlockChangePacket):
+			location = packet.location
+			self.__set_block((location.x, location.y, location.z), packet.block_state_id)
+		elif isinstance(packet, MultiBlockChangePacket):
+			# since 1.16.2 the records are relative to a chunk section, instead of a chunk column
+			base_y = getattr(packet, 'chunk_y', 0) * 16 if packet.context.protocol_later_eq(751) else 0
+			for record in packet.records:
+				self.__set_block((packet.chunk_x * 16 + record.x, base_y + record.y, packet.chunk_z * 16 + record.z), record.block_state_id)
+
+		# entities
+		elif isinstance(packet, SPAWN_ENTITY_PACKETS):
+			entity = self.entities[packet.entity_id] = EntityState(content)
+			if isinstance(packet, SpawnPlayerPacket):
+				entity.player_uuid = packet.player_UUID
+		elif isinstance(packet, DestroyEntitiesPacket):
+			for entity_id in packet.entity_ids:
+				self.entities.pop(entity_id, None)
+		elif isinstance(packet, EntityState.TRACKED_PACKETS):
+			entity = self.entities.get(packet.entity_id)
+			if entity is not None:
+				entity.on_packet(packet, content)
+
+	def pop_entity(self, entity_id: int) -> Optional[EntityState]:
+		return self.entities.pop(entity_id, None)
+
+	def put_entity(self, entity_id: int, entity: EntityState):
+		self.entities[entity_id] = entity
+
+	def __set_block(self, pos: BlockPos, block_state_id: int):
+		chunk = self.chunks.get((pos[0] >> 4, pos[2] >> 4))
+		if chunk is not None and chunk.loaded:
+			chunk.blocks[pos] = block_state_id
+
+	def make_packet_content(self, packet: Packet) -> bytes:
+		packet.context = self.context
+		packet_buffer = PacketBuffer()
+		VarInt.send(packet.id, packet_buffer)
+		packet.write_fields(packet_buffer)
+		return packet_buffer.get_writable()
+
+	def make_block_change(self, pos: BlockPos, block_state_id: int) -> bytes:
+		packet = BlockChangePacket()
+		packet.location = Position(*pos)
+		packet.block_state_id = block_state_id
+		return self.make_packet_content(packet)
+
+	def __make_player_list(self) -> Optional[bytes]:
+		players = self.recorder.packet_processor.player_manager.get_players()
+		if len(players) == 0:
+			return None
+		packet_buffer = PacketBuffer()
+		VarInt.send(PlayerListItemPacket.get_id(self.context), packet_buffer)
+		VarInt.send(0, packet_buffer)  # action: add player
+		VarInt.send(len(players), packet_buffer)
+		for uuid, info in players.items():
+			UUID.send(uuid, packet_buffer)
+			String.send(info.name, packet_buffer)
+			VarInt.send(len(info.properties), packet_buffer)
+			for prop in info.properties:
+				String.send(prop.name, packet_buffer)
+				String.send(prop.value, packet_buffer)
+				Boolean.send(prop.signature is not None, packet_buffer)
+				if prop.signature is not None:
+					String.send(prop.signature, packet_buffer)
+			VarInt.send(info.game_mode, packet_buffer)
+			VarInt.send(info.ping, packet_buffer)
+			Boolean.send(info.display_name is not None, packet_buffer)
+			if info.display_name is not None:
+				String.send(info.display_name, packet_buffer)
+		return packet_buffer.get_writable()
+
+	def dump_packets(self) -> List[bytes]:
+		"""
+		:return: The packet contents that bring a fresh client to the current world state
+		"""
+		if self.join_game is None:
+			return []
+		packets = [self.join_game]
+
+		def add(content: Optional[bytes]):
+			if content is not None:
+				packets.append(content)
+
+		add(self.respawn)
+		add(self.view_distance)
+		add(self.view_position)
+		add(self.position)
+		add(self.time)
+		packets.extend(self.weather.values())
+		add(self.__make_player_list())
+		for chunk in self.chunks.values():
+			if chunk.loaded:
+				packets.extend(chunk.dump_packets())
+				for pos, block_state_id in chunk.blocks.items():
+					packets.append(self.make_block_change(pos, block_state_id))
+		for entity in self.entities.values():
+			packets.extend(entity.dump_packets())
+		return packets
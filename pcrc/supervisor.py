@@ -0,0 +1,183 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, Future
+from logging import Logger
+from typing import Dict, List, Optional
+
+from pcrc.config import ProfileConfig
+from pcrc.pcrc_client import PcrcClient
+from pcrc.utils import misc_util
+
+
+class PcrcSupervisor:
+	"""
+	Records every server in the server_profiles option from a single PCRC process
+
+	Every profile is recorded by its own PcrcClient with separated temp and storage directories and log file,
+	while the Minecraft authentication and a save worker pool are shared by all of them.
+	The primary client only provides the authentication, it doesn't record the server in the config file
+	"""
+
+	def __init__(self, primary: PcrcClient):
+		self.primary = primary
+		self.logger: Logger = primary.logger
+		self.save_executor = ThreadPoolExecutor(max_workers=max(1, primary.config.get('save_workers')), thread_name_prefix='ReplaySaver')
+		self.clients: Dict[str, PcrcClient] = {}
+		for profile in primary.config.get('server_profiles'):
+			config = ProfileConfig(profile)
+			if config.name in self.clients:
+				raise ValueError('Duplicated server profile name {}'.format(config.name))
+			self.clients[config.name] = PcrcClient(
+				input_manager=primary.input_manager, config=config,
+				authenticator=primary.authenticator, save_executor=self.save_executor
+			)
+
+	def init(self):
+		for client in self.clients.values():
+			client.init()
+
+	def __get_clients(self, name: Optional[str]) -> List[PcrcClient]:
+		if name is None:
+			return list(self.clients.values())
+		client = self.clients.get(name)
+		if client is None:
+			self.logger.warning('Unknown server profile {}, available profiles: {}'.format(name, ', '.join(self.clients.keys())))
+			return []
+		return [client]
+
+	def show_help(self):
+		self.logger.info('Command list: help|start [<name>]|stop [<name>]|restart [<name>]|exit|reload|auth|status|list <name>|recover')
+
+	def start(self, name: Optional[str] = None):
+		if not self.primary.has_authenticated():
+			self.logger.warning('Minecraft authentication is not done, enter "auth" to authenticate')
+			return
+		for client in self.__get_clients(name):
+			if not client.is_fully_stopped():
+				client.logger.warning('PCRC is running, ignore')
+			elif not client.start():
+				client.logger.warning('Failed to start PCRC')
+
+	def stop(self, name: Optional[str] = None):
+		clients = self.__get_clients(name)
+		for client in clients:
+			client.interrupt_auto_restart()
+			if client.recorder.is_recording():
+				client.stop()
+		for client in clients:
+			while client.is_running():
+				time.sleep(0.1)
+
+	def show_status(self):
+		"""
+		One line for every server and the total, use "status <name>" for the full status of a server
+		"""
+		total_size = 0
+		total_packets = 0
+		recording_amount = 0
+		saving_amount = 0
+		for name, client in self.clients.items():
+			recorder = client.recorder
+			recording = recorder.is_recording()
+			size = recorder.replay_file.size if recording and recorder.replay_file is not None else 0
+			self.logger.info('[{}] Online: {}, Recording: {}, Afking: {}, Time recorded: {}, Packets: {}, File size: {}MB'.format(
+				name, client.is_online(), recording, recording and recorder.is_afking(),
+				misc_util.format_milli(recorder.get_time_recorded()) if recording else '-',
+				recorder.packet_counter, misc_util.B2MB(size)
+			))
+			saving_amount += len([saver for saver in recorder.saver_threads if isinstance(saver, Future) and not saver.done()])
+			if recording:
+				recording_amount += 1
+				total_size += size
+				total_packets += recorder.packet_counter
+		self.logger.info('Total: {}/{} servers recording, Packets: {}, File size: {}MB, Saving tasks: {}'.format(
+			recording_amount, len(self.clients), total_packets, misc_util.B2MB(total_size), saving_amount
+		))
+
+	def show_client_status(self, name: str):
+		for client in self.__get_clients(name):
+			client.logger.info('Online: {}'.format(client.is_online()))
+			client.logger.info('Stopped: {}'.format(client.is_fully_stopped()))
+			for line in client.recorder.get_status().splitlines():
+				client.logger.info(line)
+
+	def show_player_list(self, name: str):
+		for client in self.__get_clients(name):
+			if client.is_online():
+				for line in client.recorder.packet_processor.player_manager.dump_player_list().splitlines():
+					client.logger.info('  ' + line)
+			else:
+				client.logger.warning('PCRC is not online, cannot get player list')
+
+	def recover(self):
+		for client in self.clients.values():
+			if client.is_fully_stopped():
+				recovered = client.recover_recordings()
+				client.logger.info('Recovered {} replay file(s)'.format(len(recovered)))
+			else:
+				client.logger.warning('PCRC is running, stop it before recovering recordings')
+
+	def reload(self):
+		"""
+		The server profiles are only read on startup, this reloads the options of the existing profiles
+		"""
+		for client in self.clients.values():
+			client.reload_config()
+
+	def main(self):
+		self.init()
+		self.logger.info('Supervising {} servers: {}'.format(len(self.clients), ', '.join(self.clients.keys())))
+		self.logger.info('Enter "start" to start recording all servers, or "start <name>" for one of them')
+		while True:
+			try:
+				text = input()
+				if text == '':
+					continue
+				self.logger.info('Processing CLI command "{}"'.format(text))
+				args = text.split(' ')
+				command, name = args[0], args[1] if len(args) >= 2 else None
+
+				if command in ['help', '?']:
+					self.show_help()
+				elif command == 'start':
+					self.start(name)
+				elif command == 'stop':
+					self.stop(name)
+				elif command == 'restart':
+					self.stop(name)
+					self.start(name)
+				elif command == 'exit':
+					break
+				elif command == 'reload':
+					self.reload()
+				elif command == 'auth':
+					if self.primary.has_authenticated():
+						self.logger.warning('Minecraft authentication is already done')
+					else:
+						self.primary.authenticate()
+				elif command == 'status':
+					if name is None:
+						self.show_status()
+					else:
+						self.show_client_status(name)
+				elif command == 'list' and name is not None:
+					self.show_player_list(name)
+				elif command == 'recover':
+					self.recover()
+				else:
+					self.logger.error('Command "{}" not found!'.format(text))
+			except (KeyboardInterrupt, SystemExit):
+				self.logger.info('User interrupted')
+				break
+			except:
+				self.logger.exception('Error handling console input')
+		try:
+			self.logger.info('Stopping all servers before exit')
+			self.stop()
+		except (KeyboardInterrupt, SystemExit):
+			self.logger.info('Forced to stop')
+			return
+		except:
+			self.logger.exception('Error waiting for PCRC to stop')
+		finally:
+			self.save_executor.shutdown(wait=False)
+		self.logger.info('Exited')
@@ -37,3 +37,17 @@ def get_file_suffix(file_path: str):
 	if index == -1:
 		return ''
 	return file_name[index:]
+
+
+def get_unused_file_path(directory: str, file_name_raw: str, suffix: str) -> str:
+	"""
+	Append a counter to the file name until the file path is not taken
+	"""
+	file_name = file_name_raw + suffix
+	counter = 2
+	while True:
+		file_path = os.path.join(directory, file_name)
+		if not os.path.isfile(file_path):
+			return file_path
+		file_name = '{}_{}{}'.format(file_name_raw, counter, suffix)
+		counter += 1
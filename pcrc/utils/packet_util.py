@@ -1,8 +1,10 @@
+import functools
 import inspect
-from typing import Iterable, Any, Set, Type
+from typing import Iterable, Any, Set, Type, Tuple
 
-from minecraft.networking.packets import Packet, PlayerListItemPacket
+from minecraft.networking.packets import Packet, PlayerListItemPacket, PacketBuffer
 from minecraft.networking.packets.clientbound.play import EntityPositionDeltaPacket, EntityVelocityPacket
+from minecraft.networking.types import VarInt
 
 IMPORTANT_PACKETS = (
 	PlayerListItemPacket
@@ -13,14 +15,37 @@ def is_important(packet: Packet):
 	return isinstance(packet, IMPORTANT_PACKETS)
 
 
+def make_packet_content(packet: Packet) -> bytes:
+	"""
+	The packet id and the packet data of a packet created by PCRC
+	"""
+	packet_buffer = PacketBuffer()
+	VarInt.send(packet.id, packet_buffer)
+	packet.write_fields(packet_buffer)
+	return packet_buffer.get_writable()
+
+
+def get_raw_content(packet: Packet) -> memoryview:
+	"""
+	The packet id and the packet data of a received packet to be recorded
+	"""
+	content: memoryview = getattr(packet, 'raw_data')
+	if content[0] == 0x00:
+		content = content[1:]
+	return content
+
+
 def gather_all_packet_classes(global_values: Iterable[Any]) -> Set[Type[Packet]]:
 	return set(filter(lambda o: isinstance(o, type) and o != Packet and issubclass(o, Packet) and not inspect.isabstract(o), global_values))
 
 
-def is_entity_packet(packet: Packet) -> bool:
+@functools.lru_cache(maxsize=None)
+def get_entity_packet_classes() -> Tuple[Type[Packet], ...]:
+	# these modules import this module, so they can only be imported here
 	from pcrc.packets.s2c.entity_packet import AbstractEntityPacket
-	return hasattr(packet, 'entity_id') and isinstance(packet, (
-		AbstractEntityPacket,
-		EntityPositionDeltaPacket,
-		EntityVelocityPacket
-	))
+	from pcrc.recording.raw_packet_filter import RawEntityPacket
+	return AbstractEntityPacket, EntityPositionDeltaPacket, EntityVelocityPacket, RawEntityPacket
+
+
+def is_entity_packet(packet: Packet) -> bool:
+	return isinstance(packet, get_entity_packet_classes())
@@ -0,0 +1,57 @@
+"""
+pigz-like parallel deflate
+
+The input is split into blocks that are deflated concurrently. Each block is primed with the tail of the previous block
+as the preset dictionary, and ends with a sync flush, so the concatenated outputs form one single raw deflate stream
+that any inflater can read
+"""
+import os
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import BinaryIO, Iterator, Optional, Deque
+
+DICTIONARY_SIZE = 32 * 1024  # the deflate window size
+DEFAULT_BLOCK_SIZE = 1024 * 1024
+
+
+def get_worker_amount(threads: int) -> int:
+	"""
+	:param threads: the configured thread amount. Non-positive value means using all cpu cores
+	"""
+	if threads <= 0:
+		threads = os.cpu_count() or 1
+	return threads
+
+
+def _deflate_block(block: bytes, dictionary: Optional[bytes], level: int) -> bytes:
+	if dictionary is not None:
+		compressor = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=dictionary)
+	else:
+		compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+	# zlib releases the GIL while compressing, so threads are enough for running in parallel
+	return compressor.compress(block) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def deflate_file(file_obj: BinaryIO, workers: int, *, level: int = zlib.Z_DEFAULT_COMPRESSION, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[bytes]:
+	"""
+	Deflate the rest of the content in file_obj with a thread pool
+
+	:return: an iterator of the chunks of the raw deflate stream, in order
+	"""
+	with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ParallelDeflate') as executor:
+		pending: Deque[Future] = deque()
+		dictionary: Optional[bytes] = None
+		while True:
+			block = file_obj.read(block_size)
+			if len(block) == 0:
+				break
+			pending.append(executor.submit(_deflate_block, block, dictionary, level))
+			dictionary = block[-DICTIONARY_SIZE:]
+			# limit the amount of blocks in memory
+			if len(pending) >= workers * 2:
+				yield pending.popleft().result()
+		while len(pending) > 0:
+			yield pending.popleft().result()
+	# an empty final block terminates the stream
+	yield zlib.compressobj(level, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)
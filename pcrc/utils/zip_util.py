@@ -0,0 +1,243 @@
+import os
+import struct
+import time
+import zlib
+from typing import List, Optional, BinaryIO, Iterable
+
+ZIP64_LIMIT = (1 << 31) - 1
+ZIP_DEFLATED = 8
+
+_LOCAL_FILE_HEADER = struct.Struct('<4s2H3H3L2H')
+_CENTRAL_DIR_HEADER = struct.Struct('<4s4H2H3L5H2L')
+_END_OF_CENTRAL_DIR = struct.Struct('<4s4H2LH')
+_ZIP64_END_OF_CENTRAL_DIR = struct.Struct('<4sQ2H2L4Q')
+_ZIP64_END_OF_CENTRAL_DIR_LOCATOR = struct.Struct('<4sLQL')
+_ZIP64_LOCAL_EXTRA = struct.Struct('<2H2Q')
+
+
+def _dos_date_time(timestamp: float):
+	t = time.localtime(timestamp)
+	dos_date = (t.tm_year - 1980) << 9 | t.tm_mon << 5 | t.tm_mday
+	dos_time = t.tm_hour << 11 | t.tm_min << 5 | t.tm_sec // 2
+	return dos_date, dos_time
+
+
+class ZipEntryInfo:
+	def __init__(self, name: str, header_offset: int, zip64: bool):
+		self.name = name
+		self.header_offset = header_offset
+		self.zip64 = zip64
+		self.dos_date, self.dos_time = _dos_date_time(time.time())
+		self.crc = 0
+		self.file_size = 0
+		self.compress_size = 0
+
+	@property
+	def encoded_name(self) -> bytes:
+		return self.name.encode('utf8')
+
+	@property
+	def data_offset(self) -> int:
+		"""
+		Where the compressed data starts in the archive
+		"""
+		return self.header_offset + len(self.local_header())
+
+	@property
+	def extract_version(self) -> int:
+		return 45 if self.zip64 else 20
+
+	def local_header(self) -> bytes:
+		name = self.encoded_name
+		if self.zip64:
+			extra = _ZIP64_LOCAL_EXTRA.pack(1, 16, self.file_size, self.compress_size)
+			compress_size = file_size = 0xFFFFFFFF
+		else:
+			extra = b''
+			compress_size, file_size = self.compress_size, self.file_size
+		return _LOCAL_FILE_HEADER.pack(
+			b'PK\x03\x04', self.extract_version, 0, ZIP_DEFLATED, self.dos_time, self.dos_date,
+			self.crc, compress_size, file_size, len(name), len(extra)
+		) + name + extra
+
+	def central_dir_header(self) -> bytes:
+		name = self.encoded_name
+		zip64_fields = []
+		file_size, compress_size, header_offset = self.file_size, self.compress_size, self.header_offset
+		if file_size > ZIP64_LIMIT:
+			zip64_fields.append(file_size)
+			file_size = 0xFFFFFFFF
+		if compress_size > ZIP64_LIMIT:
+			zip64_fields.append(compress_size)
+			compress_size = 0xFFFFFFFF
+		if header_offset > ZIP64_LIMIT:
+			zip64_fields.append(header_offset)
+			header_offset = 0xFFFFFFFF
+		if len(zip64_fields) > 0:
+			extra = struct.pack('<2H{}Q'.format(len(zip64_fields)), 1, 8 * len(zip64_fields), *zip64_fields)
+		else:
+			extra = b''
+		extract_version = max(self.extract_version, 45 if len(zip64_fields) > 0 else 20)
+		return _CENTRAL_DIR_HEADER.pack(
+			b'PK\x01\x02', extract_version, extract_version, 0, ZIP_DEFLATED, self.dos_time, self.dos_date,
+			self.crc, compress_size, file_size, len(name), len(extra), 0, 0, 0, 0, header_offset
+		) + name + extra
+
+
+class ZipStreamWriter:
+	"""
+	A minimal zip archive writer whose entries are deflated incrementally while being written,
+	so large entries never need to be read back from the disk for archiving
+
+	Entries are written one at a time. The file is a valid zip archive only after close() is called
+	"""
+	BUFFER_SIZE = 1024 * 1024
+
+	def __init__(self, file_path: str, compress_level: int = zlib.Z_DEFAULT_COMPRESSION, *, mode: str = 'wb'):
+		self.file_path = file_path
+		self.compress_level = compress_level
+		self.__file: BinaryIO = open(file_path, mode)
+		self.__entries: List[ZipEntryInfo] = []
+		self.__current: Optional[ZipEntryInfo] = None
+		self.__compressor = None
+
+	@classmethod
+	def recover(cls, file_path: str, name: str, compress_size: int, crc: int, file_size: int) -> 'ZipStreamWriter':
+		"""
+		Reopen an unfinished archive whose first entry was being written with zip64 enabled.
+		The entry data is truncated to compress_size bytes, which should end with a flush(), and gets finished
+
+		:param crc: the crc32 of the uncompressed content in the kept data
+		:param file_size: the size of the uncompressed content in the kept data
+		"""
+		writer = cls(file_path, mode='r+b')
+		entry = ZipEntryInfo(name, 0, True)
+		writer.__file.truncate(entry.data_offset + compress_size)
+		writer.__file.seek(0, os.SEEK_END)
+		writer.__current = entry
+		entry.compress_size = compress_size
+		writer.__write_compressed(zlib.compressobj(writer.compress_level, zlib.DEFLATED, -15).flush(zlib.Z_FINISH))
+		entry.crc = crc
+		entry.file_size = file_size
+		writer.__finish_entry()
+		return writer
+
+	@property
+	def entries(self) -> List[ZipEntryInfo]:
+		return self.__entries
+
+	@property
+	def current_entry(self) -> Optional[ZipEntryInfo]:
+		return self.__current
+
+	def __ensure_entry_opened(self) -> ZipEntryInfo:
+		if self.__current is None:
+			raise RuntimeError('No zip entry is being written')
+		return self.__current
+
+	def __write_compressed(self, data: bytes):
+		if len(data) > 0:
+			self.__file.write(data)
+			self.__current.compress_size += len(data)
+
+	def begin_entry(self, name: str, zip64: bool = True):
+		"""
+		:param zip64: if the entry might grow larger than 2GB. Set it to True if the final size is unknown
+		"""
+		if self.__current is not None:
+			raise RuntimeError('Zip entry {} is still being written'.format(self.__current.name))
+		self.__current = ZipEntryInfo(name, self.__file.tell(), zip64)
+		self.__compressor = zlib.compressobj(self.compress_level, zlib.DEFLATED, -15)
+		self.__file.write(self.__current.local_header())
+
+	def write(self, data: bytes):
+		entry = self.__ensure_entry_opened()
+		entry.crc = zlib.crc32(data, entry.crc)
+		entry.file_size += len(data)
+		self.__write_compressed(self.__compressor.compress(data))
+
+	def flush(self):
+		"""
+		Flush all data written into the current entry to the disk.
+		The deflate stream ends at a byte boundary after flushing, so it can be truncated here and finished later
+		"""
+		self.__ensure_entry_opened()
+		self.__write_compressed(self.__compressor.flush(zlib.Z_SYNC_FLUSH))
+		self.__file.flush()
+		os.fsync(self.__file.fileno())
+
+	def end_entry(self) -> ZipEntryInfo:
+		self.__ensure_entry_opened()
+		self.__write_compressed(self.__compressor.flush(zlib.Z_FINISH))
+		return self.__finish_entry()
+
+	def __finish_entry(self) -> ZipEntryInfo:
+		entry = self.__current
+		if not entry.zip64 and (entry.file_size > ZIP64_LIMIT or entry.compress_size > ZIP64_LIMIT):
+			raise OverflowError('Zip entry {} needs zip64 extension'.format(entry.name))
+
+		# go back and fill the sizes and the crc into the local file header
+		end_pos = self.__file.tell()
+		self.__file.seek(entry.header_offset)
+		self.__file.write(entry.local_header())
+		self.__file.seek(end_pos)
+
+		self.__entries.append(entry)
+		self.__current = None
+		self.__compressor = None
+		return entry
+
+	def writestr(self, name: str, data: bytes) -> ZipEntryInfo:
+		self.begin_entry(name, zip64=len(data) > ZIP64_LIMIT)
+		self.write(data)
+		return self.end_entry()
+
+	def write_file(self, name: str, file_path: str) -> ZipEntryInfo:
+		self.begin_entry(name)
+		with open(file_path, 'rb') as f:
+			while True:
+				buf = f.read(self.BUFFER_SIZE)
+				if len(buf) == 0:
+					break
+				self.write(buf)
+		return self.end_entry()
+
+	def write_deflated(self, name: str, chunks: Iterable[bytes], crc: int, file_size: int) -> ZipEntryInfo:
+		"""
+		Write an entry whose content has already been deflated elsewhere
+
+		:param chunks: the chunks of a complete raw deflate stream
+		:param crc: the crc32 of the uncompressed content
+		:param file_size: the size of the uncompressed content
+		"""
+		self.begin_entry(name)
+		for chunk in chunks:
+			self.__write_compressed(chunk)
+		self.__current.crc = crc
+		self.__current.file_size = file_size
+		return self.__finish_entry()
+
+	def close(self):
+		if self.__current is not None:
+			self.end_entry()
+		cd_offset = self.__file.tell()
+		for entry in self.__entries:
+			self.__file.write(entry.central_dir_header())
+		cd_size = self.__file.tell() - cd_offset
+		entry_count = len(self.__entries)
+
+		if entry_count >= 0xFFFF or cd_offset > ZIP64_LIMIT or cd_size > ZIP64_LIMIT:
+			zip64_eocd_offset = self.__file.tell()
+			self.__file.write(_ZIP64_END_OF_CENTRAL_DIR.pack(b'PK\x06\x06', _ZIP64_END_OF_CENTRAL_DIR.size - 12, 45, 45, 0, 0, entry_count, entry_count, cd_size, cd_offset))
+			self.__file.write(_ZIP64_END_OF_CENTRAL_DIR_LOCATOR.pack(b'PK\x06\x07', 0, zip64_eocd_offset, 1))
+			entry_count = min(entry_count, 0xFFFF)
+			cd_size = min(cd_size, 0xFFFFFFFF)
+			cd_offset = min(cd_offset, 0xFFFFFFFF)
+		self.__file.write(_END_OF_CENTRAL_DIR.pack(b'PK\x05\x06', 0, 0, entry_count, entry_count, cd_size, cd_offset, 0))
+		self.__file.close()
+
+	def abort(self):
+		"""
+		Close the file handle without finishing the archive
+		"""
+		self.__file.close()